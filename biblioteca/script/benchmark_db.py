@@ -0,0 +1,197 @@
+"""
+Script para medir el rendimiento de la persistencia de la biblioteca en SQLite
+"""
+import sys
+import os
+import io
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import threading
+import contextlib
+from datetime import datetime, timedelta
+
+# Añadir el directorio src al path de Python
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from controllers.Biblioteca import Biblioteca
+from database.database import Database, PERFILES, crear_esquema
+from database.asincrona import DatabaseAsincrona
+
+
+def generar_db(ruta, num_libros, num_usuarios, num_prestamos, semilla=42):
+    """Crea una base de datos sintética con libros, usuarios y préstamos (un 10% activos)."""
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    rng = random.Random(semilla)
+    inicio = datetime(2020, 1, 1)
+    with sqlite3.connect(ruta) as conn:
+        crear_esquema(conn)
+        conn.executemany(
+            "INSERT INTO libros (titulo, autor, isbn, disponible, titulo_normalizado, autor_normalizado) "
+            "VALUES (?1, ?2, ?3, 1, lower(?1), lower(?2))",
+            ((f"Libro {i}", f"Autor {i % 5000}", f"ISBN{i}") for i in range(num_libros))
+        )
+        conn.executemany(
+            "INSERT INTO usuarios (nombre, email, telefono) VALUES (?, ?, ?)",
+            ((f"Lector {i % 1000}", f"lector{i}@test.com", f"{1000000 + i}") for i in range(num_usuarios))
+        )
+
+        def prestamos():
+            for i in range(num_prestamos):
+                fecha = inicio + timedelta(minutes=i)
+                activo = rng.random() < 0.1
+                devolucion = None if activo else (fecha + timedelta(days=14)).isoformat(sep=' ')
+                yield (f"P-{i}", rng.randrange(num_libros) + 1, rng.randrange(num_usuarios) + 1,
+                       fecha.isoformat(sep=' '), devolucion, int(not activo))
+        conn.executemany(
+            "INSERT INTO prestamos (codigo, libro_id, usuario_id, fecha_prestamo, fecha_devolucion, devuelto) "
+            "VALUES (?, ?, ?, ?, ?, ?)", prestamos()
+        )
+
+
+def benchmark_arranque(args):
+    """Compara la carga en bloque con repetir agregar_libro y registrar_usuario fila a fila."""
+    generar_db(args.db, args.libros, args.usuarios, args.prestamos)
+
+    inicio = time.perf_counter()
+    Biblioteca.desde_base_de_datos(args.db)
+    print(f"desde_base_de_datos: {time.perf_counter() - inicio:.2f} s")
+
+    inicio = time.perf_counter()
+    biblioteca = Biblioteca()
+    with sqlite3.connect(args.db) as conn, contextlib.redirect_stdout(io.StringIO()):
+        for titulo, autor, isbn in conn.execute("SELECT titulo, autor, isbn FROM libros"):
+            biblioteca.agregar_libro(titulo, autor, isbn)
+        for nombre, telefono, correo in conn.execute("SELECT nombre, telefono, email FROM usuarios"):
+            biblioteca.registrar_usuario(nombre, telefono, correo)
+    print(f"Altas fila a fila (sin préstamos): {time.perf_counter() - inicio:.2f} s")
+
+
+def benchmark_perfiles(args):
+    """
+    Mide préstamos por segundo con `--lectores` hilos generando informes a la vez.
+    
+    Cada préstamo es una transacción (alta en prestamos y libro no disponible) a
+    través del pool de Database; los lectores repiten durante `--segundos` una
+    consulta de informe de préstamos activos por usuario.
+    """
+    for perfil in PERFILES:
+        ruta = f"{args.db}.{perfil}"
+        generar_db(ruta, args.libros, args.usuarios, args.prestamos)
+        db = Database(ruta, max_conexiones=args.lectores + 1, perfil=perfil)
+        fin = time.monotonic() + args.segundos
+        informes = [0] * args.lectores
+
+        def leer(indice):
+            while time.monotonic() < fin:
+                db.consultar("""
+                    SELECT usuario_id, COUNT(*) FROM prestamos
+                    WHERE devuelto = 0 GROUP BY usuario_id ORDER BY 2 DESC LIMIT 10
+                """)
+                informes[indice] += 1
+
+        lectores = [threading.Thread(target=leer, args=(i,)) for i in range(args.lectores)]
+        for lector in lectores:
+            lector.start()
+        rng = random.Random(7)
+        prestamos = 0
+        while time.monotonic() < fin:
+            with db.conexion() as conexion:
+                libro = rng.randrange(args.libros) + 1
+                conexion.execute(
+                    "INSERT INTO prestamos (codigo, libro_id, usuario_id) VALUES (?, ?, ?)",
+                    (f"B-{prestamos}", libro, rng.randrange(args.usuarios) + 1)
+                )
+                conexion.execute("UPDATE libros SET disponible = 0 WHERE id = ?", (libro,))
+                conexion.commit()
+            prestamos += 1
+        for lector in lectores:
+            lector.join()
+        db.close()
+        print(f"{perfil:12s} {prestamos / args.segundos:8.0f} préstamos/s  "
+              f"{sum(informes) / args.segundos:6.1f} informes/s")
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(ruta + sufijo):
+                os.remove(ruta + sufijo)
+
+
+def benchmark_insercion(args):
+    """Compara insertar `--libros` filas con ejecutar una a una y con ejecutar_lote."""
+    sql = "INSERT INTO libros (titulo, autor, isbn) VALUES (?, ?, ?)"
+    for descripcion, insertar, filas in (
+        ("ejecutar", lambda db, filas: [db.ejecutar(sql, fila) for fila in filas],
+         min(args.libros, 20000)),
+        ("ejecutar_lote", lambda db, filas: db.ejecutar_lote(sql, filas), args.libros),
+    ):
+        ruta = f"{args.db}.{descripcion}"
+        db = Database(ruta)
+        db.create_tables()
+        inicio = time.perf_counter()
+        insertar(db, ((f"Libro {i}", f"Autor {i % 5000}", f"ISBN{i}") for i in range(filas)))
+        duracion = time.perf_counter() - inicio
+        db.close()
+        print(f"{descripcion}: {filas} filas en {duracion:.2f} s ({filas / duracion:.0f} filas/s)")
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(ruta + sufijo):
+                os.remove(ruta + sufijo)
+
+
+def benchmark_asincrona(args):
+    """Compara `--prestamos` altas concurrentes con DatabaseAsincrona frente a ejecutar una a una."""
+    sql = "INSERT INTO prestamos (codigo, libro_id, usuario_id) VALUES (?, ?, ?)"
+    num_prestamos = min(args.prestamos, 20000)
+    ruta = f"{args.db}.asincrona"
+    for sufijo in ("", "-wal", "-shm"):
+        if os.path.exists(ruta + sufijo):
+            os.remove(ruta + sufijo)
+
+    # El mismo pool que abrirá DatabaseAsincrona: un fichero abierto no cambia de tamaño de pool
+    db = Database(ruta, max_conexiones=args.lectores + 1)
+    db.create_tables()
+    inicio = time.perf_counter()
+    for i in range(num_prestamos):
+        db.ejecutar(sql, (f"S-{i}", i, i))
+    duracion = time.perf_counter() - inicio
+    print(f"ejecutar uno a uno: {num_prestamos / duracion:.0f} préstamos/s")
+
+    async def concurrentes():
+        async with DatabaseAsincrona(ruta, lectores=args.lectores) as asincrona:
+            inicio = time.perf_counter()
+            await asyncio.gather(*(asincrona.ejecutar(sql, (f"A-{i}", i, i)) for i in range(num_prestamos)))
+            duracion = time.perf_counter() - inicio
+            lotes = asincrona.estadisticas()['lotes_escritos']
+        print(f"DatabaseAsincrona: {num_prestamos / duracion:.0f} préstamos/s en {lotes} transacciones")
+
+    asyncio.run(concurrentes())
+    db.close()
+    for sufijo in ("", "-wal", "-shm"):
+        if os.path.exists(ruta + sufijo):
+            os.remove(ruta + sufijo)
+
+
+BENCHMARKS = {
+    'arranque': benchmark_arranque,
+    'perfiles': benchmark_perfiles,
+    'insercion': benchmark_insercion,
+    'asincrona': benchmark_asincrona,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--libros', type=int, default=1_000_000)
+    parser.add_argument('--usuarios', type=int, default=100_000)
+    parser.add_argument('--prestamos', type=int, default=10_000_000)
+    parser.add_argument('--lectores', type=int, default=4)
+    parser.add_argument('--segundos', type=float, default=5.0)
+    parser.add_argument('--db', default="benchmark_biblioteca.db")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
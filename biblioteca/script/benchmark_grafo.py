@@ -0,0 +1,260 @@
+"""
+Script para medir el rendimiento del gestor de grafos con datos sintéticos
+"""
+import sys
+import os
+import time
+import random
+import argparse
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+# Añadir el directorio src al path de Python
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from gestor_grafo_mejorado import GestorGrafoBiblioteca, AlmacenGrafo
+from models.Libro import Libro
+from models.Usuario import Usuario
+from models.Prestamo import Prestamo
+
+
+def generar_datos(num_libros, num_usuarios, prestamos_por_usuario, grupos=20, semilla=42):
+    """
+    Genera libros, usuarios y préstamos sintéticos.
+    
+    Cada usuario pertenece a un grupo de gustos y toma el 80% de sus préstamos de los
+    libros de ese grupo, para que las recomendaciones tengan una señal que medir.
+    """
+    rng = random.Random(semilla)
+    libros = {f"ISBN{i}": Libro(f"Libro {i}", f"Autor {i % 500}", f"ISBN{i}") for i in range(num_libros)}
+    usuarios = {
+        f"lector{i}@test.com": Usuario("Lector Sintetico", "1234567", f"lector{i}@test.com")
+        for i in range(num_usuarios)
+    }
+    isbns = list(libros.keys())
+    por_grupo = [isbns[g::grupos] for g in range(grupos)]
+    prestamos = {}
+    for i, (correo, usuario) in enumerate(usuarios.items()):
+        propios = por_grupo[i % grupos]
+        elegidos = set()
+        while len(elegidos) < prestamos_por_usuario:
+            elegidos.add(rng.choice(propios) if rng.random() < 0.8 else rng.choice(isbns))
+        for isbn in elegidos:
+            prestamo = Prestamo(usuario, libros[isbn])
+            prestamo.id = f"P-{len(prestamos) + 1}"
+            prestamos[prestamo.id] = prestamo
+    return libros, usuarios, prestamos
+
+
+def medir(descripcion, funcion, *args, **kwargs):
+    """Ejecuta una función y muestra su tiempo de ejecución."""
+    inicio = time.perf_counter()
+    resultado = funcion(*args, **kwargs)
+    print(f"{descripcion}: {time.perf_counter() - inicio:.3f} s")
+    return resultado
+
+
+def benchmark_construccion(args):
+    """Compara la construcción secuencial y paralela de los grafos."""
+    libros, usuarios, prestamos = generar_datos(args.libros, args.usuarios, args.prestamos)
+    gestor = GestorGrafoBiblioteca(args.db)
+
+    medir("Co-préstamos (1 proceso)", gestor.construir_grafo_co_prestamos, prestamos, libros)
+    medir(f"Co-préstamos ({args.procesos} procesos)", gestor.construir_grafo_co_prestamos,
+          prestamos, libros, num_procesos=args.procesos)
+    medir("Similitud (1 proceso)", gestor.construir_grafo_similitud_usuarios, prestamos, usuarios)
+    medir(f"Similitud ({args.procesos} procesos)", gestor.construir_grafo_similitud_usuarios,
+          prestamos, usuarios, num_procesos=args.procesos)
+
+
+def benchmark_pagerank(args):
+    """
+    Mide la latencia del PageRank personalizado y su calidad con un préstamo oculto por usuario.
+    
+    La calidad se expresa como tasa de acierto: fracción de usuarios cuyo préstamo oculto
+    aparece entre sus top-N recomendaciones. Se compara con recomendar los libros más populares.
+    """
+    libros, usuarios, prestamos = generar_datos(args.libros, args.usuarios, args.prestamos)
+    gestor = GestorGrafoBiblioteca(args.db)
+
+    # Ocultar el último préstamo de cada usuario
+    ocultos = {}
+    entrenamiento = {}
+    for id_prestamo, prestamo in prestamos.items():
+        anterior = ocultos.get(prestamo.usuario.correoU)
+        if anterior is not None:
+            entrenamiento[anterior.id] = anterior
+        ocultos[prestamo.usuario.correoU] = prestamo
+    correos = list(ocultos.keys())
+
+    medir("Construcción de la matriz de transición", gestor.construir_matriz_transicion, entrenamiento)
+    inicio = time.perf_counter()
+    recomendaciones = gestor.recomendar_pagerank(correos, top_n=args.top_n)
+    duracion = time.perf_counter() - inicio
+    print(f"PageRank personalizado: {duracion:.3f} s ({len(correos) / duracion:.0f} usuarios/s)")
+
+    popularidad = {}
+    leidos = {}
+    for prestamo in entrenamiento.values():
+        popularidad[prestamo.libro.isbn] = popularidad.get(prestamo.libro.isbn, 0) + 1
+        leidos.setdefault(prestamo.usuario.correoU, set()).add(prestamo.libro.isbn)
+    populares = sorted(popularidad, key=popularidad.get, reverse=True)
+
+    aciertos_pagerank = 0
+    aciertos_populares = 0
+    for correo, prestamo in ocultos.items():
+        aciertos_pagerank += prestamo.libro.isbn in {r['isbn'] for r in recomendaciones[correo]}
+        vistos = leidos.get(correo, set())
+        candidatos = [isbn for isbn in populares if isbn not in vistos][:args.top_n]
+        aciertos_populares += prestamo.libro.isbn in candidatos
+    print(f"Tasa de acierto top-{args.top_n}: PageRank {aciertos_pagerank / len(ocultos):.3f}, "
+          f"popularidad {aciertos_populares / len(ocultos):.3f}")
+
+
+def benchmark_almacen(args):
+    """
+    Compara memoria y velocidad de recorrido de AlmacenGrafo frente a nx.DiGraph.
+    
+    Se generan `--aristas` aristas aleatorias entre `--libros` nodos con los mismos
+    atributos que usa el grafo de co-préstamos.
+    """
+    rng = np.random.default_rng(42)
+    origenes = rng.integers(0, args.libros, args.aristas)
+    destinos = rng.integers(0, args.libros, args.aristas)
+    pesos = rng.random(args.aristas)
+
+    tracemalloc.start()
+    almacen = AlmacenGrafo(dirigido=False)
+    for i in range(args.libros):
+        almacen.agregar_nodo(f"libro_ISBN{i}", "libro", isbn=f"ISBN{i}", titulo=f"Libro {i}", autor="Autor")
+    almacen.agregar_aristas(origenes, destinos, pesos)
+    memoria_almacen = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    grafo = nx.DiGraph()
+    for i in range(args.libros):
+        grafo.add_node(f"libro_ISBN{i}", tipo="libro", isbn=f"ISBN{i}", titulo=f"Libro {i}", autor="Autor")
+    for u, v, w in zip(origenes.tolist(), destinos.tolist(), pesos.tolist()):
+        grafo.add_edge(f"libro_ISBN{u}", f"libro_ISBN{v}", peso=w, tipo="co-prestamo", usuarios=[])
+    memoria_nx = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"Memoria AlmacenGrafo: {memoria_almacen / 2**20:.1f} MiB "
+          f"({almacen.memoria_aristas() / max(almacen.numero_aristas(), 1):.1f} bytes/arista en CSR)")
+    print(f"Memoria nx.DiGraph: {memoria_nx / 2**20:.1f} MiB")
+
+    def recorrer_almacen():
+        total = 0.0
+        for i in range(almacen.numero_nodos()):
+            total += almacen.vecinos(i)[1].sum()
+        return total
+
+    def recorrer_nx():
+        total = 0.0
+        for nodo in grafo:
+            for _, datos in grafo.succ[nodo].items():
+                total += datos['peso']
+            for _, datos in grafo.pred[nodo].items():
+                total += datos['peso']
+        return total
+
+    medir("Recorrido de vecinos AlmacenGrafo", recorrer_almacen)
+    medir("Recorrido de vecinos nx.DiGraph", recorrer_nx)
+
+
+def benchmark_snapshot(args):
+    """
+    Compara el checkpoint JSON con el snapshot binario al guardar y restaurar un grafo.
+    
+    Se usa el grafo de co-préstamos de `--aristas` aristas aleatorias entre `--libros`
+    libros; la memoria indicada es el pico de tracemalloc durante la carga.
+    """
+    rng = np.random.default_rng(42)
+    gestor = GestorGrafoBiblioteca(args.db)
+    almacen = AlmacenGrafo(dirigido=False)
+    for i in range(args.libros):
+        almacen.agregar_nodo(f"libro_ISBN{i}", "libro", isbn=f"ISBN{i}", titulo=f"Libro {i}", autor="Autor")
+    almacen.agregar_aristas(rng.integers(0, args.libros, args.aristas),
+                            rng.integers(0, args.libros, args.aristas), rng.random(args.aristas))
+    gestor.grafo = nx.DiGraph()
+    gestor.co_prestamos = almacen
+    gestor._grafo = None
+    ruta = args.db + ".snap"
+
+    def medir_carga(descripcion, funcion):
+        tracemalloc.start()
+        medir(descripcion, funcion)
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  pico de memoria: {pico / 2**20:.1f} MiB")
+
+    medir("Snapshot binario (guardar)", gestor.guardar_snapshot, ruta)
+    print(f"  tamaño: {os.path.getsize(ruta) / 2**20:.1f} MiB")
+    medir_carga("Snapshot binario (cargar)", lambda: GestorGrafoBiblioteca(args.db).cargar_snapshot(ruta))
+    os.remove(ruta)
+
+    gestor.formato_checkpoint = "json"
+    gestor._requiere_checkpoint = True
+    medir("Checkpoint JSON (guardar)", gestor.guardar_estado)
+    medir_carga("Checkpoint JSON (cargar)", lambda: GestorGrafoBiblioteca(args.db).cargar_estado())
+
+
+def benchmark_lote(args):
+    """
+    Compara las recomendaciones usuario a usuario con la versión en lote.
+    
+    Los préstamos sintéticos se asignan a los usuarios como préstamos activos, y la
+    salida en lote se escribe en un fichero JSONL junto a `--db`.
+    """
+    libros, usuarios, prestamos = generar_datos(args.libros, args.usuarios, args.prestamos)
+    for prestamo in prestamos.values():
+        prestamo.usuario.libros_prestados.append(prestamo)
+    gestor = GestorGrafoBiblioteca(args.db)
+    medir("Co-préstamos", gestor.construir_grafo_co_prestamos, prestamos, libros, num_procesos=args.procesos)
+
+    class _Biblioteca:
+        pass
+    biblioteca = _Biblioteca()
+    biblioteca.libros = libros
+    biblioteca.usuarios = usuarios
+
+    inicio = time.perf_counter()
+    for correo in usuarios:
+        gestor.obtener_libros_recomendados(correo, biblioteca, top_n=args.top_n)
+    duracion = time.perf_counter() - inicio
+    print(f"Usuario a usuario: {duracion:.3f} s ({len(usuarios) / duracion:.0f} usuarios/s)")
+
+    ruta = args.db + ".jsonl"
+    resumen = gestor.recomendar_para_todos(biblioteca, ruta, top_n=args.top_n)
+    print(f"En lote: {resumen['segundos']:.3f} s ({resumen['usuarios_por_segundo']:.0f} usuarios/s)")
+    os.remove(ruta)
+
+
+BENCHMARKS = {
+    'construccion': benchmark_construccion,
+    'pagerank': benchmark_pagerank,
+    'almacen': benchmark_almacen,
+    'snapshot': benchmark_snapshot,
+    'lote': benchmark_lote,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--libros', type=int, default=5000)
+    parser.add_argument('--usuarios', type=int, default=5000)
+    parser.add_argument('--prestamos', type=int, default=10, help="Préstamos por usuario")
+    parser.add_argument('--aristas', type=int, default=5_000_000)
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--db', default="benchmark_grafo.db")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ import os
 # Añadir el directorio src al path de Python
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.database.database import Database
+from src.database.database import Database, normalizar_texto
 
 def populate_database():
     db = Database()
@@ -30,22 +30,6 @@ def populate_database():
             ('Pedro Sánchez', 'pedro@email.com', '321654987')
         ]
 
-        # Insertar libros
-        for libro in libros:
-            db.execute_query(
-                "INSERT INTO libros (titulo, autor, genero, isbn, disponible) VALUES (?, ?, ?, ?, ?)",
-                libro
-            )
-        print("Libros agregados correctamente!")
-
-        # Insertar usuarios
-        for usuario in usuarios:
-            db.execute_query(
-                "INSERT INTO usuarios (nombre, email, telefono) VALUES (?, ?, ?)",
-                usuario
-            )
-        print("Usuarios agregados correctamente!")
-
         # Crear algunos préstamos de ejemplo
         prestamos = [
             (1, 1, '2024-03-01', '2024-03-15', 0),  # Juan Pérez presta El Quijote
@@ -53,12 +37,29 @@ def populate_database():
             (3, 2, '2024-03-03', '2024-03-17', 0),  # María García presta 1984
         ]
 
-        for prestamo in prestamos:
-            db.execute_query(
+        # Todo en una transacción: si algo falla no queda la base de datos a medias
+        with db.transaccion():
+            # Insertar libros
+            db.ejecutar_lote(
+                "INSERT INTO libros (titulo, autor, genero, isbn, disponible, titulo_normalizado, autor_normalizado) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (libro + (normalizar_texto(libro[0]), normalizar_texto(libro[1])) for libro in libros)
+            )
+            print("Libros agregados correctamente!")
+
+            # Insertar usuarios
+            db.ejecutar_lote(
+                "INSERT INTO usuarios (nombre, email, telefono) VALUES (?, ?, ?)",
+                usuarios
+            )
+            print("Usuarios agregados correctamente!")
+
+            # Insertar préstamos
+            db.ejecutar_lote(
                 "INSERT INTO prestamos (libro_id, usuario_id, fecha_prestamo, fecha_devolucion, devuelto) VALUES (?, ?, ?, ?, ?)",
-                prestamo
+                prestamos
             )
-        print("Préstamos agregados correctamente!")
+            print("Préstamos agregados correctamente!")
 
         print("\nBase de datos poblada exitosamente!")
         print("Se han agregado:")
@@ -1,3 +1,4 @@
+import os
 import re
 import unicodedata
 from datetime import datetime
@@ -5,13 +6,16 @@ from models.ArbolBinario import ArbolBinario
 from models.Libro import Libro
 from models.Usuario import Usuario
 from models.Prestamo import Prestamo
-from gestor_grafo_mejorado import GestorGrafoBiblioteca
 from models.Autor import Autor
 from models.Genero import Genero
 
+# Nodos del grafo a partir de los cuales la analítica del menú usa varios procesos
+# (variable de entorno BIBLIOTECA_NODOS_ANALITICA_PARALELA)
+NODOS_ANALITICA_PARALELA = int(os.environ.get('BIBLIOTECA_NODOS_ANALITICA_PARALELA', 5000))
+
 
 class Biblioteca:
-    def __init__(self):
+    def __init__(self, repositorio=None, buscador=None):
         self.libros = {}  # ISBN como clave
         self.usuarios = {}  # Correo como clave
         self.prestamos = {}  # ID generado como clave
@@ -31,10 +35,143 @@ class Biblioteca:
         self.arbol_nombres_usuarios = ArbolBinario() # Árbol ordenado por nombre normalizado
         self.arbol_correos_usuarios = ArbolBinario() # Árbol ordenado por correo normalizado
 
-        # Inicializar el gestor de grafos
-        self.gestor_grafo = GestorGrafoBiblioteca()
+        # El gestor de grafos (y networkx/matplotlib) se crea en el primer uso
+        self._gestor_grafo = None
         self.grafo_actual_tipo = None # Para saber qué grafo está cargado actualmente
 
+        # Repositorio opcional (database.repositorio.RepositorioBiblioteca) que refleja
+        # en SQLite cada alta, modificación y baja
+        self.repositorio = repositorio
+        # Buscador opcional (database.busqueda.BuscadorLibros) al que se delegan las
+        # búsquedas de libros por título, autor o texto libre
+        self.buscador = buscador
+
+    @property
+    def gestor_grafo(self):
+        """Gestor de grafos de la biblioteca, creado al primer acceso."""
+        if self._gestor_grafo is None:
+            from gestor_grafo_mejorado import GestorGrafoBiblioteca
+            self._gestor_grafo = GestorGrafoBiblioteca()
+        return self._gestor_grafo
+
+    @classmethod
+    def desde_base_de_datos(cls, db_path=None, repositorio=None, tam_lote=100000, buscador=None):
+        """
+        Crea una biblioteca con los libros, usuarios y préstamos guardados en SQLite.
+        
+        Las filas se leen por bloques con Database.iterar y se convierten sin repetir la
+        validación de los modelos (ya se validaron al guardarse). Los índices se llenan
+        durante la lectura y los árboles se construyen al final de una vez, equilibrados,
+        en lugar de insertar cada clave por separado.
+        
+        Args:
+            db_path (str): Ruta de la base de datos (por defecto, la de database.Database)
+            repositorio: Repositorio que reflejará en SQLite los cambios posteriores
+            buscador: Buscador de libros al que delegar buscar_libro
+            tam_lote (int): Filas leídas por cada fetchmany
+            
+        Returns:
+            Biblioteca: La biblioteca cargada
+        """
+        import gc
+        import sqlite3
+        import time
+        from database.database import Database
+
+        inicio = time.perf_counter()
+        biblioteca = cls(buscador=buscador)
+        normalizados = {}
+
+        def normalizar(texto):
+            # Autores y nombres se repiten mucho: se normaliza cada texto una sola vez
+            normalizado = normalizados.get(texto)
+            if normalizado is None:
+                normalizado = normalizados[texto] = biblioteca.normalizar_texto(texto)
+            return normalizado
+
+        # Los millones de objetos creados no forman ciclos: sin el recolector cíclico,
+        # que se dispararía una y otra vez durante la carga, esta va varias veces más rápido
+        recolector_activo = gc.isenabled()
+        gc.disable()
+        try:
+            db = Database(db_path)
+            db.create_tables()
+
+            def filas(query):
+                return db.iterar(query, tam_lote=tam_lote, tuplas=True)
+
+            libros_por_id = {}
+            titulos = []
+            autores = []
+            for id_libro, titulo, autor, isbn, disponible, titulo_normalizado, autor_normalizado in filas("""
+                SELECT id, titulo, autor, isbn, disponible, titulo_normalizado, autor_normalizado
+                FROM libros ORDER BY id
+            """):
+                libro = Libro.desde_bd(titulo, autor, isbn, bool(disponible))
+                libros_por_id[id_libro] = libro
+                biblioteca.libros[isbn] = libro
+                # Las filas escritas sin las columnas normalizadas se normalizan aquí
+                if titulo_normalizado is None:
+                    titulo_normalizado = normalizar(titulo)
+                if autor_normalizado is None:
+                    autor_normalizado = normalizar(autor)
+                biblioteca.libros_por_titulo.setdefault(titulo_normalizado, []).append(isbn)
+                biblioteca.libros_por_autor.setdefault(autor_normalizado, []).append(isbn)
+                titulos.append((titulo_normalizado, isbn))
+                autores.append((autor_normalizado, isbn))
+
+            usuarios_por_id = {}
+            nombres = []
+            for id_usuario, nombre, telefono, correo in filas(
+                    "SELECT id, nombre, telefono, email FROM usuarios ORDER BY id"):
+                usuario = Usuario.desde_bd(nombre, telefono, correo)
+                usuarios_por_id[id_usuario] = usuario
+                biblioteca.usuarios[correo] = usuario
+                nombre_normalizado = normalizar(nombre)
+                biblioteca.usuarios_por_nombre.setdefault(nombre_normalizado, []).append(correo)
+                biblioteca.usuarios_por_telefono[telefono] = correo
+                nombres.append((nombre_normalizado, correo))
+
+            fechas = datetime.fromisoformat
+            for id_fila, codigo, id_libro, id_usuario, fecha_prestamo, fecha_devolucion, devuelto in filas("""
+                SELECT id, codigo, libro_id, usuario_id, fecha_prestamo, fecha_devolucion, devuelto
+                FROM prestamos ORDER BY id
+            """):
+                libro = libros_por_id.get(id_libro)
+                usuario = usuarios_por_id.get(id_usuario)
+                if libro is None or usuario is None:
+                    continue
+                prestamo = Prestamo.desde_bd(
+                    codigo or f"P-{id_fila}", usuario, libro,
+                    fechas(fecha_prestamo) if fecha_prestamo else None,
+                    fechas(fecha_devolucion) if fecha_devolucion else None,
+                    devuelto
+                )
+                biblioteca.prestamos[prestamo.id] = prestamo
+                if not devuelto:
+                    usuario.libros_prestados.append(prestamo)
+
+            # sorted es estable: con claves repetidas gana la última fila, como al insertar en orden
+            primero = lambda par: par[0]
+            biblioteca.arbol_titulos.construir_desde_ordenados(sorted(titulos, key=primero))
+            biblioteca.arbol_autores.construir_desde_ordenados(sorted(autores, key=primero))
+            biblioteca.arbol_isbn.construir_desde_ordenados(sorted((isbn, isbn) for isbn in biblioteca.libros))
+            biblioteca.arbol_nombres_usuarios.construir_desde_ordenados(sorted(nombres, key=primero))
+            biblioteca.arbol_correos_usuarios.construir_desde_ordenados(
+                sorted((correo, correo) for correo in biblioteca.usuarios)
+            )
+        except sqlite3.Error as e:
+            print(f"❌ Error al cargar la biblioteca desde la base de datos: {e}")
+            raise
+        finally:
+            if recolector_activo:
+                gc.enable()
+        biblioteca.repositorio = repositorio
+
+        print(f"✅ Biblioteca cargada: {len(biblioteca.libros)} libros, {len(biblioteca.usuarios)} usuarios y "
+              f"{len(biblioteca.prestamos)} préstamos en {time.perf_counter() - inicio:.2f} s.")
+        return biblioteca
+
     def normalizar_texto(self, texto):
         """Normaliza texto a minúsculas y sin tildes para búsquedas."""
         if isinstance(texto, str):
@@ -62,6 +199,9 @@ class Biblioteca:
             self.arbol_autores.insertar(autor_normalizado, isbn)
             self.arbol_isbn.insertar(isbn, isbn) # El valor es el mismo ISBN para facilitar la búsqueda directa
 
+            if self.repositorio is not None:
+                self.repositorio.guardar_libro(libro)
+
             print(f"✅ Libro '{titulo}' agregado exitosamente.")
             return True
         except ValueError as e:
@@ -113,6 +253,8 @@ class Biblioteca:
             actualizado = True
 
         if actualizado:
+            if self.repositorio is not None:
+                self.repositorio.guardar_libro(libro)
             print(f"✅ Libro con ISBN '{isbn}' modificado exitosamente.")
             return True
         else:
@@ -147,33 +289,41 @@ class Biblioteca:
     
 
         del self.libros[isbn]
+        if self.repositorio is not None:
+            self.repositorio.eliminar_libro(isbn)
         print(f"✅ Libro con ISBN '{isbn}' eliminado exitosamente.")
         return True
 
-    def buscar_libro(self, tipo_busqueda, valor_busqueda):
+    def buscar_libro(self, tipo_busqueda, valor_busqueda, limite=50):
+        """
+        Busca libros por ISBN, por prefijo del título o del autor, o por texto libre.
+
+        Con un buscador asociado, las búsquedas por título, autor y texto libre ("texto",
+        solo disponible con buscador) se resuelven en su índice de SQLite, ordenadas por
+        relevancia y con hasta `limite` resultados; sin él se usan los árboles en memoria.
+        """
         valor_normalizado = self.normalizar_texto(valor_busqueda)
         resultados_isbn = []
 
+        if self.buscador is not None and tipo_busqueda in ("titulo", "autor", "texto"):
+            return self._buscar_libro_indexado(tipo_busqueda, valor_busqueda, limite)
+
         if tipo_busqueda == "isbn":
             # Búsqueda directa en el diccionario
             if valor_busqueda in self.libros:
                 resultados_isbn.append(valor_busqueda)
         elif tipo_busqueda == "titulo":
-            # Búsqueda por prefijo en el árbol de títulos
+            # Búsqueda por prefijo en el árbol de títulos (cada clave guarda un ISBN)
             if self.arbol_titulos.raiz:
-                claves_encontradas = self.arbol_titulos.buscar_por_prefijo(valor_normalizado)
-                for clave_norm, isbns_list in claves_encontradas.items():
-                    for isbn in isbns_list:
-                        if isbn in self.libros: # Asegurarse de que el libro realmente exista
-                            resultados_isbn.append(isbn)
+                for isbn in self.arbol_titulos.buscar_por_prefijo(valor_normalizado):
+                    if isbn in self.libros: # Asegurarse de que el libro realmente exista
+                        resultados_isbn.append(isbn)
         elif tipo_busqueda == "autor":
             # Búsqueda por prefijo en el árbol de autores
             if self.arbol_autores.raiz:
-                claves_encontradas = self.arbol_autores.buscar_por_prefijo(valor_normalizado)
-                for clave_norm, isbns_list in claves_encontradas.items():
-                    for isbn in isbns_list:
-                        if isbn in self.libros: # Asegurarse de que el libro realmente exista
-                            resultados_isbn.append(isbn)
+                for isbn in self.arbol_autores.buscar_por_prefijo(valor_normalizado):
+                    if isbn in self.libros: # Asegurarse de que el libro realmente exista
+                        resultados_isbn.append(isbn)
         else:
             print("❌ Tipo de búsqueda de libro no válido.")
             return []
@@ -185,6 +335,27 @@ class Biblioteca:
         
         return libros_encontrados
 
+    def _buscar_libro_indexado(self, tipo_busqueda, valor_busqueda, limite):
+        """Resuelve la búsqueda en el buscador; los libros que no están en memoria se crean desde su fila."""
+        import sqlite3
+
+        campo = None if tipo_busqueda == "texto" else tipo_busqueda
+        if self.repositorio is not None:
+            # Los cambios aún encolados no estarían en el índice
+            self.repositorio.vaciar()
+        try:
+            filas = self.buscador.buscar_prefijo(valor_busqueda, campo=campo, limite=limite)
+        except sqlite3.Error as e:
+            print(f"❌ Error al buscar libros: {e}")
+            return []
+        libros_encontrados = []
+        for fila in filas:
+            libro = self.libros.get(fila["isbn"])
+            if libro is None:
+                libro = Libro.desde_bd(fila["titulo"], fila["autor"], fila["isbn"], bool(fila["disponible"]))
+            libros_encontrados.append(libro)
+        return libros_encontrados
+
     def registrar_usuario(self, nombre, numeroTelefono, correoU):
         try:
             usuario = Usuario(nombre, numeroTelefono, correoU)
@@ -203,6 +374,9 @@ class Biblioteca:
             self.arbol_nombres_usuarios.insertar(nombre_normalizado, correoU)
             self.arbol_correos_usuarios.insertar(correoU, correoU) # El valor es el mismo correo para búsqueda directa
 
+            if self.repositorio is not None:
+                self.repositorio.guardar_usuario(usuario)
+
             print(f"✅ Usuario '{nombre}' registrado exitosamente.")
             return True
         except ValueError as e:
@@ -240,6 +414,8 @@ class Biblioteca:
             actualizado = True
 
         if actualizado:
+            if self.repositorio is not None:
+                self.repositorio.guardar_usuario(usuario)
             print(f"✅ Usuario con correo '{correoU}' modificado exitosamente.")
             return True
         else:
@@ -272,6 +448,8 @@ class Biblioteca:
         # o se reconstruiría el árbol.
 
         del self.usuarios[correoU]
+        if self.repositorio is not None:
+            self.repositorio.eliminar_usuario(correoU)
         print(f"✅ Usuario con correo '{correoU}' eliminado exitosamente.")
         return True
 
@@ -332,6 +510,14 @@ class Biblioteca:
         libro.disponible = False
         usuario.libros_prestados.append(prestamo) # Almacenar el objeto Prestamo completo
 
+        if self.repositorio is not None:
+            self.repositorio.guardar_libro(libro)
+            self.repositorio.guardar_prestamo(prestamo)
+
+        # Mantener el grafo de co-préstamos al día sin reconstruirlo
+        if self.grafo_actual_tipo == "co-préstamos":
+            self.gestor_grafo.registrar_prestamo_co_prestamo(prestamo)
+
         print(f"✅ Préstamo de '{libro.titulo}' a '{usuario.nombre}' registrado con éxito. ID: {id_prestamo}")
         return True
 
@@ -353,6 +539,10 @@ class Biblioteca:
         # Se elimina el objeto Prestamo, no solo el libro
         prestamo.usuario.libros_prestados = [p for p in prestamo.usuario.libros_prestados if p.id != id_prestamo]
 
+        if self.repositorio is not None:
+            self.repositorio.guardar_libro(prestamo.libro)
+            self.repositorio.guardar_prestamo(prestamo)
+
         print(f"✅ Devolución del libro '{prestamo.libro.titulo}' por '{prestamo.usuario.nombre}' registrada con éxito.")
         return True
     
@@ -536,10 +726,14 @@ class Biblioteca:
                 print("1. Por ISBN")
                 print("2. Por Título (por prefijo)")
                 print("3. Por Autor (por prefijo)")
+                if self.buscador is not None:
+                    print("4. Por texto libre (título, autor o género)")
                 opcion_busqueda = input("Seleccione tipo de búsqueda: ").strip()
                 valor_busqueda = input("Ingrese el valor de búsqueda: ").strip()
 
                 tipo_busqueda_map = {"1": "isbn", "2": "titulo", "3": "autor"}
+                if self.buscador is not None:
+                    tipo_busqueda_map["4"] = "texto"
                 tipo_busqueda = tipo_busqueda_map.get(opcion_busqueda)
 
                 if tipo_busqueda:
@@ -751,6 +945,8 @@ class Biblioteca:
             print("3. Mostrar historial de préstamos de un usuario")
             print("4. Mostrar libros actualmente prestados")
             print("5. Mostrar Estadísticas Generales")
+            if self.repositorio is not None:
+                print("6. Exportar historial de préstamos a CSV")
             print("0. Volver al Menú Principal")
 
             opcion = input("Seleccione una opción: ").strip()
@@ -797,11 +993,38 @@ class Biblioteca:
                     print("ℹ️ No hay libros actualmente prestados.")
             elif opcion == "5":
                 self.mostrar_estadisticas()
+            elif opcion == "6" and self.repositorio is not None:
+                ruta = input("Ruta del fichero CSV: ").strip()
+                correo_usuario = input("Correo del usuario (vacío para todos): ").strip() or None
+                self.exportar_historial_prestamos(ruta, correo_usuario)
             elif opcion == "0":
                 break
             else:
                 print("❌ Opción inválida. Por favor, intente de nuevo.")
 
+    def exportar_historial_prestamos(self, ruta, correo=None):
+        """
+        Exporta a CSV el historial de préstamos guardado por el repositorio.
+
+        Se lee de SQLite por bloques, de modo que incluye también los préstamos que
+        ya no están en memoria (libros o usuarios dados de baja).
+        """
+        import sqlite3
+        from database.database import Database
+        from database.informes import exportar_historial_prestamos
+
+        if self.repositorio is None:
+            print("❌ No hay base de datos asociada a la biblioteca.")
+            return False
+        self.repositorio.vaciar()
+        try:
+            exportados = exportar_historial_prestamos(Database(self.repositorio.db_path), ruta, correo)
+        except (OSError, sqlite3.Error) as e:
+            print(f"❌ Error al exportar el historial: {e}")
+            return False
+        print(f"✅ {exportados} préstamos exportados a '{ruta}'.")
+        return True
+
     def mostrar_estadisticas(self):
         total_libros = len(self.libros)
         libros_disponibles = sum(1 for libro in self.libros.values() if libro.disponible)
@@ -821,6 +1044,25 @@ class Biblioteca:
         print(f"  - Préstamos activos: {prestamos_activos}")
         print(f"  - Préstamos devueltos: {prestamos_devueltos}")
 
+        if self.repositorio is None:
+            return
+        import sqlite3
+        from database.database import Database
+        from database.informes import resumen_prestamos
+
+        # Los totales guardados incluyen los préstamos de libros y usuarios dados de baja
+        self.repositorio.vaciar()
+        try:
+            resumen = resumen_prestamos(Database(self.repositorio.db_path))
+        except sqlite3.Error as e:
+            print(f"❌ Error al leer las estadísticas guardadas: {e}")
+            return
+        print("💾 En la base de datos (incluye libros y usuarios dados de baja):")
+        print(f"  - Libros: {resumen['libros']} ({resumen['libros_disponibles']} disponibles)")
+        print(f"  - Usuarios: {resumen['usuarios']}")
+        print(f"  - Préstamos activos: {resumen['prestamos_activos']}")
+        print(f"  - Préstamos devueltos: {resumen['prestamos_devueltos']}")
+
     def _menu_herramientas_grafo(self):
         while True:
             print("\n--- Herramientas de Grafo ---")
@@ -829,6 +1071,7 @@ class Biblioteca:
             print("3. Visualizar Grafo Actual")
             print("4. Obtener Recomendaciones de Libros (Basado en co-préstamos)")
             print("5. Encontrar Usuarios Similares (Basado en similitud de usuarios)")
+            print("6. Analítica del Grafo (componentes, centralidad y comunidades)")
             print("0. Volver al Menú Principal")
 
             opcion = input("Seleccione una opción: ").strip()
@@ -845,25 +1088,25 @@ class Biblioteca:
                 print("✅ Grafo de similitud de usuarios construido.")
             elif opcion == "3":
                 # Visualizar grafo actual
-                if self.gestor_grafo.grafo.number_of_nodes() == 0:
+                if self.gestor_grafo.numero_nodos() == 0:
                     print("❌ El grafo está vacío. Construya un grafo primero (opción 1 o 2).")
                 else:
-                    self.gestor_grafo.visualizar_grafo(self.grafo_actual_tipo)
+                    ruta = input("Ruta del fichero de exportación (.png/.svg, vacío para mostrar en pantalla): ").strip()
+                    self.gestor_grafo.visualizar_grafo(self.grafo_actual_tipo, ruta=ruta or None)
+                    if ruta:
+                        print(f"✅ Visualización exportada a '{ruta}'.")
             elif opcion == "4":
                 # Obtener recomendaciones de libros
-                if self.grafo_actual_tipo != "co-préstamos" or self.gestor_grafo.grafo.number_of_nodes() == 0:
+                if self.grafo_actual_tipo != "co-préstamos" or self.gestor_grafo.numero_nodos() == 0:
                     print("❌ Debe construir primero el Grafo de Co-préstamos de Libros (opción 1) para obtener recomendaciones.")
                     continue
                 correo_usuario = input("Ingrese el correo del usuario para recomendaciones: ").strip()
                 if correo_usuario not in self.usuarios:
                     print(f"❌ Usuario con correo '{correo_usuario}' no encontrado.")
                     continue
-                
-                # Reconstruir el grafo de co-préstamos antes de obtener recomendaciones
-                # para asegurar que está actualizado con todos los préstamos actuales.
-                # Esto es crucial para la precisión de las recomendaciones.
-                self.gestor_grafo.construir_grafo_co_prestamos(self.prestamos, self.libros) 
-                
+
+                # El grafo de co-préstamos se actualiza en cada préstamo (realizar_prestamo),
+                # así que no hace falta reconstruirlo aquí.
                 recomendaciones = self.gestor_grafo.obtener_libros_recomendados(correo_usuario, self, top_n=5)
                 if recomendaciones:
                     print(f"\n--- Recomendaciones de libros para '{self.usuarios[correo_usuario].nombre}' ---")
@@ -873,7 +1116,7 @@ class Biblioteca:
                     print(f"ℹ️ No se encontraron recomendaciones para '{self.usuarios[correo_usuario].nombre}' en este momento o el usuario no tiene historial de préstamos.")
             elif opcion == "5":
                 # Encontrar usuarios similares
-                if self.grafo_actual_tipo != "similitud de usuarios" or self.gestor_grafo.grafo.number_of_nodes() == 0:
+                if self.grafo_actual_tipo != "similitud de usuarios" or self.gestor_grafo.numero_nodos() == 0:
                     print("❌ Debe construir primero el Grafo de Similitud de Usuarios (opción 2) para encontrar usuarios similares.")
                     continue
                 correo_usuario = input("Ingrese el correo del usuario para encontrar similares: ").strip()
@@ -892,6 +1135,30 @@ class Biblioteca:
                         print(f"{i}. Nombre: {sim['nombre']}, Correo: {sim['correo']} (Libros en común: {sim['libros_en_comun']})")
                 else:
                     print(f"ℹ️ No se encontraron usuarios similares a '{self.usuarios[correo_usuario].nombre}' en este momento.")
+            elif opcion == "6":
+                # Analítica del grafo (se reutiliza la caché si el grafo no cambió)
+                if self.gestor_grafo.numero_nodos() == 0:
+                    print("❌ El grafo está vacío. Construya un grafo primero (opción 1 o 2).")
+                    continue
+                num_procesos = 1
+                if self.gestor_grafo.numero_nodos() >= NODOS_ANALITICA_PARALELA:
+                    num_procesos = os.cpu_count() or 1
+                analitica = self.gestor_grafo.calcular_analitica(num_procesos=num_procesos)
+                if not analitica:
+                    print("❌ No se pudo calcular la analítica del grafo.")
+                    continue
+                componentes = analitica['componentes']
+                print(f"\n--- Analítica del grafo de {self.grafo_actual_tipo} ---")
+                print(f"Componentes conexas: {len(componentes)} (la mayor tiene {len(componentes[0])} nodos)")
+                print("Nodos con mayor intermediación:")
+                intermediacion = analitica['centralidad']['intermediacion']
+                grado = analitica['centralidad']['grado']
+                for i, nodo in enumerate(sorted(intermediacion, key=intermediacion.get, reverse=True)[:5], 1):
+                    print(f"{i}. {nodo} (Intermediación: {intermediacion[nodo]:.4f}, Grado: {grado[nodo]:.4f})")
+                comunidades = analitica['comunidades']
+                print(f"Comunidades detectadas: {len(comunidades)}")
+                for i, comunidad in enumerate(comunidades[:5], 1):
+                    print(f"{i}. {len(comunidad)} nodos, p. ej.: {', '.join(comunidad[:3])}")
             elif opcion == "0":
                 break
             else:
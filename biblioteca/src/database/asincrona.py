@@ -0,0 +1,169 @@
+"""
+Acceso asíncrono (asyncio) a la base de datos SQLite de la biblioteca
+"""
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+_FIN = object()
+
+
+class DatabaseAsincrona:
+    """
+    Fachada asyncio sobre Database para servicios que no pueden bloquear el bucle.
+
+    Las lecturas se ejecutan en `lectores` hilos, cada uno con su conexión del pool;
+    con WAL avanzan en paralelo entre sí y con el escritor. Las escrituras pasan por
+    una cola a un único hilo escritor, que agrupa todas las que encuentra pendientes
+    (hasta `max_lote`) en una sola transacción: con muchas peticiones concurrentes se
+    paga un commit por lote y no uno por petición. Cada escritura va en su propio
+    SAVEPOINT, así que si una falla solo se deshace ella y solo su llamada recibe la
+    excepción.
+
+    Usa la Database compartida del fichero aunque ya la hayan abierto el repositorio,
+    el buscador o la aplicación: pide `lectores + 1` conexiones como mínimo, y el
+    pool solo crece si tenía menos. Si ya estaba abierta, se mantiene su `perfil`.
+
+    Uso:
+        async with DatabaseAsincrona(ruta) as db:
+            await db.ejecutar("UPDATE libros SET disponible = 0 WHERE isbn = ?", (isbn,))
+            filas = await db.consultar("SELECT * FROM libros WHERE disponible = 1")
+    """
+
+    def __init__(self, db_path=None, lectores=4, max_lote=500, perfil=None):
+        self._db = Database(db_path, max_conexiones=lectores + 1, perfil=perfil)
+        self._db.create_tables()
+        self.db_path = self._db.db_path
+        self.max_lote = max_lote
+        self.operaciones_escritas = 0
+        self.lotes_escritos = 0
+
+        self._cerrado = False
+        self._cola = queue.Queue()
+        self._lectores = ThreadPoolExecutor(max_workers=lectores, thread_name_prefix="lector-db")
+        self._escritor = threading.Thread(target=self._escribir, name="escritor-db", daemon=True)
+        self._escritor.start()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, tipo, valor, traza):
+        await self.cerrar()
+
+    # --- Lecturas ---
+    async def consultar(self, query, params=None):
+        """Ejecuta una consulta de lectura en un hilo lector y devuelve sus filas."""
+        return await self.leer(self._db.consultar, query, params)
+
+    async def leer(self, funcion, *args):
+        """
+        Ejecuta `funcion(*args)` en un hilo lector, por ejemplo un informe de database.informes.
+
+        No debe escribir: las escrituras fuera del hilo escritor competirían con él por el bloqueo.
+        """
+        self._comprobar_abierta()
+        return await asyncio.get_running_loop().run_in_executor(self._lectores, funcion, *args)
+
+    # --- Escrituras ---
+    async def ejecutar(self, query, params=None):
+        """Encola una sentencia de escritura y espera a que se confirme; devuelve las filas afectadas."""
+        return await self.escribir(self._db.ejecutar, query, params)
+
+    async def ejecutar_lote(self, query, filas):
+        """Encola un executemany como una sola operación; devuelve las filas afectadas."""
+        return await self.escribir(self._db.ejecutar_lote, query, filas)
+
+    async def escribir(self, funcion, *args):
+        """
+        Ejecuta `funcion(*args)` en el hilo escritor, dentro de la transacción del lote.
+
+        Sirve para escrituras de varias sentencias que deben ser atómicas entre sí (un
+        préstamo y el cambio de disponibilidad del libro): la función recibe sus
+        argumentos y escribe con los métodos de Database.
+
+        Returns:
+            El valor devuelto por la función, una vez confirmado el lote
+        """
+        self._comprobar_abierta()
+        bucle = asyncio.get_running_loop()
+        futuro = bucle.create_future()
+        self._cola.put((funcion, args, bucle, futuro))
+        return await futuro
+
+    def _comprobar_abierta(self):
+        if self._cerrado:
+            raise RuntimeError("La base de datos asíncrona está cerrada")
+
+    def _escribir(self):
+        """Bucle del hilo escritor: cada lote son todas las operaciones que esperan en la cola."""
+        terminar = False
+        while not terminar:
+            operaciones = [self._cola.get()]
+            while len(operaciones) < self.max_lote:
+                try:
+                    operaciones.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            if _FIN in operaciones:
+                # cerrar() encola el fin después de la última escritura aceptada
+                operaciones.remove(_FIN)
+                terminar = True
+            if operaciones:
+                self._escribir_lote(operaciones)
+
+    def _escribir_lote(self, operaciones):
+        resultados = []
+        try:
+            with self._db.transaccion():
+                for funcion, args, _, _ in operaciones:
+                    try:
+                        with self._db.transaccion():
+                            resultados.append((funcion(*args), None))
+                    except Exception as e:
+                        resultados.append((None, e))
+        except Exception as e:
+            # Falló el commit: no se ha escrito ninguna operación del lote
+            logger.error("Error al confirmar un lote de %s escrituras: %s", len(operaciones), e)
+            resultados = [(None, e)] * len(operaciones)
+        else:
+            self.lotes_escritos += 1
+            self.operaciones_escritas += sum(1 for _, error in resultados if error is None)
+        for (_, _, bucle, futuro), (resultado, error) in zip(operaciones, resultados):
+            try:
+                bucle.call_soon_threadsafe(self._resolver, futuro, resultado, error)
+            except RuntimeError:
+                # El bucle que esperaba la respuesta ya se cerró
+                pass
+
+    @staticmethod
+    def _resolver(futuro, resultado, error):
+        if futuro.done():  # Cancelado mientras esperaba
+            return
+        if error is not None:
+            futuro.set_exception(error)
+        else:
+            futuro.set_result(resultado)
+
+    def estadisticas(self):
+        """Devuelve los contadores de escritura y las escrituras aún en cola."""
+        return {
+            'operaciones_escritas': self.operaciones_escritas,
+            'lotes_escritos': self.lotes_escritos,
+            'pendientes': self._cola.qsize()
+        }
+
+    async def cerrar(self):
+        """Espera a las escrituras encoladas y detiene los hilos; la Database compartida sigue abierta."""
+        if self._cerrado:
+            return
+        self._cerrado = True
+        self._cola.put(_FIN)
+        bucle = asyncio.get_running_loop()
+        await bucle.run_in_executor(None, self._escritor.join)
+        await bucle.run_in_executor(None, self._lectores.shutdown)
@@ -0,0 +1,173 @@
+"""
+Búsqueda de libros con un índice FTS5 de SQLite sobre título, autor y género
+"""
+import re
+import sqlite3
+
+from .database import Database, normalizar_texto
+
+# El índice no guarda copia de los textos (content='libros'): lee las columnas de la
+# tabla libros por rowid. unicode61 con remove_diacritics 2 pasa a minúsculas y quita
+# las tildes igual que normalizar_texto, y prefix='2 3' indexa aparte los prefijos
+# cortos para que las búsquedas "quij*" no recorran todo el vocabulario.
+SQL_INDICE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS libros_fts USING fts5(
+        titulo, autor, genero,
+        content='libros', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+"""
+
+# Disparadores que mantienen el índice al día con cualquier escritura en libros. El de
+# UPDATE solo actúa si cambian los textos: prestar o devolver un libro (disponible)
+# no toca el índice.
+DISPARADORES = [
+    """
+    CREATE TRIGGER IF NOT EXISTS libros_fts_alta AFTER INSERT ON libros BEGIN
+        INSERT INTO libros_fts (rowid, titulo, autor, genero) VALUES (new.id, new.titulo, new.autor, new.genero);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS libros_fts_baja AFTER DELETE ON libros BEGIN
+        INSERT INTO libros_fts (libros_fts, rowid, titulo, autor, genero)
+        VALUES ('delete', old.id, old.titulo, old.autor, old.genero);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS libros_fts_cambio AFTER UPDATE OF titulo, autor, genero ON libros
+    WHEN old.titulo IS NOT new.titulo OR old.autor IS NOT new.autor OR old.genero IS NOT new.genero BEGIN
+        INSERT INTO libros_fts (libros_fts, rowid, titulo, autor, genero)
+        VALUES ('delete', old.id, old.titulo, old.autor, old.genero);
+        INSERT INTO libros_fts (rowid, titulo, autor, genero) VALUES (new.id, new.titulo, new.autor, new.genero);
+    END
+    """,
+]
+
+# Peso de cada columna en bm25: una coincidencia en el título cuenta más que en el género
+PESOS = {"titulo": 10.0, "autor": 5.0, "genero": 1.0}
+
+SQL_BUSCAR = """
+    SELECT l.id, l.titulo, l.autor, l.genero, l.isbn, l.disponible
+    FROM libros_fts
+    JOIN libros l ON l.id = libros_fts.rowid
+    WHERE libros_fts MATCH ?
+    ORDER BY bm25(libros_fts, {pesos})
+    LIMIT ?
+""".format(pesos=", ".join(str(peso) for peso in PESOS.values()))
+
+
+def crear_indice_busqueda(conexion):
+    """
+    Crea el índice FTS5 y sus disparadores si no existen.
+
+    Al crearlo por primera vez se indexan los libros que ya hubiera en la tabla.
+
+    Returns:
+        bool: True si el índice se acaba de crear
+    """
+    if conexion.in_transaction:
+        conexion.commit()
+    conexion.execute("BEGIN IMMEDIATE")
+    try:
+        existia = conexion.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'libros_fts'"
+        ).fetchone() is not None
+        conexion.execute(SQL_INDICE)
+        for query in DISPARADORES:
+            conexion.execute(query)
+        if not existia:
+            conexion.execute("INSERT INTO libros_fts (libros_fts) VALUES ('rebuild')")
+        conexion.commit()
+    except BaseException:
+        conexion.rollback()
+        raise
+    return not existia
+
+
+def _terminos(texto):
+    """Palabras de la búsqueda ya normalizadas; se entrecomillan para que no se lean como operadores FTS5."""
+    return re.findall(r"\w+", normalizar_texto(texto or ""))
+
+
+class BuscadorLibros:
+    """
+    Búsquedas sobre los libros guardados en SQLite sin cargarlos en memoria.
+
+    Ofrece tres modos, todos ordenados por relevancia (bm25) y limitados a `limite`
+    resultados:
+    - prefijo: cada palabra es el comienzo de una palabra del libro ("quij cerv")
+    - frase: las palabras aparecen seguidas y en ese orden ("cien anos")
+    - palabras: aparecen todas las palabras, en cualquier orden y posición
+
+    `campo` restringe la búsqueda a "titulo", "autor" o "genero". Los libros se
+    devuelven como filas (id, titulo, autor, genero, isbn, disponible).
+    """
+
+    MODOS = ("prefijo", "frase", "palabras")
+
+    def __init__(self, db_path=None, perfil=None):
+        self._db = Database(db_path, perfil=perfil)
+        self._db.create_tables()
+        self.db_path = self._db.db_path
+        try:
+            with self._db.conexion() as conexion:
+                crear_indice_busqueda(conexion)
+        except sqlite3.Error as e:
+            print(f"Error al crear el índice de búsqueda: {e}")
+            raise
+
+    @staticmethod
+    def consulta_fts(texto, modo="prefijo", campo=None):
+        """
+        Traduce un texto libre a una expresión MATCH de FTS5.
+
+        Returns:
+            str: La expresión, o None si el texto no tiene ninguna palabra
+        """
+        if modo not in BuscadorLibros.MODOS:
+            raise ValueError(f"Modo de búsqueda no válido: {modo}")
+        if campo is not None and campo not in PESOS:
+            raise ValueError(f"Campo de búsqueda no válido: {campo}")
+        terminos = _terminos(texto)
+        if not terminos:
+            return None
+        if modo == "frase":
+            expresion = '"' + " ".join(terminos) + '"'
+        elif modo == "prefijo":
+            expresion = " ".join(f'"{termino}"*' for termino in terminos)
+        else:
+            expresion = " ".join(f'"{termino}"' for termino in terminos)
+        if campo is not None:
+            expresion = f"{campo} : ({expresion})"
+        return expresion
+
+    def buscar(self, texto, modo="prefijo", campo=None, limite=50):
+        """
+        Busca libros por relevancia.
+
+        Args:
+            texto (str): Palabras a buscar; las tildes y mayúsculas no importan
+            modo (str): "prefijo", "frase" o "palabras"
+            campo (str): "titulo", "autor", "genero" o None para los tres
+            limite (int): Número máximo de resultados
+
+        Returns:
+            list: Filas de los libros encontrados, el más relevante primero
+        """
+        expresion = self.consulta_fts(texto, modo, campo)
+        if expresion is None:
+            return []
+        return list(self._db.iterar(SQL_BUSCAR, (expresion, limite)))
+
+    def buscar_prefijo(self, texto, campo=None, limite=50):
+        """Libros con palabras que empiezan por cada palabra de `texto`."""
+        return self.buscar(texto, "prefijo", campo, limite)
+
+    def buscar_frase(self, texto, campo=None, limite=50):
+        """Libros en los que aparece `texto` como frase exacta."""
+        return self.buscar(texto, "frase", campo, limite)
+
+    def reconstruir(self):
+        """Vuelve a indexar todos los libros a partir de la tabla libros."""
+        self._db.ejecutar("INSERT INTO libros_fts (libros_fts) VALUES ('rebuild')")
@@ -3,94 +3,730 @@ Módulo para la gestión de la base de datos SQLite
 """
 import sqlite3
 import os
+import threading
+import time
+import logging
+import unicodedata
+import weakref
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+RUTA_DB = os.path.join(os.path.dirname(__file__), 'biblioteca.db')
+
+# Sentencias preparadas que guarda cada conexión (sqlite3 usa 128 por defecto). Las
+# sentencias de la aplicación son constantes, así que con este margen nunca se
+# vuelven a compilar; solo el SQL construido al vuelo desplaza a otras.
+SENTENCIAS_EN_CACHE = 256
+
+# Sentencias distintas de las que MetricasConsultas guarda métricas propias. El SQL
+# construido al vuelo (listas IN de longitud variable, filtros opcionales) podría
+# crear una entrada por variante; a partir de este número se suman en OTRAS_SENTENCIAS
+MAX_SENTENCIAS_METRICAS = 500
+OTRAS_SENTENCIAS = "(otras sentencias)"
+
+# Límites superiores, en segundos, de los intervalos del histograma de latencias
+LIMITES_HISTOGRAMA = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                      0.5, 1.0, 5.0, float("inf"))
+
+# Pragmas por perfil de durabilidad. Con WAL los lectores no bloquean al escritor;
+# synchronous decide cuándo se sincroniza con el disco:
+# - "seguro": cada commit se sincroniza (FULL), no se pierde nada ante un corte de luz
+# - "equilibrado": se sincroniza en cada checkpoint (NORMAL); un corte puede perder
+#   los últimos commits, pero la base de datos nunca queda corrupta
+# - "rapido": sin sincronizar (OFF); solo para cargas masivas que se pueden repetir
+# - "clasico": el diario de rollback por defecto de SQLite, como referencia
+PERFILES = {
+    "seguro": {
+        "journal_mode": "WAL", "synchronous": "FULL", "cache_size": -16000, "mmap_size": 0,
+        "temp_store": "MEMORY", "busy_timeout": 5000, "wal_autocheckpoint": 1000,
+    },
+    "equilibrado": {
+        "journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -65536, "mmap_size": 268435456,
+        "temp_store": "MEMORY", "busy_timeout": 5000, "wal_autocheckpoint": 1000,
+    },
+    "rapido": {
+        "journal_mode": "WAL", "synchronous": "OFF", "cache_size": -262144, "mmap_size": 1073741824,
+        "temp_store": "MEMORY", "busy_timeout": 5000, "wal_autocheckpoint": 4000,
+    },
+    "clasico": {
+        "journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": 5000,
+    },
+}
+
+TABLAS = [
+    """
+    CREATE TABLE IF NOT EXISTS libros (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        titulo TEXT NOT NULL,
+        autor TEXT NOT NULL,
+        genero TEXT,
+        isbn TEXT UNIQUE,
+        disponible INTEGER DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        telefono TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS prestamos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        libro_id INTEGER,
+        usuario_id INTEGER,
+        fecha_prestamo TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        fecha_devolucion TIMESTAMP,
+        devuelto INTEGER DEFAULT 0,
+        codigo TEXT,
+        FOREIGN KEY (libro_id) REFERENCES libros (id),
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    """
+]
+
+INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_prestamos_usuario ON prestamos (usuario_id)",
+    "CREATE INDEX IF NOT EXISTS idx_prestamos_libro ON prestamos (libro_id)",
+    # Solo los préstamos sin devolver: un índice pequeño aunque el historial crezca
+    "CREATE INDEX IF NOT EXISTS idx_prestamos_activos ON prestamos (usuario_id, libro_id) WHERE devuelto = 0",
+    "CREATE INDEX IF NOT EXISTS idx_libros_titulo ON libros (titulo_normalizado)",
+    "CREATE INDEX IF NOT EXISTS idx_libros_autor ON libros (autor_normalizado)",
+]
+
+
+def normalizar_texto(texto):
+    """Minúsculas y sin tildes, igual que Biblioteca.normalizar_texto."""
+    if isinstance(texto, str):
+        texto = texto.lower()
+        texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('utf-8')
+    return texto
+
+
+def _esquema_inicial(conexion):
+    """Versión 1: las tablas y el código de préstamo que asigna la clase Biblioteca."""
+    for query in TABLAS:
+        conexion.execute(query)
+    # Las tablas creadas antes de versionar el esquema pueden no tener `codigo`
+    columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(prestamos)")}
+    if 'codigo' not in columnas:
+        conexion.execute("ALTER TABLE prestamos ADD COLUMN codigo TEXT")
+    conexion.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_prestamos_codigo ON prestamos (codigo)")
+
+
+def _indices_consultas(conexion):
+    """
+    Versión 2: índices para los préstamos de un usuario o de un libro, los préstamos
+    activos y la búsqueda de libros por título o autor normalizados.
+
+    Los textos normalizados se guardan en columnas (las rellena quien escribe los
+    libros, ver normalizar_texto) en lugar de indexar una función de Python, que
+    tendría que estar registrada en cualquier conexión que escriba en la tabla.
+    """
+    conexion.execute("ALTER TABLE libros ADD COLUMN titulo_normalizado TEXT")
+    conexion.execute("ALTER TABLE libros ADD COLUMN autor_normalizado TEXT")
+    conexion.create_function("normalizar_texto", 1, normalizar_texto, deterministic=True)
+    conexion.execute("""
+        UPDATE libros SET titulo_normalizado = normalizar_texto(titulo), autor_normalizado = normalizar_texto(autor)
+    """)
+    for query in INDICES:
+        conexion.execute(query)
+
+
+# Migraciones del esquema en orden: la posición i lleva la base de datos a la versión
+# i + 1, que se guarda en PRAGMA user_version. Solo se añaden migraciones al final.
+MIGRACIONES = [
+    _esquema_inicial,
+    _indices_consultas,
+]
+VERSION_ESQUEMA = len(MIGRACIONES)
+
+
+def aplicar_perfil(conexion, perfil="equilibrado", pragmas=None):
+    """
+    Aplica a una conexión los pragmas de un perfil de PERFILES.
+
+    `pragmas` permite sustituir o añadir pragmas concretos del perfil.
+    """
+    if perfil not in PERFILES:
+        raise ValueError(f"Perfil de SQLite no válido: {perfil}")
+    for nombre, valor in dict(PERFILES[perfil], **(pragmas or {})).items():
+        # journal_mode devuelve una fila que hay que consumir
+        conexion.execute(f"PRAGMA {nombre} = {valor}").fetchall()
+
+
+def crear_esquema(conexion):
+    """
+    Crea las tablas en una conexión o aplica las migraciones que le falten.
+
+    Cada migración se ejecuta en su propia transacción junto con el cambio de
+    user_version, así que una migración interrumpida se repite entera. BEGIN
+    IMMEDIATE impide que dos procesos migren a la vez la misma base de datos.
+
+    Returns:
+        int: Versión del esquema tras migrar
+    """
+    if conexion.in_transaction:
+        conexion.commit()
+    version = conexion.execute("PRAGMA user_version").fetchone()[0]
+    while version < VERSION_ESQUEMA:
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            # Otro proceso puede haber migrado mientras se esperaba el bloqueo
+            version = conexion.execute("PRAGMA user_version").fetchone()[0]
+            if version < VERSION_ESQUEMA:
+                MIGRACIONES[version](conexion)
+                version += 1
+                conexion.execute(f"PRAGMA user_version = {version}")
+            conexion.commit()
+        except BaseException:
+            conexion.rollback()
+            raise
+    return version
+
+
+class _Reserva:
+    """Conexión reservada por un hilo y número de reservas anidadas sobre ella."""
+
+    __slots__ = ('conexion', 'reservas', 'devolver', '__weakref__')
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.reservas = 1
+        self.devolver = None
+
+
+class PoolConexiones:
+    """
+    Conjunto acotado de conexiones SQLite reutilizables entre hilos.
+
+    Cada hilo trabaja con una sola conexión mientras la tiene reservada (las reservas
+    anidadas del mismo hilo devuelven la misma), así que sus transacciones no se mezclan
+    con las de otros hilos. Al liberarla vuelve al conjunto de libres, y también si el
+    hilo termina sin liberarla; si lleva más de `intervalo_comprobacion` segundos sin
+    usarse, se comprueba con "SELECT 1" antes de entregarla y se reemplaza si ha
+    dejado de funcionar.
+
+    Las conexiones se abren con el perfil de pragmas `perfil` (ver PERFILES). Además
+    del checkpoint automático de SQLite cada `wal_autocheckpoint` páginas, al liberar
+    una conexión se hace un checkpoint pasivo si han pasado `intervalo_checkpoint`
+    segundos desde el anterior, para que el WAL no crezca con lectores continuos.
+    """
+
+    def __init__(self, db_path, max_conexiones=8, timeout=30.0, perfil="equilibrado", pragmas=None,
+                 intervalo_comprobacion=30.0, intervalo_checkpoint=60.0):
+        if perfil not in PERFILES:
+            raise ValueError(f"Perfil de SQLite no válido: {perfil}")
+        self.db_path = db_path
+        self.max_conexiones = max_conexiones
+        self.timeout = timeout
+        self.perfil = perfil
+        self.pragmas = pragmas
+        self.intervalo_comprobacion = intervalo_comprobacion
+        self.intervalo_checkpoint = intervalo_checkpoint
+        self._ultimo_checkpoint = time.monotonic()
+        self._libres = []  # (conexión, instante de su último uso)
+        self._todas = set()
+        self._bloqueo = threading.Lock()
+        self._semaforo = threading.Semaphore(max_conexiones)
+        self._local = threading.local()
+
+    def _abrir(self):
+        """Abre una conexión nueva con la configuración común del pool."""
+        conexion = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                                   cached_statements=SENTENCIAS_EN_CACHE)
+        conexion.row_factory = sqlite3.Row
+        aplicar_perfil(conexion, self.perfil, self.pragmas)
+        return conexion
+
+    @staticmethod
+    def _sana(conexion):
+        try:
+            conexion.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def adquirir(self):
+        """
+        Reserva la conexión del hilo actual, esperando hasta `timeout` si no quedan libres.
+
+        Cada llamada debe emparejarse con liberar(); si el hilo termina antes, la
+        reserva se libera sola.
+        """
+        return self._reservar().conexion
+
+    def liberar(self):
+        """Libera una reserva del hilo actual; con la última, la conexión vuelve al pool."""
+        reserva = getattr(self._local, 'reserva', None)
+        if reserva is not None:
+            self._soltar(reserva)
+
+    @contextmanager
+    def conexion(self):
+        """
+        Context manager que reserva la conexión del hilo actual y la libera al salir.
+
+        La liberación no depende del hilo que sale: un generador que tiene la conexión
+        reservada puede cerrarse o recogerse desde cualquier hilo.
+        """
+        reserva = self._reservar()
+        try:
+            yield reserva.conexion
+        finally:
+            self._soltar(reserva)
+
+    def _reservar(self):
+        local = self._local
+        reserva = getattr(local, 'reserva', None)
+        if reserva is not None:
+            with self._bloqueo:
+                if reserva.conexion is not None:
+                    reserva.reservas += 1
+                    return reserva
+        if not self._semaforo.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError(f"No hay conexiones libres tras esperar {self.timeout} s")
+        try:
+            conexion = None
+            with self._bloqueo:
+                if self._libres:
+                    conexion, ultimo_uso = self._libres.pop()
+            if conexion is not None and time.monotonic() - ultimo_uso > self.intervalo_comprobacion \
+                    and not self._sana(conexion):
+                self._descartar(conexion)
+                conexion = None
+            if conexion is None:
+                conexion = self._abrir()
+                with self._bloqueo:
+                    self._todas.add(conexion)
+        except BaseException:
+            self._semaforo.release()
+            raise
+        reserva = _Reserva(conexion)
+        # Los datos locales de un hilo se borran cuando termina: si aún tenía la
+        # conexión reservada (get_connection sin close), vuelve al pool en ese momento
+        reserva.devolver = weakref.finalize(reserva, self._devolver, conexion)
+        reserva.devolver.atexit = False
+        local.reserva = reserva
+        return reserva
+
+    def _soltar(self, reserva):
+        with self._bloqueo:
+            if reserva.conexion is None:
+                return
+            reserva.reservas -= 1
+            if reserva.reservas:
+                return
+            reserva.conexion = None
+        reserva.devolver()
+
+    def _devolver(self, conexion):
+        """Devuelve al pool una conexión cuya última reserva se ha liberado."""
+        try:
+            # Una transacción a medias no debe pasar al siguiente hilo
+            if conexion.in_transaction:
+                conexion.rollback()
+            if time.monotonic() - self._ultimo_checkpoint > self.intervalo_checkpoint:
+                self._ultimo_checkpoint = time.monotonic()
+                conexion.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        except sqlite3.Error:
+            self._descartar(conexion)
+        else:
+            with self._bloqueo:
+                if conexion in self._todas:
+                    self._libres.append((conexion, time.monotonic()))
+        finally:
+            self._semaforo.release()
+
+    def ampliar(self, max_conexiones):
+        """Sube el máximo de conexiones; pedir menos de las que ya hay no reduce el pool."""
+        with self._bloqueo:
+            nuevas = max_conexiones - self.max_conexiones
+            if nuevas <= 0:
+                return
+            self.max_conexiones = max_conexiones
+        self._semaforo.release(nuevas)
+
+    def _descartar(self, conexion):
+        with self._bloqueo:
+            self._todas.discard(conexion)
+        try:
+            conexion.close()
+        except sqlite3.Error:
+            pass
+
+    def estadisticas(self):
+        """Devuelve cuántas conexiones hay abiertas y cuántas están libres."""
+        with self._bloqueo:
+            return {'abiertas': len(self._todas), 'libres': len(self._libres), 'maximo': self.max_conexiones}
+
+    def checkpoint(self, modo="PASSIVE"):
+        """
+        Traslada el WAL a la base de datos (modos PASSIVE, FULL, RESTART o TRUNCATE).
+
+        Returns:
+            tuple: (bloqueado, páginas en el WAL, páginas trasladadas)
+        """
+        with self.conexion() as conexion:
+            self._ultimo_checkpoint = time.monotonic()
+            return tuple(conexion.execute(f"PRAGMA wal_checkpoint({modo})").fetchone())
+
+    def cerrar(self):
+        """Cierra todas las conexiones; las reservadas dejan de volver al pool."""
+        with self._bloqueo:
+            conexiones, self._todas, self._libres = self._todas, set(), []
+        for conexion in conexiones:
+            try:
+                conexion.close()
+            except sqlite3.Error:
+                pass
+
+
+@lru_cache(maxsize=1024)
+def _clave_sentencia(query):
+    """SQL de una sentencia en una sola línea, para agrupar sus métricas."""
+    return " ".join(query.split())
+
+
+class MetricasConsultas:
+    """
+    Histograma de latencias por sentencia y registro de consultas lentas.
+
+    Cada sentencia (agrupada por su SQL en una sola línea, no por sus parámetros)
+    acumula llamadas, tiempo total, máximo y un histograma con los intervalos de
+    LIMITES_HISTOGRAMA. Se guardan como mucho `max_sentencias` sentencias; las nuevas
+    que llegan después se acumulan juntas en OTRAS_SENTENCIAS. Las que tardan más de
+    `umbral_lenta` segundos se registran en el log con su EXPLAIN QUERY PLAN y se
+    guardan las últimas `max_lentas`.
+    """
+
+    def __init__(self, umbral_lenta=0.1, max_lentas=100, max_sentencias=MAX_SENTENCIAS_METRICAS):
+        self.umbral_lenta = umbral_lenta
+        self.max_sentencias = max_sentencias
+        self._sentencias = {}
+        self._lentas = deque(maxlen=max_lentas)
+        self._bloqueo = threading.Lock()
+
+    def registrar(self, query, duracion, conexion=None, params=None):
+        """Añade una ejecución de `query`; si es lenta y hay conexión, obtiene su plan."""
+        intervalo = bisect_left(LIMITES_HISTOGRAMA, duracion)
+        clave = _clave_sentencia(query)
+        with self._bloqueo:
+            metrica = self._sentencias.get(clave)
+            if metrica is None:
+                if len(self._sentencias) >= self.max_sentencias:
+                    clave = OTRAS_SENTENCIAS
+                    metrica = self._sentencias.get(clave)
+                if metrica is None:
+                    metrica = self._sentencias[clave] = [0, 0.0, 0.0, [0] * len(LIMITES_HISTOGRAMA)]
+            metrica[0] += 1
+            metrica[1] += duracion
+            if duracion > metrica[2]:
+                metrica[2] = duracion
+            metrica[3][intervalo] += 1
+        if duracion >= self.umbral_lenta:
+            sql = _clave_sentencia(query)
+            plan = self._plan(conexion, query, params) if conexion is not None else None
+            with self._bloqueo:
+                self._lentas.append({'sql': sql, 'segundos': duracion, 'plan': plan, 'instante': time.time()})
+            logger.warning("Consulta lenta (%.3f s): %s\n%s", duracion, sql, "\n".join(plan or ()))
+
+    @staticmethod
+    def _plan(conexion, query, params):
+        try:
+            filas = conexion.execute(f"EXPLAIN QUERY PLAN {query}", params or ()).fetchall()
+        except sqlite3.Error as e:
+            return [f"(sin plan: {e})"]
+        return [fila[3] for fila in filas]
+
+    def estadisticas(self):
+        """
+        Devuelve las métricas de cada sentencia.
+
+        Returns:
+            dict: Por SQL, llamadas, total, media y máximo en segundos, p50/p95/p99
+            (límite superior del intervalo del histograma en que caen) e histograma
+        """
+        with self._bloqueo:
+            copia = {clave: (llamadas, total, maximo, list(histograma))
+                     for clave, (llamadas, total, maximo, histograma) in self._sentencias.items()}
+        resultado = {}
+        for clave, (llamadas, total, maximo, histograma) in copia.items():
+            resultado[clave] = {
+                'llamadas': llamadas, 'total': total, 'media': total / llamadas, 'maximo': maximo,
+                'p50': self._percentil(histograma, llamadas, 0.50, maximo),
+                'p95': self._percentil(histograma, llamadas, 0.95, maximo),
+                'p99': self._percentil(histograma, llamadas, 0.99, maximo),
+                'histograma': dict(zip(LIMITES_HISTOGRAMA, histograma)),
+            }
+        return resultado
+
+    @staticmethod
+    def _percentil(histograma, llamadas, fraccion, maximo):
+        acumuladas = 0
+        for limite, cuenta in zip(LIMITES_HISTOGRAMA, histograma):
+            acumuladas += cuenta
+            if acumuladas >= fraccion * llamadas:
+                return min(limite, maximo)
+        return maximo
+
+    def lentas(self):
+        """Últimas consultas que superaron el umbral, de la más antigua a la más reciente."""
+        with self._bloqueo:
+            return list(self._lentas)
+
+    def reiniciar(self):
+        """Borra las métricas y el registro de consultas lentas."""
+        with self._bloqueo:
+            self._sentencias.clear()
+            self._lentas.clear()
+
 
 class Database:
-    _instance = None
-    _connection = None
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(Database, cls).__new__(cls)
-            cls._initialize_connection()
-        return cls._instance
-
-    @classmethod
-    def _initialize_connection(cls):
-        """Inicializa la conexión a la base de datos"""
+    """
+    Acceso a la base de datos SQLite a través de un pool de conexiones.
+
+    Hay una instancia por fichero: Database() es la de la base de datos de la
+    aplicación y Database(ruta) la de otro fichero. `max_conexiones` (8 por defecto)
+    y `perfil` (los pragmas de durabilidad de PERFILES, "equilibrado" por defecto) se
+    aplican al crear la instancia o al reabrirla tras close(). Con el fichero ya
+    abierto, `max_conexiones` es un mínimo: un valor mayor amplía el pool y uno menor
+    se ignora; otro `perfil` se ignora con un aviso en el log.
+
+    Las lecturas van por consultar() o iterar() y las escrituras por ejecutar() o
+    ejecutar_lote(). Todas miden su latencia en `metricas` (ver MetricasConsultas);
+    `metricas.umbral_lenta` fija a partir de cuántos segundos se registra una consulta
+    como lenta.
+    """
+    _instancias = {}
+    _bloqueo_instancias = threading.Lock()
+
+    def __new__(cls, db_path=None, max_conexiones=None, perfil=None):
+        db_path = os.path.abspath(db_path or RUTA_DB)
+        with cls._bloqueo_instancias:
+            instancia = cls._instancias.get(db_path)
+            if instancia is None:
+                instancia = super(Database, cls).__new__(cls)
+                instancia.db_path = db_path
+                instancia.max_conexiones = max_conexiones or 8
+                instancia.perfil = perfil or "equilibrado"
+                instancia._pool = None
+                instancia._local = threading.local()  # Profundidad de transacción del hilo
+                instancia.metricas = MetricasConsultas()
+                instancia._initialize_connection()
+                cls._instancias[db_path] = instancia
+            elif instancia._pool is None:
+                # Cerrada: se reabre con la configuración pedida
+                instancia.max_conexiones = max_conexiones or instancia.max_conexiones
+                instancia.perfil = perfil or instancia.perfil
+            else:
+                if max_conexiones is not None and max_conexiones > instancia.max_conexiones:
+                    instancia._pool.ampliar(max_conexiones)
+                    instancia.max_conexiones = max_conexiones
+                if perfil is not None and perfil != instancia.perfil:
+                    logger.warning("La base de datos %s ya está abierta con el perfil %r; se ignora %r",
+                                   db_path, instancia.perfil, perfil)
+        return instancia
+
+    def _initialize_connection(self):
+        """Crea el pool de conexiones y comprueba que la base de datos se puede abrir"""
         try:
-            db_path = os.path.join(os.path.dirname(__file__), 'biblioteca.db')
-            cls._connection = sqlite3.connect(db_path)
-            cls._connection.row_factory = sqlite3.Row
+            self._pool = PoolConexiones(self.db_path, self.max_conexiones, perfil=self.perfil)
+            with self._pool.conexion():
+                pass
         except Exception as e:
             print(f"Error al conectar a la base de datos: {e}")
             raise
 
+    def conexion(self):
+        """
+        Reserva una conexión del pool para el hilo actual.
+
+        Uso: `with db.conexion() as conn: ...`
+        """
+        if self._pool is None:
+            self._initialize_connection()
+        return self._pool.conexion()
+
     def get_connection(self):
-        """Obtiene la conexión a la base de datos"""
-        if self._connection is None:
+        """Obtiene la conexión del hilo actual, reservada hasta close() o hasta que el hilo termine"""
+        if self._pool is None:
             self._initialize_connection()
-        return self._connection
+        return self._pool.adquirir()
+
+    def _en_transaccion(self):
+        return getattr(self._local, 'profundidad', 0) > 0
+
+    def consultar(self, query, params=None):
+        """
+        Ejecuta una consulta de lectura y devuelve todas sus filas.
+
+        Para resultados grandes, iterar() las lee por bloques.
+        """
+        return self._ejecutar(query, params, leer=True)
+
+    def ejecutar(self, query, params=None):
+        """
+        Ejecuta una sentencia de escritura y devuelve el número de filas afectadas.
+
+        Se confirma al terminar, salvo dentro de una transaccion(), que la confirma al salir.
+        """
+        return self._ejecutar(query, params, leer=False)
 
     def execute_query(self, query, params=None):
-        """Ejecuta una consulta y retorna los resultados"""
+        """
+        Ejecuta una sentencia y retorna sus filas si las produce o, si no, las filas afectadas.
+
+        Se mantiene por compatibilidad: consultar() y ejecutar() dicen explícitamente qué
+        se espera de la sentencia.
+        """
+        return self._ejecutar(query, params, leer=None)
+
+    def _ejecutar(self, query, params, leer):
+        # leer=None decide según si la sentencia devuelve columnas (SELECT, WITH, PRAGMA, EXPLAIN...)
+        en_transaccion = self._en_transaccion()
+        with self.conexion() as conexion:
+            cursor = conexion.cursor()
+            try:
+                inicio = time.perf_counter()
+                cursor.execute(query, params or ())
+                if leer or (leer is None and cursor.description is not None):
+                    filas = cursor.fetchall()
+                    self.metricas.registrar(query, time.perf_counter() - inicio, conexion, params)
+                    return filas
+                if not en_transaccion:
+                    conexion.commit()
+                self.metricas.registrar(query, time.perf_counter() - inicio, conexion, params)
+                return cursor.rowcount
+            except Exception as e:
+                if not en_transaccion:
+                    conexion.rollback()
+                print(f"Error al ejecutar la consulta: {e}")
+                raise
+            finally:
+                cursor.close()
+
+    def iterar(self, query, params=None, tam_lote=1000, tuplas=False):
+        """
+        Genera las filas de una consulta leyéndolas por bloques con fetchmany.
+
+        A diferencia de consultar, nunca hay más de `tam_lote` filas en memoria. Con
+        tuplas=True se devuelven tuplas en lugar de sqlite3.Row, que son más baratas de
+        crear. La conexión queda reservada hasta agotar o cerrar el generador, aunque se
+        cierre o se recoja desde otro hilo.
+        La latencia registrada es la de SQLite, sin el tiempo que pasa el consumidor con
+        cada bloque.
+        """
+        with self.conexion() as conexion:
+            cursor = conexion.cursor()
+            if tuplas:
+                cursor.row_factory = None
+            duracion = 0.0
+            try:
+                inicio = time.perf_counter()
+                cursor.execute(query, params or ())
+                while True:
+                    bloque = cursor.fetchmany(tam_lote)
+                    duracion += time.perf_counter() - inicio
+                    if not bloque:
+                        break
+                    yield from bloque
+                    inicio = time.perf_counter()
+                self.metricas.registrar(query, duracion, conexion, params)
+            except sqlite3.Error as e:
+                print(f"Error al ejecutar la consulta: {e}")
+                raise
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def transaccion(self):
+        """
+        Agrupa en una transacción las operaciones del hilo actual.
+
+        Al salir sin errores se confirma y con una excepción se deshace. Una
+        transaccion() dentro de otra se convierte en un SAVEPOINT: si su excepción se
+        captura fuera, solo se deshace su parte y la exterior puede continuar.
+
+        Uso: `with db.transaccion() as conn: ...`
+        """
+        with self.conexion() as conexion:
+            profundidad = getattr(self._local, 'profundidad', 0)
+            self._local.profundidad = profundidad + 1
+            try:
+                if profundidad == 0:
+                    if not conexion.in_transaction:
+                        conexion.execute("BEGIN")
+                    try:
+                        yield conexion
+                    except BaseException:
+                        conexion.rollback()
+                        raise
+                    conexion.commit()
+                else:
+                    punto = f"punto_{profundidad}"
+                    conexion.execute(f"SAVEPOINT {punto}")
+                    try:
+                        yield conexion
+                    except BaseException:
+                        conexion.execute(f"ROLLBACK TO {punto}")
+                        conexion.execute(f"RELEASE {punto}")
+                        raise
+                    conexion.execute(f"RELEASE {punto}")
+            finally:
+                self._local.profundidad = profundidad
+
+    def ejecutar_lote(self, query, filas, tam_lote=10000):
+        """
+        Ejecuta una sentencia con executemany para cada fila de un iterable.
+
+        Las filas se consumen por bloques de `tam_lote`, así que sirve para generadores
+        de cualquier tamaño sin cargarlos en memoria; todos los bloques van en una sola
+        transacción (o en un SAVEPOINT si ya hay una abierta).
+
+        Returns:
+            int: Número de filas afectadas
+        """
+        filas = iter(filas)
+        afectadas = 0
         try:
-            cursor = self._connection.cursor()
-            cursor.execute(query, params or ())
-            if query.strip().upper().startswith('SELECT'):
-                return cursor.fetchall()
-            self._connection.commit()
-            return cursor.rowcount
+            with self.transaccion() as conexion:
+                while True:
+                    bloque = list(islice(filas, tam_lote))
+                    if not bloque:
+                        break
+                    inicio = time.perf_counter()
+                    afectadas += conexion.executemany(query, bloque).rowcount
+                    self.metricas.registrar(query, time.perf_counter() - inicio, conexion, bloque[0])
         except Exception as e:
-            self._connection.rollback()
-            print(f"Error al ejecutar la consulta: {e}")
+            print(f"Error al ejecutar el lote: {e}")
             raise
-        finally:
-            cursor.close()
+        return afectadas
 
     def create_tables(self):
         """Crea las tablas necesarias en la base de datos"""
-        queries = [
-            """
-            CREATE TABLE IF NOT EXISTS libros (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                titulo TEXT NOT NULL,
-                autor TEXT NOT NULL,
-                genero TEXT,
-                isbn TEXT UNIQUE,
-                disponible INTEGER DEFAULT 1
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                telefono TEXT
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS prestamos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                libro_id INTEGER,
-                usuario_id INTEGER,
-                fecha_prestamo TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                fecha_devolucion TIMESTAMP,
-                devuelto INTEGER DEFAULT 0,
-                FOREIGN KEY (libro_id) REFERENCES libros (id),
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-            """
-        ]
-        
-        for query in queries:
-            try:
-                self.execute_query(query)
-            except Exception as e:
-                print(f"Error al crear las tablas: {e}")
-                raise
+        try:
+            with self.conexion() as conexion:
+                crear_esquema(conexion)
+        except Exception as e:
+            print(f"Error al crear las tablas: {e}")
+            raise
+
+    def checkpoint(self, modo="PASSIVE"):
+        """Fuerza un checkpoint del WAL (ver PoolConexiones.checkpoint)"""
+        if self._pool is None:
+            self._initialize_connection()
+        return self._pool.checkpoint(modo)
 
     def close(self):
-        """Cierra la conexión a la base de datos"""
-        if self._connection is not None:
-            self._connection.close()
-            self._connection = None 
\ No newline at end of file
+        """Cierra todas las conexiones del pool"""
+        if self._pool is not None:
+            self._pool.cerrar()
+            self._pool = None
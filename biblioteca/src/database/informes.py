@@ -0,0 +1,67 @@
+"""
+Informes y exportaciones sobre los préstamos guardados en SQLite
+"""
+import csv
+
+COLUMNAS_HISTORIAL = ("codigo", "isbn", "titulo", "correo", "usuario", "fecha_prestamo", "fecha_devolucion",
+                      "devuelto")
+
+SQL_HISTORIAL = """
+    SELECT p.codigo, l.isbn, l.titulo, u.email, u.nombre, p.fecha_prestamo, p.fecha_devolucion, p.devuelto
+    FROM prestamos p
+    LEFT JOIN libros l ON l.id = p.libro_id
+    LEFT JOIN usuarios u ON u.id = p.usuario_id
+"""
+
+
+def exportar_historial_prestamos(db, salida, correo=None, tam_lote=5000):
+    """
+    Escribe en un CSV el historial de préstamos, de todos los usuarios o de uno.
+
+    Las filas se leen con Database.iterar y se escriben según llegan, de modo que la
+    memoria no depende del tamaño del historial.
+
+    Args:
+        db: Instancia de database.Database
+        salida (str): Ruta del fichero CSV
+        correo (str): Si se indica, solo los préstamos de ese usuario
+        tam_lote (int): Filas leídas por cada fetchmany
+
+    Returns:
+        int: Número de préstamos exportados
+    """
+    query = SQL_HISTORIAL
+    params = ()
+    if correo is not None:
+        query += " WHERE u.email = ?"
+        params = (correo,)
+    query += " ORDER BY p.id"
+
+    exportados = 0
+    with open(salida, "w", newline="", encoding="utf-8") as fichero:
+        escritor = csv.writer(fichero)
+        escritor.writerow(COLUMNAS_HISTORIAL)
+        for fila in db.iterar(query, params, tam_lote=tam_lote, tuplas=True):
+            escritor.writerow(fila)
+            exportados += 1
+    return exportados
+
+
+def resumen_prestamos(db):
+    """
+    Cuenta libros, usuarios y préstamos activos y devueltos sin cargarlos en memoria.
+
+    Returns:
+        dict: Totales con las claves libros, libros_disponibles, usuarios, prestamos_activos
+        y prestamos_devueltos
+    """
+    fila = db.consultar("""
+        SELECT
+            (SELECT COUNT(*) FROM libros),
+            (SELECT COUNT(*) FROM libros WHERE disponible = 1),
+            (SELECT COUNT(*) FROM usuarios),
+            (SELECT COUNT(*) FROM prestamos WHERE devuelto = 0),
+            (SELECT COUNT(*) FROM prestamos WHERE devuelto = 1)
+    """)[0]
+    return dict(zip(("libros", "libros_disponibles", "usuarios", "prestamos_activos", "prestamos_devueltos"),
+                    tuple(fila)))
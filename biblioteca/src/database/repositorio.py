@@ -0,0 +1,206 @@
+"""
+Persistencia de libros, usuarios y préstamos de la Biblioteca en SQLite
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from itertools import groupby
+
+from .database import Database, normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+SQL_GUARDAR_LIBRO = """
+    INSERT INTO libros (titulo, autor, isbn, disponible, titulo_normalizado, autor_normalizado)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (isbn) DO UPDATE SET
+        titulo = excluded.titulo, autor = excluded.autor, disponible = excluded.disponible,
+        titulo_normalizado = excluded.titulo_normalizado, autor_normalizado = excluded.autor_normalizado
+"""
+SQL_ELIMINAR_LIBRO = "DELETE FROM libros WHERE isbn = ?"
+SQL_GUARDAR_USUARIO = """
+    INSERT INTO usuarios (nombre, email, telefono) VALUES (?, ?, ?)
+    ON CONFLICT (email) DO UPDATE SET nombre = excluded.nombre, telefono = excluded.telefono
+"""
+SQL_ELIMINAR_USUARIO = "DELETE FROM usuarios WHERE email = ?"
+SQL_GUARDAR_PRESTAMO = """
+    INSERT INTO prestamos (codigo, libro_id, usuario_id, fecha_prestamo, fecha_devolucion, devuelto)
+    VALUES (?, (SELECT id FROM libros WHERE isbn = ?), (SELECT id FROM usuarios WHERE email = ?), ?, ?, ?)
+    ON CONFLICT (codigo) DO UPDATE SET
+        fecha_devolucion = excluded.fecha_devolucion, devuelto = excluded.devuelto
+"""
+
+_FIN = object()
+
+
+class RepositorioBiblioteca:
+    """
+    Refleja en las tablas libros, usuarios y préstamos cada cambio de la Biblioteca.
+
+    Con modo="lotes" (por defecto) las escrituras se encolan y un hilo las vuelca en
+    una sola transacción cada `tam_lote` operaciones o cada `intervalo` segundos, de
+    modo que las operaciones de mostrador no esperan al disco; `vaciar()` espera a que
+    todo lo encolado esté escrito. Con modo="sincrono" cada operación se confirma
+    antes de volver, a costa de una transacción por cambio.
+
+    Las escrituras usan la instancia de Database del fichero (`perfil` elige sus
+    pragmas, ver database.PERFILES; None conserva el de la instancia ya abierta): cada
+    lote es una transaccion() y cada grupo de sentencias iguales un ejecutar_lote().
+    """
+
+    MODOS = ("lotes", "sincrono")
+
+    def __init__(self, db_path=None, modo="lotes", tam_lote=500, intervalo=1.0, perfil=None):
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de persistencia no válido: {modo}")
+        self._db = Database(db_path, perfil=perfil)
+        self._db.create_tables()
+        self.db_path = self._db.db_path
+        self.modo = modo
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.operaciones_escritas = 0
+        self.lotes_escritos = 0
+        self.operaciones_fallidas = 0
+
+        self._cerrado = False
+        self._bloqueo = threading.Lock()
+        self._cola = queue.Queue()
+        self._hilo = None
+        if modo == "lotes":
+            self._hilo = threading.Thread(target=self._escritor, name="repositorio-biblioteca", daemon=True)
+            self._hilo.start()
+        atexit.register(self.cerrar)
+
+    # --- Operaciones del modelo ---
+    def guardar_libro(self, libro):
+        """Inserta o actualiza un libro por su ISBN."""
+        self._encolar(SQL_GUARDAR_LIBRO, (
+            libro.titulo, libro.autor, libro.isbn, int(libro.disponible),
+            normalizar_texto(libro.titulo), normalizar_texto(libro.autor)
+        ))
+
+    def eliminar_libro(self, isbn):
+        """Elimina un libro por su ISBN."""
+        self._encolar(SQL_ELIMINAR_LIBRO, (isbn,))
+
+    def guardar_usuario(self, usuario):
+        """Inserta o actualiza un usuario por su correo."""
+        self._encolar(SQL_GUARDAR_USUARIO, (usuario.nombre, usuario.correoU, usuario.numeroTelefono))
+
+    def eliminar_usuario(self, correo):
+        """Elimina un usuario por su correo."""
+        self._encolar(SQL_ELIMINAR_USUARIO, (correo,))
+
+    def guardar_prestamo(self, prestamo):
+        """Inserta un préstamo o actualiza su devolución, identificándolo por su ID."""
+        fecha_devolucion = prestamo.fecha_devolucion.isoformat(sep=' ') if prestamo.fecha_devolucion else None
+        self._encolar(SQL_GUARDAR_PRESTAMO, (
+            prestamo.id, prestamo.libro.isbn, prestamo.usuario.correoU,
+            prestamo.fecha_prestamo.isoformat(sep=' '), fecha_devolucion, int(prestamo.estado == "Devuelto")
+        ))
+
+    # --- Escritura ---
+    def _encolar(self, sql, parametros):
+        if self._hilo is None:
+            self._escribir([(sql, parametros)])
+        else:
+            self._cola.put((sql, parametros))
+
+    def pendientes(self):
+        """Número aproximado de operaciones encoladas sin escribir."""
+        return self._cola.qsize()
+
+    def vaciar(self, timeout=None):
+        """
+        Espera a que se escriban todas las operaciones encoladas hasta ahora.
+
+        Returns:
+            bool: True si se vació la cola antes de `timeout`, False en caso contrario
+                o si el hilo escritor ya no está en marcha
+        """
+        if self._hilo is None:
+            return True
+        if not self._hilo.is_alive():
+            logger.error("El hilo escritor no está en marcha: quedan %s operaciones sin escribir", self.pendientes())
+            return False
+        escrito = threading.Event()
+        self._cola.put(escrito)
+        return escrito.wait(timeout)
+
+    def cerrar(self):
+        """Escribe lo pendiente y detiene el hilo escritor; la Database compartida sigue abierta."""
+        if self._hilo is not None:
+            if self._hilo.is_alive():
+                self._cola.put(_FIN)
+                self._hilo.join()
+            self._hilo = None
+        self._cerrado = True
+        atexit.unregister(self.cerrar)
+
+    def estadisticas(self):
+        """Devuelve los contadores de escritura del repositorio."""
+        return {
+            'operaciones_escritas': self.operaciones_escritas,
+            'lotes_escritos': self.lotes_escritos,
+            'operaciones_fallidas': self.operaciones_fallidas,
+            'pendientes': self.pendientes()
+        }
+
+    def _escritor(self):
+        """Bucle del hilo escritor: agrupa operaciones por tamaño o por tiempo."""
+        terminar = False
+        while not terminar:
+            operaciones = []
+            avisos = []
+            limite = None
+            while len(operaciones) < self.tam_lote:
+                espera = None if limite is None else max(limite - time.monotonic(), 0)
+                try:
+                    elemento = self._cola.get(timeout=espera)
+                except queue.Empty:
+                    break
+                if elemento is _FIN:
+                    terminar = True
+                    break
+                if isinstance(elemento, threading.Event):
+                    # Un vaciado explícito no espera a completar el lote
+                    avisos.append(elemento)
+                    break
+                operaciones.append(elemento)
+                if limite is None:
+                    limite = time.monotonic() + self.intervalo
+            try:
+                if operaciones:
+                    self._escribir(operaciones)
+            except Exception:
+                # Un error inesperado no debe detener el hilo: el resto de la cola sigue escribiéndose
+                self.operaciones_fallidas += len(operaciones)
+                logger.exception("Error inesperado al escribir un lote de %s operaciones", len(operaciones))
+            for aviso in avisos:
+                aviso.set()
+
+    def _escribir(self, operaciones):
+        """Escribe las operaciones en una transacción, agrupando las consecutivas con la misma sentencia."""
+        with self._bloqueo:
+            if self._cerrado:
+                logger.warning("Repositorio cerrado: se descartan %s operaciones", len(operaciones))
+                return
+            try:
+                with self._db.transaccion():
+                    for sql, grupo in groupby(operaciones, key=lambda operacion: operacion[0]):
+                        self._db.ejecutar_lote(sql, (parametros for _, parametros in grupo))
+                self.operaciones_escritas += len(operaciones)
+                self.lotes_escritos += 1
+            except Exception as e:
+                # Se reintenta de una en una para no perder el lote por una sola fila
+                logger.error("Error al escribir un lote de %s operaciones: %s", len(operaciones), e)
+                for sql, parametros in operaciones:
+                    try:
+                        self._db.ejecutar(sql, parametros)
+                        self.operaciones_escritas += 1
+                    except Exception as error:
+                        self.operaciones_fallidas += 1
+                        logger.error("Operación descartada (%s): %s", parametros, error)
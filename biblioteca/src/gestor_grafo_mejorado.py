@@ -1,10 +1,896 @@
-import matplotlib.pyplot as plt
-import networkx as nx
+from __future__ import annotations
+
+import importlib
 from datetime import datetime
 import sqlite3
+import time
+import io
 import json
+import mmap
+import struct
+import zlib
 from typing import List, Dict, Any, Optional
 import logging
+import logging.handlers
+import os
+import queue
+import atexit
+from collections import Counter
+from itertools import chain
+from contextlib import contextmanager
+from functools import lru_cache
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from database.database import aplicar_perfil
+
+
+class _ModuloDiferido:
+    """
+    Importa un módulo la primera vez que se accede a uno de sus atributos.
+    
+    NumPy, networkx y matplotlib tardan de cien a varios cientos de milisegundos en
+    importarse; así solo lo pagan los procesos que realmente usan el grafo. Cada
+    atributo leído se guarda en el propio objeto, de modo que los accesos siguientes
+    (np.zeros en un bucle) no vuelven a pasar por __getattr__.
+    """
+    
+    def __init__(self, nombre: str):
+        self._nombre = nombre
+        self._modulo = None
+    
+    def __getattr__(self, atributo: str):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nombre)
+        valor = getattr(self._modulo, atributo)
+        setattr(self, atributo, valor)
+        return valor
+
+
+np = _ModuloDiferido("numpy")
+nx = _ModuloDiferido("networkx")
+plt = _ModuloDiferido("matplotlib.pyplot")
+
+_LOGGER_GRAFO = 'GestorGrafoBiblioteca'
+_escucha_logging = None  # QueueListener que escribe el log en un hilo aparte
+
+
+def configurar_logging(archivo: str = 'grafo_biblioteca.log', nivel=logging.INFO,
+                       niveles: Optional[Dict[str, Any]] = None) -> logging.Logger:
+    """
+    Configura el logging del gestor de grafos con escritura a fichero en segundo plano.
+    
+    Los registros se encolan con un QueueHandler y un QueueListener los escribe en el
+    fichero desde otro hilo, de modo que las operaciones del grafo no esperan a la E/S.
+    Cada subsistema ('nodos', 'persistencia', 'analitica', 'recomendaciones') es un
+    logger hijo con nivel propio, configurable con `niveles` o con la variable de
+    entorno GRAFO_LOG_NIVELES (p. ej. "nodos=DEBUG,persistencia=WARNING").
+    
+    Args:
+        archivo (str): Fichero de log (solo se usa en la primera llamada)
+        nivel: Nivel del logger principal
+        niveles (Optional[Dict[str, Any]]): Nivel por subsistema
+        
+    Returns:
+        logging.Logger: Logger principal del gestor
+    """
+    global _escucha_logging
+    logger = logging.getLogger(_LOGGER_GRAFO)
+    if _escucha_logging is None:
+        cola = queue.SimpleQueue()
+        manejador = logging.FileHandler(archivo, encoding='utf-8', delay=True)
+        manejador.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        _escucha_logging = logging.handlers.QueueListener(cola, manejador, respect_handler_level=True)
+        _escucha_logging.start()
+        atexit.register(_escucha_logging.stop)
+        logger.addHandler(logging.handlers.QueueHandler(cola))
+        logger.propagate = False
+        logger.setLevel(nivel)
+    
+    configurados = {}
+    for asignacion in os.environ.get('GRAFO_LOG_NIVELES', '').split(','):
+        if '=' in asignacion:
+            subsistema, nivel_subsistema = asignacion.split('=', 1)
+            configurados[subsistema.strip()] = nivel_subsistema.strip().upper()
+    configurados.update(niveles or {})
+    for subsistema, nivel_subsistema in configurados.items():
+        logger.getChild(subsistema).setLevel(nivel_subsistema)
+    return logger
+
+# Formato binario de snapshots: cabecera fija seguida de secciones alineadas a 8 bytes
+_SNAPSHOT_MAGIA = b"BGRAFO\x00\x00"
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_CABECERA = struct.Struct('<8sIIQQQQ')  # magia, versión, flags, nodos, aristas, bytes ids, bytes atributos
+_SNAPSHOT_COMPRIMIDO = 1
+_SNAPSHOT_NO_DIRIGIDO = 2
+
+# Préstamos a partir de los cuales construir_grafo_co_prestamos reparte el conteo entre
+# procesos. Con 300.000 préstamos el conteo vectorizado tarda 1,4 s en un núcleo y
+# arrancar el pool y compartir los arrays añade 0,5 s: con menos préstamos repartir
+# no compensa aunque haya varios núcleos libres
+_MIN_PRESTAMOS_PARALELO = 200_000
+
+
+@lru_cache(maxsize=None)
+def _popcount_byte():
+    """Tabla de conteo de bits para cada valor de un byte (popcount vectorizado)."""
+    return np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+# Bytes de la matriz empaquetada que se cruzan a la vez entre dos bloques de usuarios:
+# el temporal del AND ocupa tam_bloque² × _BYTES_POR_TROZO bytes (16 MiB con bloques de 256)
+_BYTES_POR_TROZO = 256
+# Elementos (vectores × aristas) del temporal de vecinos en cada producto de la
+# matriz de transición por un bloque de vectores de PageRank: 16 MiB en float32.
+# Con trozos mayores el temporal deja de caber en caché y el producto es más lento
+_ELEMENTOS_POR_PRODUCTO = 1 << 22
+
+
+def _compartir_arrays(arrays: Dict[str, np.ndarray]):
+    """
+    Copia arrays de NumPy a bloques de memoria compartida.
+    
+    Args:
+        arrays (Dict[str, np.ndarray]): Arrays a compartir por nombre
+        
+    Returns:
+        tuple: (lista de bloques SharedMemory, descriptor serializable para los procesos)
+    """
+    bloques = []
+    descriptor = {}
+    for nombre, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        bloque = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=bloque.buf)[...] = array
+        bloques.append(bloque)
+        descriptor[nombre] = (bloque.name, array.shape, array.dtype.str)
+    return bloques, descriptor
+
+
+def _liberar_bloques(bloques) -> None:
+    """Cierra y elimina bloques de memoria compartida creados por el proceso padre."""
+    for bloque in bloques:
+        bloque.close()
+        bloque.unlink()
+
+
+def _ultimo_prestamo_por_par(usuarios, libros, tiempos, num_libros: int):
+    """
+    Reduce los préstamos a un único registro por (usuario, libro), conservando el más reciente.
+    
+    Returns:
+        tuple: (usuarios, libros, tiempos) ordenados por usuario y libro
+    """
+    claves = usuarios.astype(np.int64) * num_libros + libros
+    orden = np.lexsort((tiempos, claves))
+    claves = claves[orden]
+    tiempos = tiempos[orden]
+    ultimos = np.append(claves[1:] != claves[:-1], True) if len(claves) else np.empty(0, dtype=bool)
+    claves = claves[ultimos]
+    return claves // num_libros, claves % num_libros, tiempos[ultimos]
+
+
+def _sumar_pares_por_usuario(usuarios, libros, tiempos, num_libros: int, tasa_decaimiento: float = 0.0):
+    """
+    Suma los co-préstamos de un conjunto de préstamos codificados como arrays.
+    
+    Cada par de libros de un usuario aporta exp(tasa_decaimiento * t), donde t es el
+    instante (relativo al tiempo base) del préstamo más reciente de los dos.
+    
+    Args:
+        usuarios (np.ndarray): Índice del usuario de cada préstamo
+        libros (np.ndarray): Índice del libro de cada préstamo
+        tiempos (np.ndarray): Instante de cada préstamo relativo al tiempo base
+        num_libros (int): Número de libros (para codificar pares como enteros)
+        tasa_decaimiento (float): Tasa de decaimiento por segundo (0 equivale a contar)
+        
+    Returns:
+        tuple: (códigos de pares libro_a * num_libros + libro_b, pesos)
+    """
+    usuarios, libros, tiempos = _ultimo_prestamo_por_par(usuarios, libros, tiempos, num_libros)
+    
+    codigos = []
+    pesos = []
+    cortes = np.flatnonzero(np.diff(usuarios)) + 1
+    for grupo, tiempos_grupo in zip(np.split(libros, cortes), np.split(tiempos, cortes)):
+        if len(grupo) < 2:
+            continue
+        i, j = np.triu_indices(len(grupo), k=1)
+        codigos.append(grupo[i] * num_libros + grupo[j])
+        pesos.append(np.exp(tasa_decaimiento * np.maximum(tiempos_grupo[i], tiempos_grupo[j])))
+    
+    if not codigos:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    codigos, inverso = np.unique(np.concatenate(codigos), return_inverse=True)
+    return codigos, np.bincount(inverso, weights=np.concatenate(pesos))
+
+
+def _contar_co_prestamos_particion(descriptor, particion: int, num_particiones: int,
+                                   num_libros: int, tasa_decaimiento: float = 0.0):
+    """
+    Suma los co-préstamos de los usuarios de una partición (se ejecuta en un proceso hijo).
+    
+    Args:
+        descriptor (dict): Descriptor de los arrays 'usuarios', 'libros' y 'tiempos' en memoria compartida
+        particion (int): Índice de la partición a procesar
+        num_particiones (int): Número total de particiones
+        num_libros (int): Número de libros (para codificar pares como enteros)
+        tasa_decaimiento (float): Tasa de decaimiento por segundo (0 equivale a contar)
+        
+    Returns:
+        tuple: (códigos de pares libro_a * num_libros + libro_b, pesos)
+    """
+    bloques = {nombre: shared_memory.SharedMemory(name=shm) for nombre, (shm, _, _) in descriptor.items()}
+    try:
+        arrays = {
+            nombre: np.ndarray(forma, dtype=dtype, buffer=bloques[nombre].buf)
+            for nombre, (_, forma, dtype) in descriptor.items()
+        }
+        mascara = arrays['usuarios'] % num_particiones == particion
+        usuarios_part = arrays['usuarios'][mascara]
+        libros_part = arrays['libros'][mascara]
+        tiempos_part = arrays['tiempos'][mascara]
+        del arrays
+    finally:
+        for bloque in bloques.values():
+            bloque.close()
+    
+    return _sumar_pares_por_usuario(usuarios_part, libros_part, tiempos_part, num_libros, tasa_decaimiento)
+
+
+def _pares_similares_bloque(matriz, libros_por_usuario, activos, inicio_i: int,
+                            tam_bloque: int, umbral: float, metrica: str):
+    """
+    Calcula los pares de usuarios similares entre un bloque de filas y todos los bloques siguientes.
+    
+    Las intersecciones se acumulan por trozos de _BYTES_POR_TROZO columnas empaquetadas,
+    así que la memoria depende del tamaño de bloque y no del número de libros.
+    
+    Returns:
+        tuple: (filas origen, filas destino, similitudes, libros en común)
+    """
+    filas_i = activos[inicio_i:inicio_i + tam_bloque]
+    bloque_i = matriz[filas_i]
+    resultados = []
+    for inicio_j in range(inicio_i, len(activos), tam_bloque):
+        filas_j = activos[inicio_j:inicio_j + tam_bloque]
+        bloque_j = matriz[filas_j]
+        
+        interseccion = np.zeros((len(filas_i), len(filas_j)), dtype=np.int64)
+        for inicio in range(0, matriz.shape[1], _BYTES_POR_TROZO):
+            trozo = slice(inicio, inicio + _BYTES_POR_TROZO)
+            interseccion += _popcount_byte()[
+                np.bitwise_and(bloque_i[:, None, trozo], bloque_j[None, :, trozo])
+            ].sum(axis=2, dtype=np.int64)
+        
+        tam_i = libros_por_usuario[filas_i][:, None]
+        tam_j = libros_por_usuario[filas_j][None, :]
+        if metrica == "jaccard":
+            similitud = interseccion / (tam_i + tam_j - interseccion)
+        else:
+            similitud = interseccion / np.sqrt(tam_i * tam_j)
+        
+        mascara = (interseccion > 0) & (similitud >= umbral)
+        if inicio_i == inicio_j:
+            # Bloque diagonal: solo pares (i, j) con i < j
+            mascara &= np.triu(np.ones_like(mascara), k=1)
+        
+        a, b = np.nonzero(mascara)
+        resultados.append((filas_i[a], filas_j[b], similitud[a, b], interseccion[a, b]))
+    
+    if not resultados:
+        vacio = np.empty(0, dtype=np.int64)
+        return vacio, vacio, np.empty(0), vacio
+    return tuple(np.concatenate(partes) for partes in zip(*resultados))
+
+
+def _pares_similares_bloque_compartido(descriptor, inicio_i: int, tam_bloque: int,
+                                       umbral: float, metrica: str):
+    """Versión de _pares_similares_bloque que lee la matriz desde memoria compartida."""
+    bloques = {nombre: shared_memory.SharedMemory(name=shm) for nombre, (shm, _, _) in descriptor.items()}
+    try:
+        arrays = {
+            nombre: np.ndarray(forma, dtype=dtype, buffer=bloques[nombre].buf)
+            for nombre, (_, forma, dtype) in descriptor.items()
+        }
+        resultado = _pares_similares_bloque(
+            arrays['matriz'], arrays['libros_por_usuario'], arrays['activos'],
+            inicio_i, tam_bloque, umbral, metrica
+        )
+        del arrays
+        return resultado
+    finally:
+        for bloque in bloques.values():
+            bloque.close()
+
+def _csr_desde_aristas(origenes: np.ndarray, destinos: np.ndarray, num_nodos: int):
+    """
+    Construye una lista de adyacencia CSR sin aristas repetidas.
+    
+    Returns:
+        tuple: (indptr, indices); los vecinos de cada nodo quedan ordenados
+    """
+    codigos = np.unique(origenes.astype(np.int64) * num_nodos + destinos)
+    indptr = np.zeros(num_nodos + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codigos // num_nodos, minlength=num_nodos), out=indptr[1:])
+    return indptr, (codigos % num_nodos).astype(np.int64)
+
+
+def _posiciones_vecinos(indptr: np.ndarray, nodos: np.ndarray):
+    """
+    Calcula las posiciones en `indices` de los vecinos de varios nodos a la vez.
+    
+    Returns:
+        tuple: (número de vecinos de cada nodo, posiciones concatenadas)
+    """
+    inicios = indptr[nodos]
+    longitudes = indptr[nodos + 1] - inicios
+    total = int(longitudes.sum())
+    desplazamientos = np.repeat(inicios - np.cumsum(longitudes) + longitudes, longitudes)
+    return longitudes, desplazamientos + np.arange(total)
+
+
+def _expandir_frontera(indptr: np.ndarray, indices: np.ndarray, frontera: np.ndarray):
+    """
+    Devuelve todas las aristas que salen de la frontera sin recorrerla en Python.
+    
+    Returns:
+        tuple: (orígenes, destinos) de las aristas
+    """
+    longitudes, posiciones = _posiciones_vecinos(indptr, frontera)
+    return np.repeat(frontera, longitudes), indices[posiciones]
+
+
+def _bfs_csr(indptr: np.ndarray, indices: np.ndarray, origen: int) -> np.ndarray:
+    """
+    Búsqueda en anchura por niveles sobre una lista de adyacencia CSR.
+    
+    Returns:
+        np.ndarray: Distancia desde `origen` a cada nodo (-1 si no es alcanzable)
+    """
+    distancias = np.full(len(indptr) - 1, -1, dtype=np.int64)
+    distancias[origen] = 0
+    frontera = np.array([origen], dtype=np.int64)
+    nivel = 0
+    while len(frontera):
+        _, vecinos = _expandir_frontera(indptr, indices, frontera)
+        frontera = np.unique(vecinos[distancias[vecinos] < 0])
+        nivel += 1
+        distancias[frontera] = nivel
+    return distancias
+
+
+def _etiquetar_componentes(origenes: np.ndarray, destinos: np.ndarray, num_nodos: int) -> np.ndarray:
+    """
+    Etiqueta las componentes conexas propagando la etiqueta mínima con saltos de puntero.
+    
+    Returns:
+        np.ndarray: Etiqueta de cada nodo (el menor índice de su componente)
+    """
+    etiquetas = np.arange(num_nodos)
+    while True:
+        anteriores = etiquetas.copy()
+        np.minimum.at(etiquetas, origenes, etiquetas[destinos])
+        np.minimum.at(etiquetas, destinos, etiquetas[origenes])
+        while True:
+            saltadas = etiquetas[etiquetas]
+            if np.array_equal(saltadas, etiquetas):
+                break
+            etiquetas = saltadas
+        if np.array_equal(etiquetas, anteriores):
+            return etiquetas
+
+
+def _intervalo_wilson(aciertos: int, muestras: int, z: float = 1.96):
+    """Intervalo de confianza de Wilson para una proporción."""
+    if muestras == 0:
+        return 0.0, 1.0
+    p = aciertos / muestras
+    denominador = 1 + z * z / muestras
+    centro = (p + z * z / (2 * muestras)) / denominador
+    margen = z * np.sqrt(p * (1 - p) / muestras + z * z / (4 * muestras * muestras)) / denominador
+    return max(0.0, float(centro - margen)), min(1.0, float(centro + margen))
+
+
+def _intermediacion_fuentes(indptr: np.ndarray, indices: np.ndarray, fuentes) -> np.ndarray:
+    """
+    Acumula la intermediación (algoritmo de Brandes, sin pesos) desde varias fuentes.
+    
+    Cada BFS avanza por niveles con operaciones vectorizadas: el número de caminos
+    mínimos se propaga hacia delante y las dependencias se acumulan hacia atrás.
+    """
+    num_nodos = len(indptr) - 1
+    acumulado = np.zeros(num_nodos)
+    for fuente in fuentes:
+        distancias = np.full(num_nodos, -1, dtype=np.int64)
+        caminos = np.zeros(num_nodos)
+        distancias[fuente] = 0
+        caminos[fuente] = 1.0
+        frontera = np.array([fuente], dtype=np.int64)
+        niveles = []
+        nivel = 0
+        while len(frontera):
+            u, v = _expandir_frontera(indptr, indices, frontera)
+            frontera = np.unique(v[distancias[v] < 0])
+            distancias[frontera] = nivel + 1
+            # Aristas del DAG de caminos mínimos entre este nivel y el siguiente
+            mascara = distancias[v] == nivel + 1
+            u, v = u[mascara], v[mascara]
+            np.add.at(caminos, v, caminos[u])
+            niveles.append((u, v))
+            nivel += 1
+        dependencia = np.zeros(num_nodos)
+        for u, v in reversed(niveles):
+            np.add.at(dependencia, u, caminos[u] / caminos[v] * (1.0 + dependencia[v]))
+        dependencia[fuente] = 0.0
+        acumulado += dependencia
+    return acumulado
+
+
+def _intermediacion_fuentes_compartido(descriptor, fuentes) -> np.ndarray:
+    """Versión de _intermediacion_fuentes que lee la lista de adyacencia desde memoria compartida."""
+    bloques = {nombre: shared_memory.SharedMemory(name=shm) for nombre, (shm, _, _) in descriptor.items()}
+    try:
+        arrays = {
+            nombre: np.ndarray(forma, dtype=dtype, buffer=bloques[nombre].buf)
+            for nombre, (_, forma, dtype) in descriptor.items()
+        }
+        resultado = _intermediacion_fuentes(arrays['indptr'], arrays['indices'], fuentes)
+        del arrays
+        return resultado
+    finally:
+        for bloque in bloques.values():
+            bloque.close()
+
+
+def _comunidades_louvain(num_nodos: int, origenes: np.ndarray, destinos: np.ndarray,
+                         pesos: np.ndarray, semilla: int, resolucion: float) -> List[List[int]]:
+    """Detecta comunidades con el método de Louvain sobre un grafo no dirigido ponderado."""
+    grafo = nx.Graph()
+    grafo.add_nodes_from(range(num_nodos))
+    grafo.add_weighted_edges_from(zip(origenes.tolist(), destinos.tolist(), pesos.tolist()), weight='peso')
+    comunidades = nx.community.louvain_communities(grafo, weight='peso', resolution=resolucion, seed=semilla)
+    return [sorted(comunidad) for comunidad in comunidades]
+
+
+def _columnas_atributos(registros: List[Dict[str, Any]], excluir=()) -> Dict[str, Any]:
+    """
+    Convierte una lista de diccionarios de atributos en columnas.
+    
+    Cada columna guarda un valor por registro y la lista de posiciones donde el
+    atributo no existe, para distinguir "ausente" de None.
+    """
+    nombres = []
+    for registro in registros:
+        for nombre in registro:
+            if nombre not in excluir and nombre not in nombres:
+                nombres.append(nombre)
+    columnas = {}
+    for nombre in nombres:
+        valores = []
+        faltantes = []
+        for i, registro in enumerate(registros):
+            if nombre in registro:
+                valores.append(registro[nombre])
+            else:
+                valores.append(None)
+                faltantes.append(i)
+        columnas[nombre] = {'valores': valores, 'faltantes': faltantes}
+    return columnas
+
+
+def _registros_desde_columnas(columnas: Dict[str, Any], cantidad: int) -> List[Dict[str, Any]]:
+    """Operación inversa de _columnas_atributos."""
+    registros = [{} for _ in range(cantidad)]
+    for nombre, columna in columnas.items():
+        faltantes = set(columna['faltantes'])
+        for i, valor in enumerate(columna['valores']):
+            if i not in faltantes:
+                registros[i][nombre] = valor
+    return registros
+
+
+def _escribir_snapshot(salida, ids: List[str], origenes: np.ndarray, destinos: np.ndarray,
+                       pesos: np.ndarray, atributos: Dict[str, Any], dirigido: bool = True,
+                       comprimir: bool = True) -> None:
+    """
+    Escribe un snapshot binario del grafo en un objeto con método write.
+    
+    Secciones: offsets (int64) y bytes UTF-8 de la tabla de IDs, orígenes y destinos
+    (int32), pesos (float64) y atributos en JSON por columnas, opcionalmente con zlib.
+    """
+    codificados = [nodo.encode('utf-8') for nodo in ids]
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in codificados], out=offsets[1:])
+    blob_ids = b"".join(codificados)
+    blob_atributos = json.dumps(atributos).encode('utf-8')
+    flags = 0 if dirigido else _SNAPSHOT_NO_DIRIGIDO
+    if comprimir:
+        blob_atributos = zlib.compress(blob_atributos)
+        flags |= _SNAPSHOT_COMPRIMIDO
+    
+    def escribir_alineado(datos) -> None:
+        salida.write(datos)
+        salida.write(b"\x00" * (-len(datos) % 8))
+    
+    salida.write(_SNAPSHOT_CABECERA.pack(_SNAPSHOT_MAGIA, _SNAPSHOT_VERSION, flags, len(ids),
+                                         len(pesos), len(blob_ids), len(blob_atributos)))
+    escribir_alineado(offsets.tobytes())
+    escribir_alineado(blob_ids)
+    escribir_alineado(np.ascontiguousarray(origenes, dtype=np.int32).tobytes())
+    escribir_alineado(np.ascontiguousarray(destinos, dtype=np.int32).tobytes())
+    escribir_alineado(np.ascontiguousarray(pesos, dtype=np.float64).tobytes())
+    salida.write(blob_atributos)
+
+
+def _leer_snapshot(buffer) -> Dict[str, Any]:
+    """
+    Interpreta un snapshot binario sin copiar las secciones numéricas.
+    
+    Args:
+        buffer: bytes, memoryview o mmap con el contenido del snapshot
+        
+    Returns:
+        Dict[str, Any]: Arrays (vistas sobre el buffer), tabla de IDs y atributos
+    """
+    magia, version, flags, num_nodos, num_aristas, bytes_ids, bytes_atributos = \
+        _SNAPSHOT_CABECERA.unpack_from(buffer, 0)
+    if magia != _SNAPSHOT_MAGIA:
+        raise ValueError("El buffer no contiene un snapshot de grafo")
+    if version > _SNAPSHOT_VERSION:
+        raise ValueError(f"Versión de snapshot no soportada: {version}")
+    
+    posicion = _SNAPSHOT_CABECERA.size
+    
+    def seccion(dtype, cantidad):
+        nonlocal posicion
+        array = np.frombuffer(buffer, dtype=dtype, count=cantidad, offset=posicion)
+        posicion += array.nbytes + (-array.nbytes % 8)
+        return array
+    
+    offsets = seccion(np.int64, num_nodos + 1)
+    blob_ids = seccion(np.uint8, bytes_ids).tobytes()
+    ids = [blob_ids[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(num_nodos)]
+    origenes = seccion(np.int32, num_aristas)
+    destinos = seccion(np.int32, num_aristas)
+    pesos = seccion(np.float64, num_aristas)
+    blob_atributos = bytes(buffer[posicion:posicion + bytes_atributos])
+    if flags & _SNAPSHOT_COMPRIMIDO:
+        blob_atributos = zlib.decompress(blob_atributos)
+    
+    return {
+        'version': version,
+        'dirigido': not flags & _SNAPSHOT_NO_DIRIGIDO,
+        'ids': ids,
+        'origenes': origenes,
+        'destinos': destinos,
+        'pesos': pesos,
+        'atributos': json.loads(blob_atributos)
+    }
+
+
+class AlmacenGrafo:
+    """
+    Almacén compacto de grafo con identificadores enteros.
+    
+    Los nodos se identifican internamente por un entero; la tabla de cadenas traduce
+    los IDs del gestor (p. ej. "libro_<isbn>"). Los atributos de nodo se guardan por
+    columnas: el tipo en un array('b') y el resto como listas de Python por atributo.
+    Las aristas viven en formato CSR (indptr, indices, pesos) más un búfer de altas;
+    las aristas repetidas suman su peso. Las lecturas combinan la CSR con el búfer
+    sin reordenar las aristas: el búfer solo se fusiona al llegar a
+    `umbral_compactacion`, en las altas por lotes o al llamar a compactar().
+    
+    Atributos:
+        dirigido (bool): Si es False, cada arista se guarda en ambos sentidos
+    """
+    
+    TIPOS = ("libro", "usuario", "autor", "genero")
+    
+    def __init__(self, dirigido: bool = False, umbral_compactacion: int = 65536):
+        """
+        Inicializa un almacén vacío.
+        
+        Args:
+            dirigido (bool): Si el grafo es dirigido
+            umbral_compactacion (int): Tamaño del búfer de aristas que dispara la compactación
+        """
+        self.dirigido = dirigido
+        self.umbral_compactacion = umbral_compactacion
+        self._indice = {}
+        self._ids = []
+        self._tipos = array('b')
+        self._atributos = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.empty(0, dtype=np.int32)
+        self._pesos = np.empty(0, dtype=np.float64)
+        self._buffer_origen = array('q')
+        self._buffer_destino = array('q')
+        self._buffer_pesos = array('d')
+    
+    def agregar_nodo(self, id_nodo: str, tipo: str, **atributos) -> int:
+        """
+        Agrega un nodo (o actualiza sus atributos si ya existe).
+        
+        Returns:
+            int: Índice entero del nodo
+        """
+        indice = self._indice.get(id_nodo)
+        if indice is None:
+            indice = len(self._ids)
+            self._indice[id_nodo] = indice
+            self._ids.append(id_nodo)
+            self._tipos.append(self.TIPOS.index(tipo))
+            for columna in self._atributos.values():
+                columna.append(None)
+        for nombre, valor in atributos.items():
+            columna = self._atributos.setdefault(nombre, [None] * len(self._ids))
+            columna[indice] = valor
+        return indice
+    
+    def indice(self, id_nodo: str) -> Optional[int]:
+        """Devuelve el índice entero de un nodo, o None si no existe."""
+        return self._indice.get(id_nodo)
+    
+    def id_nodo(self, indice: int) -> str:
+        """Devuelve el ID de cadena de un índice entero."""
+        return self._ids[indice]
+    
+    def atributo(self, indice: int, nombre: str):
+        """Devuelve un atributo de nodo, o None si no está definido."""
+        columna = self._atributos.get(nombre)
+        return columna[indice] if columna is not None else None
+    
+    def atributos_nodo(self, indice: int) -> Dict[str, Any]:
+        """Devuelve el tipo y los atributos de un nodo, como en la exportación a networkx."""
+        atributos = {nombre: columna[indice] for nombre, columna in self._atributos.items()}
+        return {'tipo': self.TIPOS[self._tipos[indice]], **atributos}
+    
+    def agregar_arista(self, origen: int, destino: int, peso: float = 1.0) -> None:
+        """Suma `peso` a la arista entre dos índices de nodo (la crea si no existe)."""
+        self._buffer_origen.append(origen)
+        self._buffer_destino.append(destino)
+        self._buffer_pesos.append(peso)
+        if not self.dirigido:
+            self._buffer_origen.append(destino)
+            self._buffer_destino.append(origen)
+            self._buffer_pesos.append(peso)
+        if len(self._buffer_pesos) >= self.umbral_compactacion:
+            self.compactar()
+    
+    def agregar_aristas(self, origenes: np.ndarray, destinos: np.ndarray, pesos: np.ndarray) -> None:
+        """Agrega un lote de aristas expresadas como arrays de índices y pesos."""
+        if not self.dirigido:
+            origenes, destinos = np.concatenate([origenes, destinos]), np.concatenate([destinos, origenes])
+            pesos = np.concatenate([pesos, pesos])
+        self.compactar(np.asarray(origenes), np.asarray(destinos), np.asarray(pesos, dtype=np.float64))
+    
+    def compactar(self, origenes=None, destinos=None, pesos=None) -> None:
+        """
+        Fusiona el búfer de altas (y un lote opcional) con la estructura CSR.
+        """
+        num_nodos = len(self._ids)
+        filas = np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int64), np.diff(self._indptr))
+        partes_origen = [filas, np.frombuffer(self._buffer_origen, dtype=np.int64)]
+        partes_destino = [self._indices.astype(np.int64), np.frombuffer(self._buffer_destino, dtype=np.int64)]
+        partes_pesos = [self._pesos, np.frombuffer(self._buffer_pesos, dtype=np.float64)]
+        if origenes is not None:
+            partes_origen.append(origenes)
+            partes_destino.append(destinos)
+            partes_pesos.append(pesos)
+        
+        codigos = np.concatenate(partes_origen).astype(np.int64) * num_nodos + np.concatenate(partes_destino)
+        pesos_totales = np.concatenate(partes_pesos)
+        self._buffer_origen = array('q')
+        self._buffer_destino = array('q')
+        self._buffer_pesos = array('d')
+        
+        codigos, inverso = np.unique(codigos, return_inverse=True)
+        self._pesos = np.bincount(inverso, weights=pesos_totales, minlength=len(codigos)) if len(codigos) else np.empty(0)
+        self._indices = (codigos % num_nodos).astype(np.int32) if num_nodos else np.empty(0, dtype=np.int32)
+        grados = np.bincount(codigos // num_nodos, minlength=num_nodos) if num_nodos else np.empty(0, dtype=np.int64)
+        self._indptr = np.zeros(num_nodos + 1, dtype=np.int64)
+        np.cumsum(grados, out=self._indptr[1:])
+    
+    def _indptr_completo(self) -> np.ndarray:
+        """indptr de la CSR con una entrada por nodo actual (los nodos nuevos, sin aristas)."""
+        faltan = len(self._ids) + 1 - len(self._indptr)
+        return np.concatenate([self._indptr, np.full(faltan, self._indptr[-1])]) if faltan else self._indptr
+    
+    def _buffer_agrupado(self):
+        """
+        Suma las altas del búfer por arista.
+        
+        Returns:
+            tuple: (orígenes, destinos, pesos), ordenados por origen y destino
+        """
+        num_nodos = len(self._ids)
+        codigos = (np.frombuffer(self._buffer_origen, dtype=np.int64) * num_nodos
+                   + np.frombuffer(self._buffer_destino, dtype=np.int64))
+        codigos, inverso = np.unique(codigos, return_inverse=True)
+        pesos = np.bincount(inverso, weights=np.frombuffer(self._buffer_pesos, dtype=np.float64),
+                            minlength=len(codigos))
+        return codigos // num_nodos, codigos % num_nodos, pesos
+    
+    def _buscar_en_csr(self, indptr: np.ndarray, origenes: np.ndarray, destinos: np.ndarray):
+        """
+        Búsqueda binaria vectorizada de cada arista en la fila de su origen.
+        
+        Returns:
+            tuple: (posición en indices donde está o debería insertarse, máscara de encontradas)
+        """
+        bajo = indptr[origenes]
+        fin = indptr[origenes + 1]
+        alto = fin.copy()
+        while True:
+            activos = bajo < alto
+            if not activos.any():
+                break
+            medio = (bajo + alto) // 2
+            menor = activos & (self._indices[np.where(activos, medio, 0)] < destinos)
+            bajo = np.where(menor, medio + 1, bajo)
+            alto = np.where(activos & ~menor, medio, alto)
+        encontradas = bajo < fin
+        encontradas[encontradas] = self._indices[bajo[encontradas]] == destinos[encontradas]
+        return bajo, encontradas
+    
+    def vecinos(self, indice: int):
+        """
+        Devuelve los vecinos salientes de un nodo y los pesos de las aristas.
+        
+        Returns:
+            tuple: (array de índices, array de pesos)
+        """
+        if indice + 1 >= len(self._indptr):
+            indices, pesos = np.empty(0, dtype=np.int32), np.empty(0)
+        else:
+            inicio, fin = self._indptr[indice], self._indptr[indice + 1]
+            indices, pesos = self._indices[inicio:fin], self._pesos[inicio:fin]
+        if not len(self._buffer_pesos):
+            return indices, pesos
+        del_nodo = np.frombuffer(self._buffer_origen, dtype=np.int64) == indice
+        if not del_nodo.any():
+            return indices, pesos
+        todos = np.concatenate([indices, np.frombuffer(self._buffer_destino, dtype=np.int64)[del_nodo]])
+        vecinos, inverso = np.unique(todos, return_inverse=True)
+        pesos_todos = np.concatenate([pesos, np.frombuffer(self._buffer_pesos, dtype=np.float64)[del_nodo]])
+        return vecinos.astype(np.int32), np.bincount(inverso, weights=pesos_todos, minlength=len(vecinos))
+    
+    def csr(self):
+        """
+        Devuelve la estructura CSR con el búfer incluido, con una entrada de indptr por nodo actual.
+        
+        Las aristas del búfer se insertan en su posición sin reordenar la CSR ni
+        modificar el almacén.
+        
+        Returns:
+            tuple: (indptr, indices, pesos)
+        """
+        indptr = self._indptr_completo()
+        if not len(self._buffer_pesos):
+            return indptr, self._indices, self._pesos
+        origenes, destinos, pesos_buffer = self._buffer_agrupado()
+        posiciones, encontradas = self._buscar_en_csr(indptr, origenes, destinos)
+        pesos = self._pesos.copy()
+        pesos[posiciones[encontradas]] += pesos_buffer[encontradas]
+        nuevas = ~encontradas
+        # np.insert conserva el orden de las inserciones en la misma posición: las del
+        # búfer ya vienen ordenadas por origen y destino
+        indices = np.insert(self._indices, posiciones[nuevas], destinos[nuevas].astype(np.int32))
+        pesos = np.insert(pesos, posiciones[nuevas], pesos_buffer[nuevas])
+        desplazamiento = np.zeros(len(indptr), dtype=np.int64)
+        np.cumsum(np.bincount(origenes[nuevas], minlength=len(indptr) - 1), out=desplazamiento[1:])
+        return indptr + desplazamiento, indices, pesos
+
+    def peso(self, origen: int, destino: int) -> float:
+        """Devuelve el peso de una arista, o 0.0 si no existe."""
+        indices, pesos = self.vecinos(origen)
+        posicion = np.searchsorted(indices, destino)
+        if posicion < len(indices) and indices[posicion] == destino:
+            return float(pesos[posicion])
+        return 0.0
+    
+    def escalar_y_podar(self, factor: float, epsilon: float) -> int:
+        """
+        Multiplica todos los pesos por `factor` y elimina las aristas por debajo de `epsilon`.
+        
+        Returns:
+            int: Número de aristas eliminadas
+        """
+        self.compactar()
+        self._pesos *= factor
+        conservar = self._pesos >= epsilon
+        eliminadas = int(np.count_nonzero(~conservar))
+        if eliminadas:
+            filas = np.repeat(np.arange(len(self._indptr) - 1), np.diff(self._indptr))[conservar]
+            self._indices = self._indices[conservar]
+            self._pesos = self._pesos[conservar]
+            self._indptr = np.zeros(len(self._ids) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(filas, minlength=len(self._ids)), out=self._indptr[1:])
+        return eliminadas if self.dirigido else eliminadas // 2
+    
+    def numero_nodos(self) -> int:
+        """Número de nodos."""
+        return len(self._ids)
+    
+    def numero_aristas(self) -> int:
+        """Número de aristas (los pares no dirigidos cuentan una vez)."""
+        total = len(self._indices)
+        if len(self._buffer_pesos):
+            origenes, destinos, _ = self._buffer_agrupado()
+            _, encontradas = self._buscar_en_csr(self._indptr_completo(), origenes, destinos)
+            total += int(np.count_nonzero(~encontradas))
+        return total if self.dirigido else total // 2
+    
+    def memoria_aristas(self) -> int:
+        """Bytes ocupados por la estructura de aristas (CSR y búfer)."""
+        return (self._indptr.nbytes + self._indices.nbytes + self._pesos.nbytes
+                + self._buffer_origen.itemsize * len(self._buffer_origen) * 2
+                + self._buffer_pesos.itemsize * len(self._buffer_pesos))
+    
+    def aristas(self):
+        """
+        Devuelve todas las aristas como arrays (en modo no dirigido, una por par).
+        
+        Returns:
+            tuple: (orígenes, destinos, pesos)
+        """
+        indptr, indices, pesos = self.csr()
+        filas = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        if self.dirigido:
+            return filas, indices, pesos
+        mascara = filas < indices
+        return filas[mascara], indices[mascara], pesos[mascara]
+
+    def escribir_snapshot(self, salida, comprimir: bool = True, metadatos: Optional[Dict[str, Any]] = None) -> None:
+        """Escribe el almacén en formato binario de snapshot (ver _escribir_snapshot)."""
+        origenes, destinos, pesos = self.aristas()
+        columnas = {nombre: {'valores': valores, 'faltantes': []} for nombre, valores in self._atributos.items()}
+        columnas['tipo'] = {'valores': [self.TIPOS[t] for t in self._tipos], 'faltantes': []}
+        _escribir_snapshot(salida, self._ids, origenes, destinos, pesos,
+                           {'nodos': columnas, 'aristas': {}, 'metadatos': metadatos or {}},
+                           self.dirigido, comprimir)
+
+    @classmethod
+    def desde_snapshot(cls, snapshot: Dict[str, Any]) -> 'AlmacenGrafo':
+        """
+        Construye un almacén a partir de un snapshot leído con _leer_snapshot.
+        
+        Las columnas y arrays se cargan en bloque, sin recorrer las aristas en Python.
+        """
+        almacen = cls(dirigido=snapshot['dirigido'])
+        columnas = dict(snapshot['atributos']['nodos'])
+        tipos = columnas.pop('tipo')['valores']
+        almacen._ids = list(snapshot['ids'])
+        almacen._indice = {nodo: i for i, nodo in enumerate(almacen._ids)}
+        almacen._tipos = array('b', (cls.TIPOS.index(tipo) for tipo in tipos))
+        almacen._atributos = {nombre: columna['valores'] for nombre, columna in columnas.items()}
+        almacen.agregar_aristas(snapshot['origenes'].astype(np.int64), snapshot['destinos'].astype(np.int64),
+                                snapshot['pesos'])
+        return almacen
+
+    def a_networkx(self, tipo_arista: Optional[str] = None) -> nx.DiGraph:
+        """
+        Exporta el almacén a un nx.DiGraph para visualización y análisis.
+        
+        En modo no dirigido se exporta una sola arista por par (del menor al mayor índice).
+        
+        Args:
+            tipo_arista (str, optional): Valor del atributo 'tipo' de las aristas exportadas
+        """
+        grafo = nx.DiGraph()
+        for i, id_nodo in enumerate(self._ids):
+            grafo.add_node(id_nodo, **self.atributos_nodo(i))
+        
+        origenes, destinos, pesos = self.aristas()
+        extra = {'tipo': tipo_arista} if tipo_arista else {}
+        grafo.add_edges_from(
+            (self._ids[u], self._ids[v], {'peso': w, **extra})
+            for u, v, w in zip(origenes.tolist(), destinos.tolist(), pesos.tolist())
+        )
+        return grafo
+
 
 class GestorGrafoBiblioteca:
     """
@@ -15,36 +901,116 @@ class GestorGrafoBiblioteca:
     la frecuencia de interacción y el tiempo.
     
     Atributos:
-        grafo (nx.DiGraph): Grafo dirigido que representa las relaciones
+        grafo (nx.DiGraph): Grafo dirigido que representa las relaciones. Mientras está
+            cargado el grafo de co-préstamos, es una exportación de solo lectura de
+            `co_prestamos` que se genera al primer acceso
+        co_prestamos (AlmacenGrafo): Grafo de co-préstamos en formato compacto
         db_path (str): Ruta a la base de datos SQLite
     """
     
-    def __init__(self, db_path: str = "biblioteca.db"):
+    def __init__(self, db_path: str = "biblioteca.db", max_cambios_log: int = 10000,
+                 checkpoints_retenidos: int = 3, formato_checkpoint: str = "json",
+                 checkpoints_diarios: int = 7, paginas_libres_vacuum: int = 256,
+                 intervalo_resumen_log: int = 10000, perfil_db: str = "equilibrado"):
         """
         Inicializa el gestor de grafos.
         
         Args:
             db_path (str): Ruta a la base de datos SQLite
+            max_cambios_log (int): Cambios acumulados en el registro que fuerzan un nuevo checkpoint
+            checkpoints_retenidos (int): Número de checkpoints completos que se conservan
+            formato_checkpoint (str): "json" o "binario" (snapshot compacto, ver guardar_snapshot).
+                El grafo de co-préstamos se guarda siempre en binario, que conserva el
+                almacén compacto y su estado de decaimiento
+            checkpoints_diarios (int): Días recientes de los que se conserva además su último checkpoint
+            paginas_libres_vacuum (int): Páginas libres de la base de datos que disparan un vacuum
+            intervalo_resumen_log (int): Altas de nodos y aristas tras las que se registra un resumen
+            perfil_db (str): Perfil de pragmas de SQLite (ver database.PERFILES)
         """
-        self.grafo = nx.DiGraph()
+        self._grafo = None  # Se crea al primer acceso a `grafo`
+        self.co_prestamos = None  # AlmacenGrafo del grafo de co-préstamos
         self.db_path = db_path
+        self.perfil_db = perfil_db
+        self._transicion = None  # Matriz de transición usuario–libro precalculada
+        # Estado del grafo de co-préstamos con decaimiento temporal
+        self._tasa_decaimiento = 0.0  # Por segundo; 0 desactiva el decaimiento
+        self._tiempo_base = 0.0       # Instante (timestamp) en que los pesos guardados son exactos
+        self._historial_usuarios = {}  # Correo -> {ISBN: timestamp del último préstamo}
+        # Persistencia incremental: cambios pendientes desde el último guardado
+        self.max_cambios_log = max_cambios_log
+        self.checkpoints_retenidos = checkpoints_retenidos
+        self.formato_checkpoint = formato_checkpoint
+        self.checkpoints_diarios = checkpoints_diarios
+        self.paginas_libres_vacuum = paginas_libres_vacuum
+        self._vacuum_pendiente = False  # Se podaron checkpoints desde el último vacuum
+        # Analítica cacheada por versión del grafo
+        self._version_grafo = 0
+        self._cache_analitica = {}     # Clave -> (versión del grafo, resultado)
+        self._componentes = None       # Componentes mantenidas de forma incremental
+        self._registro_analitica = []  # Altas de nodos y aristas pendientes de aplicar a las componentes
+        self._posiciones = {}  # Coordenadas de layout por nodo, reutilizadas entre visualizaciones
+        self.intervalo_resumen_log = intervalo_resumen_log
+        self._checkpoint_id = None       # Checkpoint sobre el que se registran los cambios
+        self._requiere_checkpoint = True
+        self._nodos_modificados = set()
+        self._aristas_modificadas = set()
         self._configurar_logging()
         self._inicializar_db()
         
     def _configurar_logging(self):
         """Configura el sistema de logging para el gestor."""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            filename='grafo_biblioteca.log'
-        )
-        self.logger = logging.getLogger('GestorGrafoBiblioteca')
+        self.logger = configurar_logging()
+        self.logger_nodos = self.logger.getChild('nodos')
+        self.logger_persistencia = self.logger.getChild('persistencia')
+        self.logger_analitica = self.logger.getChild('analitica')
+        self.logger_recomendaciones = self.logger.getChild('recomendaciones')
+        # Altas por tipo desde el último resumen (sustituyen a una línea de log por elemento)
+        self._operaciones = Counter()
+        self._operaciones_pendientes = 0
+
+    def _registrar_operacion(self, tipo: str) -> None:
+        """Cuenta una operación por elemento y emite un resumen cada `intervalo_resumen_log`."""
+        self._operaciones[tipo] += 1
+        self._operaciones_pendientes += 1
+        if self._operaciones_pendientes >= self.intervalo_resumen_log:
+            self._resumir_operaciones()
+
+    def _resumir_operaciones(self) -> None:
+        """Emite una sola línea con las operaciones acumuladas desde el último resumen."""
+        if self._operaciones_pendientes:
+            self.logger_nodos.info("Operaciones sobre el grafo: %s",
+                                   ", ".join(f"{cantidad} {tipo}" for tipo, cantidad in self._operaciones.items()))
+            self._operaciones.clear()
+            self._operaciones_pendientes = 0
         
+    @contextmanager
+    def _conectar(self):
+        """
+        Abre una conexión con el perfil de pragmas configurado y la cierra al salir.
+        
+        Como con `with sqlite3.connect(...)`, la transacción se confirma al salir sin
+        errores y se deshace si hay una excepción.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            aplicar_perfil(conn, self.perfil_db)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
     def _inicializar_db(self):
         """Inicializa la base de datos SQLite con las tablas necesarias."""
+        # El perfil se aplica con el esquema ya creado: en una base de datos nueva que ya
+        # está en WAL, PRAGMA auto_vacuum no tiene efecto
+        conn = sqlite3.connect(self.db_path)
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with conn:
                 cursor = conn.cursor()
+                # En una base de datos nueva, habilitar el vacuum incremental antes de crear tablas
+                cursor.execute("SELECT COUNT(*) FROM sqlite_master")
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS grafo_estado (
                         id INTEGER PRIMARY KEY,
@@ -52,10 +1018,95 @@ class GestorGrafoBiblioteca:
                         datos_grafo TEXT
                     )
                 ''')
-                conn.commit()
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_grafo_estado_fecha
+                    ON grafo_estado (fecha_actualizacion)
+                ''')
+                # Puntero de una sola fila al checkpoint vigente
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS grafo_estado_actual (
+                        id INTEGER PRIMARY KEY CHECK (id = 0),
+                        checkpoint_id INTEGER NOT NULL
+                    )
+                ''')
+                # Registro de cambios desde cada checkpoint de grafo_estado
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS grafo_cambios (
+                        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                        checkpoint_id INTEGER NOT NULL,
+                        tipo TEXT NOT NULL,
+                        origen TEXT NOT NULL,
+                        destino TEXT,
+                        borrado INTEGER NOT NULL DEFAULT 0,
+                        atributos TEXT
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_grafo_cambios_checkpoint
+                    ON grafo_cambios (checkpoint_id, seq)
+                ''')
+            aplicar_perfil(conn, self.perfil_db)
         except sqlite3.Error as e:
-            self.logger.error(f"Error al inicializar la base de datos: {e}")
+            self.logger_persistencia.error("Error al inicializar la base de datos: %s", e)
             raise
+        finally:
+            conn.close()
+
+    @property
+    def grafo(self) -> nx.DiGraph:
+        """
+        Grafo networkx actual.
+        
+        Con el almacén de co-préstamos cargado es una exportación congelada: se regenera
+        tras cada cambio del almacén, así que escribir en ella perdería el cambio y
+        networkx lanza NetworkXError. Las altas de libros van al almacén.
+        """
+        if self._grafo is None:
+            self._grafo = nx.freeze(self.co_prestamos.a_networkx(tipo_arista="co-prestamo")) \
+                if self.co_prestamos is not None else nx.DiGraph()
+        return self._grafo
+
+    @grafo.setter
+    def grafo(self, grafo: Optional[nx.DiGraph]) -> None:
+        # Asignar un grafo networkx descarta el almacén de co-préstamos
+        self._grafo = grafo
+        self.co_prestamos = None
+        self._requiere_checkpoint = True
+        self._invalidar_analitica()
+
+    def _marcar_nodo(self, node_id: str) -> None:
+        """Registra un nodo como modificado para el próximo guardado incremental."""
+        self._nodos_modificados.add(node_id)
+        self._version_grafo += 1
+        if self._componentes is not None:
+            self._registro_analitica.append((node_id, None))
+
+    def _marcar_arista(self, origen: str, destino: str) -> None:
+        """Registra una arista como modificada para el próximo guardado incremental."""
+        self._aristas_modificadas.add((origen, destino))
+        self._version_grafo += 1
+        if self._componentes is not None:
+            self._registro_analitica.append((origen, destino))
+
+    def _invalidar_analitica(self) -> None:
+        """Descarta la analítica y el layout cacheados tras un cambio que no es solo de altas."""
+        self._version_grafo += 1
+        self._posiciones = {}
+        self._cache_analitica.clear()
+        self._componentes = None
+        self._registro_analitica = []
+
+    def numero_nodos(self) -> int:
+        """Número de nodos del grafo actual sin forzar la exportación a networkx."""
+        if self.co_prestamos is not None:
+            return self.co_prestamos.numero_nodos()
+        return self._grafo.number_of_nodes() if self._grafo is not None else 0
+
+    def numero_aristas(self) -> int:
+        """Número de aristas del grafo actual sin forzar la exportación a networkx."""
+        if self.co_prestamos is not None:
+            return self.co_prestamos.numero_aristas()
+        return self._grafo.number_of_edges() if self._grafo is not None else 0
 
     def _get_node_id(self, obj_type: str, obj_key: str) -> str:
         """
@@ -86,6 +1137,9 @@ class GestorGrafoBiblioteca:
         """
         try:
             node_id = self._get_node_id("libro", libro_isbn)
+            self._marcar_nodo(node_id)
+            if self.co_prestamos is not None:
+                return self._agregar_libro_co_prestamos(node_id, libro_isbn, titulo, autor_nombre)
             if not self.grafo.has_node(node_id):
                 self.grafo.add_node(
                     node_id, 
@@ -96,7 +1150,8 @@ class GestorGrafoBiblioteca:
                     peso=peso,
                     fecha_creacion=datetime.now().isoformat()
                 )
-                self.logger.info(f"Libro '{titulo}' (ISBN: {libro_isbn}) agregado.")
+                self.logger_nodos.debug("Libro '%s' (ISBN: %s) agregado.", titulo, libro_isbn)
+                self._registrar_operacion('libros')
                 return True
             else:
                 self.grafo.nodes[node_id].update({
@@ -106,9 +1161,20 @@ class GestorGrafoBiblioteca:
                 })
                 return True
         except Exception as e:
-            self.logger.error(f"Error al agregar libro: {e}")
+            self.logger_nodos.error("Error al agregar libro: %s", e)
             return False
 
+    def _agregar_libro_co_prestamos(self, node_id: str, libro_isbn: str, titulo: Optional[str],
+                                    autor_nombre: Optional[str]) -> bool:
+        """Agrega o actualiza un libro en el almacén de co-préstamos, con sus mismos atributos."""
+        nuevo = self.co_prestamos.indice(node_id) is None
+        self.co_prestamos.agregar_nodo(node_id, "libro", isbn=libro_isbn, titulo=titulo, autor=autor_nombre)
+        self._grafo = None
+        if nuevo:
+            self.logger_nodos.debug("Libro '%s' (ISBN: %s) agregado.", titulo, libro_isbn)
+            self._registrar_operacion('libros')
+        return True
+
     def vincular_libro_con_usuario(self, libro_isbn: str, usuario_correo: str, 
                                  tipo_relacion: str = "PRESTAMO", peso: float = 1.0) -> bool:
         """
@@ -127,8 +1193,13 @@ class GestorGrafoBiblioteca:
             libro_node = self._get_node_id("libro", libro_isbn)
             usuario_node = self._get_node_id("usuario", usuario_correo)
             
+            if self.co_prestamos is not None:
+                self.logger_nodos.error("El grafo de co-préstamos solo relaciona libros: no se puede vincular "
+                                        "a %s con %s", usuario_correo, libro_isbn)
+                return False
             if not self.grafo.has_node(libro_node) or not self.grafo.has_node(usuario_node):
-                self.logger.warning(f"No se pudieron encontrar los nodos para vincular")
+                self.logger_nodos.warning("No se pudieron encontrar los nodos para vincular %s y %s",
+                                          usuario_correo, libro_isbn)
                 return False
                 
             self.grafo.add_edge(
@@ -138,53 +1209,181 @@ class GestorGrafoBiblioteca:
                 peso=peso,
                 fecha_vinculacion=datetime.now().isoformat()
             )
-            self.logger.info(f"Vinculado usuario '{usuario_correo}' con libro '{libro_isbn}'")
+            self._marcar_arista(usuario_node, libro_node)
+            self.logger_nodos.debug("Vinculado usuario '%s' con libro '%s'", usuario_correo, libro_isbn)
+            self._registrar_operacion('vínculos')
             return True
         except Exception as e:
-            self.logger.error(f"Error al vincular libro con usuario: {e}")
+            self.logger_nodos.error("Error al vincular libro con usuario: %s", e)
             return False
 
     def buscar_camino_entre_nodos(self, nodo_origen: str, nodo_destino: str, 
-                                max_profundidad: int = 3) -> List[str]:
+                                max_profundidad: Optional[int] = 3,
+                                presupuesto_expansiones: Optional[int] = None) -> List[str]:
         """
-        Busca el camino más corto entre dos nodos.
+        Busca el camino de menor peso entre dos nodos con como mucho `max_profundidad` aristas.
+        
+        La búsqueda es bidireccional y por capas: desde el origen se relajan caminos de
+        hasta ceil(max_profundidad / 2) aristas y desde el destino (por aristas de
+        entrada) de hasta floor(max_profundidad / 2); el mejor punto de encuentro da el
+        camino óptimo entre los que respetan el límite. Solo se visitan los nodos a esa
+        distancia de los extremos, no todo el grafo.
         
         Args:
             nodo_origen (str): ID del nodo origen
             nodo_destino (str): ID del nodo destino
-            max_profundidad (int): Profundidad máxima de búsqueda
+            max_profundidad (Optional[int]): Número máximo de aristas del camino. None
+                busca sin límite con Dijkstra bidireccional
+            presupuesto_expansiones (Optional[int]): Máximo de nodos expandidos; al
+                agotarse se devuelve el mejor camino encontrado hasta entonces
             
         Returns:
-            List[str]: Lista de nodos que forman el camino
+            List[str]: Lista de nodos que forman el camino (vacía si no hay)
         """
-        try:
-            if not self.grafo.has_node(nodo_origen) or not self.grafo.has_node(nodo_destino):
-                return []
-                
-            camino = nx.shortest_path(
-                self.grafo,
-                source=nodo_origen,
-                target=nodo_destino,
-                weight='peso'
-            )
-            return camino
-        except nx.NetworkXNoPath:
-            self.logger.warning(f"No se encontró camino entre {nodo_origen} y {nodo_destino}")
-            return []
-        except Exception as e:
-            self.logger.error(f"Error al buscar camino: {e}")
-            return []
+        caminos = self.buscar_caminos([(nodo_origen, nodo_destino)], max_profundidad, presupuesto_expansiones)
+        return caminos.get((nodo_origen, nodo_destino), [])
 
-    def obtener_recomendaciones(self, usuario_correo: str, max_recomendaciones: int = 5) -> List[Dict[str, Any]]:
+    def buscar_caminos(self, pares: List[tuple], max_profundidad: Optional[int] = 3,
+                       presupuesto_expansiones: Optional[int] = None) -> Dict[tuple, List[str]]:
         """
-        Obtiene recomendaciones de libros para un usuario basadas en sus interacciones.
+        Busca en lote los caminos entre varios pares (origen, destino).
+        
+        Cada búsqueda parcial desde un origen o hacia un destino se hace una sola vez y
+        se reutiliza en todos los pares que lo comparten, de modo que consultar muchos
+        lectores contra un mismo libro cuesta una búsqueda por lector más una por libro.
         
         Args:
-            usuario_correo (str): Correo del usuario
-            max_recomendaciones (int): Número máximo de recomendaciones
+            pares (List[tuple]): Pares (ID de origen, ID de destino)
+            max_profundidad (Optional[int]): Número máximo de aristas de cada camino
+            presupuesto_expansiones (Optional[int]): Máximo de nodos expandidos por búsqueda parcial
             
         Returns:
-            List[Dict[str, Any]]: Lista de recomendaciones con información detallada
+            Dict[tuple, List[str]]: Camino de cada par (vacío si no hay camino)
+        """
+        resultados = {}
+        try:
+            if max_profundidad is None:
+                for origen, destino in pares:
+                    resultados[(origen, destino)] = self._camino_dijkstra(origen, destino)
+                return resultados
+            
+            if self.co_prestamos is not None:
+                almacen = self.co_prestamos
+                indice = almacen.indice
+                
+                def vecinos(nodo):
+                    indices, pesos = almacen.vecinos(nodo)
+                    return zip(indices.tolist(), pesos.tolist())
+                hacia_delante = hacia_atras = vecinos
+            else:
+                grafo = self.grafo
+                indice = lambda nodo: nodo if grafo.has_node(nodo) else None
+                hacia_delante = lambda nodo: ((v, datos.get('peso', 1.0)) for v, datos in grafo.succ[nodo].items())
+                hacia_atras = lambda nodo: ((v, datos.get('peso', 1.0)) for v, datos in grafo.pred[nodo].items())
+            
+            profundidad_delante = (max_profundidad + 1) // 2
+            profundidad_atras = max_profundidad // 2
+            desde_origen = {}
+            hacia_destino = {}
+            for origen, destino in pares:
+                i, j = indice(origen), indice(destino)
+                if i is None or j is None:
+                    resultados[(origen, destino)] = []
+                    continue
+                if i not in desde_origen:
+                    desde_origen[i] = self._busqueda_por_capas(i, hacia_delante, profundidad_delante,
+                                                               presupuesto_expansiones)
+                if j not in hacia_destino:
+                    hacia_destino[j] = self._busqueda_por_capas(j, hacia_atras, profundidad_atras,
+                                                                presupuesto_expansiones)
+                camino = self._unir_busquedas(desde_origen[i], hacia_destino[j])
+                if self.co_prestamos is not None:
+                    camino = [self.co_prestamos.id_nodo(nodo) for nodo in camino]
+                if not camino:
+                    self.logger_analitica.warning("No se encontró camino entre %s y %s con como mucho %s aristas",
+                                                  origen, destino, max_profundidad)
+                resultados[(origen, destino)] = camino
+            return resultados
+        except Exception as e:
+            self.logger_analitica.error("Error al buscar camino: %s", e)
+            return resultados
+
+    def _busqueda_por_capas(self, inicio, vecinos, profundidad: int, presupuesto: Optional[int]):
+        """
+        Relaja caminos desde `inicio` capa a capa (Bellman-Ford acotado en número de aristas).
+        
+        La capa i contiene los nodos cuyo mejor camino de como mucho i aristas mejoró en
+        esa capa, con su distancia y el nodo y la capa anteriores.
+        
+        Returns:
+            tuple: (mejor {nodo: (distancia, capa)}, lista de capas)
+        """
+        capas = [{inicio: (0.0, None, None)}]
+        mejor = {inicio: (0.0, 0)}
+        expandidos = 0
+        for nivel in range(1, profundidad + 1):
+            nueva = {}
+            for nodo, (distancia, _, _) in capas[-1].items():
+                if presupuesto is not None and expandidos >= presupuesto:
+                    self.logger_analitica.warning("Búsqueda desde %s truncada tras %s expansiones", inicio, expandidos)
+                    capas.append(nueva)
+                    return mejor, capas
+                expandidos += 1
+                for vecino, peso in vecinos(nodo):
+                    candidata = distancia + peso
+                    if candidata < mejor.get(vecino, (float('inf'), 0))[0]:
+                        nueva[vecino] = (candidata, nodo, nivel - 1)
+                        mejor[vecino] = (candidata, nivel)
+            if not nueva:
+                break
+            capas.append(nueva)
+        return mejor, capas
+
+    @staticmethod
+    def _unir_busquedas(delante, atras) -> list:
+        """Une una búsqueda desde el origen y otra hacia el destino por su mejor punto de encuentro."""
+        mejor_delante, capas_delante = delante
+        mejor_atras, capas_atras = atras
+        if len(mejor_delante) > len(mejor_atras):
+            comunes = (nodo for nodo in mejor_atras if nodo in mejor_delante)
+        else:
+            comunes = (nodo for nodo in mejor_delante if nodo in mejor_atras)
+        encuentro = min(comunes, key=lambda nodo: mejor_delante[nodo][0] + mejor_atras[nodo][0], default=None)
+        if encuentro is None:
+            return []
+        
+        def cadena(nodo, capas, mejor):
+            nodos = []
+            capa = mejor[nodo][1]
+            while nodo is not None:
+                nodos.append(nodo)
+                _, nodo, capa = capas[capa][nodo]
+            return nodos
+        
+        return cadena(encuentro, capas_delante, mejor_delante)[::-1] + \
+            cadena(encuentro, capas_atras, mejor_atras)[1:]
+
+    def _camino_dijkstra(self, nodo_origen: str, nodo_destino: str) -> List[str]:
+        """Camino de menor peso sin límite de profundidad (Dijkstra bidireccional)."""
+        if not self.grafo.has_node(nodo_origen) or not self.grafo.has_node(nodo_destino):
+            return []
+        try:
+            _, camino = nx.bidirectional_dijkstra(self.grafo, nodo_origen, nodo_destino, weight='peso')
+            return camino
+        except nx.NetworkXNoPath:
+            self.logger_analitica.warning("No se encontró camino entre %s y %s", nodo_origen, nodo_destino)
+            return []
+
+    def obtener_recomendaciones(self, usuario_correo: str, max_recomendaciones: int = 5) -> List[Dict[str, Any]]:
+        """
+        Obtiene recomendaciones de libros para un usuario basadas en sus interacciones.
+        
+        Args:
+            usuario_correo (str): Correo del usuario
+            max_recomendaciones (int): Número máximo de recomendaciones
+            
+        Returns:
+            List[Dict[str, Any]]: Lista de recomendaciones con información detallada
         """
         try:
             usuario_node = self._get_node_id("usuario", usuario_correo)
@@ -222,7 +1421,7 @@ class GestorGrafoBiblioteca:
                         
             return recomendaciones[:max_recomendaciones]
         except Exception as e:
-            self.logger.error(f"Error al obtener recomendaciones: {e}")
+            self.logger_recomendaciones.error("Error al obtener recomendaciones: %s", e)
             return []
 
     def _calcular_similitud(self, usuario1: str, usuario2: str) -> float:
@@ -248,7 +1447,7 @@ class GestorGrafoBiblioteca:
             
             return interseccion / union if union > 0 else 0.0
         except Exception as e:
-            self.logger.error(f"Error al calcular similitud: {e}")
+            self.logger_recomendaciones.error("Error al calcular similitud: %s", e)
             return 0.0
 
     def agregar_usuario(self, correo: str, nombre: Optional[str] = None, peso: float = 1.0) -> bool:
@@ -264,7 +1463,12 @@ class GestorGrafoBiblioteca:
             bool: True si se agregó correctamente, False en caso contrario
         """
         try:
+            if self.co_prestamos is not None:
+                self.logger_nodos.error("El grafo de co-préstamos solo contiene libros: no se puede agregar "
+                                        "el usuario %s", correo)
+                return False
             node_id = self._get_node_id("usuario", correo)
+            self._marcar_nodo(node_id)
             if not self.grafo.has_node(node_id):
                 self.grafo.add_node(
                     node_id,
@@ -274,7 +1478,8 @@ class GestorGrafoBiblioteca:
                     peso=peso,
                     fecha_creacion=datetime.now().isoformat()
                 )
-                self.logger.info(f"Usuario '{nombre}' (Correo: {correo}) agregado.")
+                self.logger_nodos.debug("Usuario '%s' (Correo: %s) agregado.", nombre, correo)
+                self._registrar_operacion('usuarios')
                 return True
             else:
                 self.grafo.nodes[node_id].update({
@@ -283,77 +1488,471 @@ class GestorGrafoBiblioteca:
                 })
                 return True
         except Exception as e:
-            self.logger.error(f"Error al agregar usuario: {e}")
+            self.logger_nodos.error("Error al agregar usuario: %s", e)
             return False
 
     def guardar_estado(self) -> bool:
         """
         Guarda el estado actual del grafo en la base de datos.
         
+        Normalmente solo se añaden al registro `grafo_cambios` los nodos y aristas
+        modificados desde el último guardado. Se escribe un checkpoint completo en
+        `grafo_estado` cuando el grafo se reemplazó entero, cuando otro gestor escribió
+        un checkpoint más reciente o cuando el registro supera `max_cambios_log`; al
+        hacerlo se actualiza el puntero al checkpoint vigente y se eliminan los
+        checkpoints fuera de la política de retención (los últimos
+        `checkpoints_retenidos` y el último de cada uno de los `checkpoints_diarios`
+        días más recientes) junto con sus cambios. Si la poda deja suficientes páginas
+        libres, se ejecuta un vacuum incremental.
+        
         Returns:
             bool: True si se guardó correctamente, False en caso contrario
         """
+        self._resumir_operaciones()
         try:
-            datos_grafo = {
-                'nodes': dict(self.grafo.nodes(data=True)),
-                'edges': list(self.grafo.edges(data=True))
-            }
-            
-            with sqlite3.connect(self.db_path) as conn:
+            with self._conectar() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO grafo_estado (fecha_actualizacion, datos_grafo)
-                    VALUES (?, ?)
-                ''', (datetime.now().isoformat(), json.dumps(datos_grafo)))
+                if self._necesita_checkpoint(cursor):
+                    self._escribir_checkpoint(cursor)
+                else:
+                    self._escribir_cambios(cursor)
                 conn.commit()
+                if self._vacuum_pendiente:
+                    self._programar_vacuum(conn)
+            self._nodos_modificados.clear()
+            self._aristas_modificadas.clear()
             return True
         except Exception as e:
-            self.logger.error(f"Error al guardar estado: {e}")
+            self.logger_persistencia.error("Error al guardar estado: %s", e)
+            return False
+
+    def _ultimo_checkpoint(self, cursor) -> Optional[int]:
+        """Devuelve el ID del checkpoint vigente, o None si no hay ninguno."""
+        cursor.execute('SELECT checkpoint_id FROM grafo_estado_actual WHERE id = 0')
+        fila = cursor.fetchone()
+        if fila is None:
+            # Bases de datos anteriores al puntero: el ID más alto es el más reciente
+            cursor.execute('SELECT MAX(id) FROM grafo_estado')
+            fila = cursor.fetchone()
+        return fila[0]
+
+    def _necesita_checkpoint(self, cursor) -> bool:
+        """Decide si el próximo guardado debe ser un checkpoint completo."""
+        if self._requiere_checkpoint or self._checkpoint_id is None:
+            return True
+        if self._ultimo_checkpoint(cursor) != self._checkpoint_id:
+            return True
+        cursor.execute(
+            'SELECT COUNT(*) FROM grafo_cambios WHERE checkpoint_id = ?', (self._checkpoint_id,)
+        )
+        pendientes = len(self._nodos_modificados) + len(self._aristas_modificadas)
+        return cursor.fetchone()[0] + pendientes > self.max_cambios_log
+
+    def _escribir_checkpoint(self, cursor) -> None:
+        """Escribe el grafo completo como checkpoint y poda los checkpoints antiguos."""
+        if self.formato_checkpoint == "binario" or self.co_prestamos is not None:
+            salida = io.BytesIO()
+            self._escribir_snapshot_grafo(salida)
+            datos_grafo = sqlite3.Binary(salida.getbuffer())
+        else:
+            datos_grafo = json.dumps({
+                'nodes': dict(self.grafo.nodes(data=True)),
+                'edges': list(self.grafo.edges(data=True))
+            })
+        cursor.execute('''
+            INSERT INTO grafo_estado (fecha_actualizacion, datos_grafo)
+            VALUES (?, ?)
+        ''', (datetime.now().isoformat(), datos_grafo))
+        self._checkpoint_id = cursor.lastrowid
+        self._requiere_checkpoint = False
+        cursor.execute('''
+            INSERT OR REPLACE INTO grafo_estado_actual (id, checkpoint_id) VALUES (0, ?)
+        ''', (self._checkpoint_id,))
+        
+        # Retención: los últimos N checkpoints más el último de cada uno de los días recientes
+        cursor.execute('''
+            DELETE FROM grafo_estado
+            WHERE id NOT IN (
+                SELECT id FROM grafo_estado ORDER BY id DESC LIMIT ?
+            )
+            AND id NOT IN (
+                SELECT MAX(id) FROM grafo_estado
+                GROUP BY substr(fecha_actualizacion, 1, 10)
+                ORDER BY substr(fecha_actualizacion, 1, 10) DESC LIMIT ?
+            )
+        ''', (self.checkpoints_retenidos, self.checkpoints_diarios))
+        if cursor.rowcount:
+            self._vacuum_pendiente = True
+        cursor.execute('''
+            DELETE FROM grafo_cambios
+            WHERE checkpoint_id NOT IN (SELECT id FROM grafo_estado)
+        ''')
+
+    def _programar_vacuum(self, conn) -> None:
+        """
+        Devuelve al sistema las páginas liberadas por la poda de checkpoints.
+        
+        Solo actúa cuando las páginas libres superan `paginas_libres_vacuum`. Con
+        auto_vacuum incremental se liberan sin bloquear la base de datos; una base de
+        datos creada sin él se convierte una única vez mediante un VACUUM completo.
+        """
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA freelist_count")
+        if cursor.fetchone()[0] < self.paginas_libres_vacuum:
+            return
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] == 2:
+            # executescript ejecuta el pragma hasta el final; execute solo libera una página
+            conn.executescript("PRAGMA incremental_vacuum;")
+        else:
+            self.logger_persistencia.info("Convirtiendo la base de datos a auto_vacuum incremental")
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+        self._vacuum_pendiente = False
+
+    def compactar_db(self) -> bool:
+        """
+        Ejecuta un VACUUM completo de la base de datos del grafo.
+        
+        Returns:
+            bool: True si se compactó correctamente, False en caso contrario
+        """
+        try:
+            with self._conectar() as conn:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            self._vacuum_pendiente = False
+            return True
+        except sqlite3.Error as e:
+            self.logger_persistencia.error("Error al compactar la base de datos: %s", e)
             return False
 
+    def _escribir_cambios(self, cursor) -> None:
+        """Añade al registro los nodos y aristas modificados desde el último guardado."""
+        if self.co_prestamos is not None:
+            filas = self._cambios_co_prestamos()
+        else:
+            filas = self._cambios_networkx()
+        cursor.executemany('''
+            INSERT INTO grafo_cambios (checkpoint_id, tipo, origen, destino, borrado, atributos)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', filas)
+
+    def _cambios_co_prestamos(self) -> List[tuple]:
+        """
+        Filas del registro de cambios leídas del almacén de co-préstamos.
+        
+        Se consultan solo los nodos y aristas marcados, sin exportar el almacén a networkx.
+        Los pesos se guardan relativos al tiempo base, como en el almacén.
+        """
+        almacen = self.co_prestamos
+        filas = []
+        for node_id in self._nodos_modificados:
+            indice = almacen.indice(node_id)
+            if indice is not None:
+                filas.append((self._checkpoint_id, 'nodo', node_id, None, 0,
+                              json.dumps(almacen.atributos_nodo(indice))))
+            else:
+                filas.append((self._checkpoint_id, 'nodo', node_id, None, 1, None))
+        for origen, destino in self._aristas_modificadas:
+            indice_origen, indice_destino = almacen.indice(origen), almacen.indice(destino)
+            peso = almacen.peso(indice_origen, indice_destino) \
+                if indice_origen is not None and indice_destino is not None else 0.0
+            if peso:
+                filas.append((self._checkpoint_id, 'arista', origen, destino, 0,
+                              json.dumps({'peso': peso, 'tipo': "co-prestamo"})))
+            else:
+                filas.append((self._checkpoint_id, 'arista', origen, destino, 1, None))
+        return filas
+
+    def _cambios_networkx(self) -> List[tuple]:
+        """Filas del registro de cambios leídas del grafo networkx."""
+        filas = []
+        for node_id in self._nodos_modificados:
+            if self.grafo.has_node(node_id):
+                filas.append((self._checkpoint_id, 'nodo', node_id, None, 0,
+                              json.dumps(self.grafo.nodes[node_id])))
+            else:
+                filas.append((self._checkpoint_id, 'nodo', node_id, None, 1, None))
+        for origen, destino in self._aristas_modificadas:
+            if self.grafo.has_edge(origen, destino):
+                filas.append((self._checkpoint_id, 'arista', origen, destino, 0,
+                              json.dumps(self.grafo[origen][destino])))
+            else:
+                filas.append((self._checkpoint_id, 'arista', origen, destino, 1, None))
+        return filas
+
     def cargar_estado(self) -> bool:
         """
         Carga el último estado guardado del grafo desde la base de datos.
         
+        Restaura el checkpoint vigente (según el puntero de `grafo_estado_actual`) y
+        aplica en orden los cambios registrados sobre él.
+        
         Returns:
             bool: True si se cargó correctamente, False en caso contrario
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._conectar() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT datos_grafo FROM grafo_estado
-                    ORDER BY fecha_actualizacion DESC LIMIT 1
-                ''')
+                cursor.execute(
+                    'SELECT id, datos_grafo FROM grafo_estado WHERE id = ?', (self._ultimo_checkpoint(cursor),)
+                )
                 resultado = cursor.fetchone()
                 
                 if resultado:
-                    datos_grafo = json.loads(resultado[0])
-                    self.grafo = nx.DiGraph()
+                    checkpoint_id, datos = resultado
+                    cursor.execute('''
+                        SELECT tipo, origen, destino, borrado, atributos FROM grafo_cambios
+                        WHERE checkpoint_id = ? ORDER BY seq
+                    ''', (checkpoint_id,))
+                    cambios = cursor.fetchall()
                     
-                    # Restaurar nodos
-                    for node, attrs in datos_grafo['nodes'].items():
-                        self.grafo.add_node(node, **attrs)
+                    if isinstance(datos, bytes):
+                        self._cargar_snapshot_grafo(_leer_snapshot(datos))
+                        if self.co_prestamos is not None:
+                            # Los cambios se aplican sobre el almacén compacto, que se conserva
+                            self._aplicar_cambios_co_prestamos(cambios)
+                            cambios = []
+                            grafo = None
+                        else:
+                            grafo = nx.DiGraph(self.grafo) if cambios else None
+                    else:
+                        datos_grafo = json.loads(datos)
+                        grafo = nx.DiGraph()
                         
-                    # Restaurar aristas
-                    for u, v, attrs in datos_grafo['edges']:
-                        self.grafo.add_edge(u, v, **attrs)
+                        # Restaurar nodos
+                        for node, attrs in datos_grafo['nodes'].items():
+                            grafo.add_node(node, **attrs)
+                            
+                        # Restaurar aristas
+                        for u, v, attrs in datos_grafo['edges']:
+                            grafo.add_edge(u, v, **attrs)
+                    
+                    # Aplicar los cambios registrados después del checkpoint
+                    for tipo, origen, destino, borrado, atributos in cambios:
+                        if tipo == 'nodo':
+                            if borrado:
+                                if grafo.has_node(origen):
+                                    grafo.remove_node(origen)
+                            else:
+                                grafo.add_node(origen)
+                                grafo.nodes[origen].clear()
+                                grafo.nodes[origen].update(json.loads(atributos))
+                        elif borrado:
+                            if grafo.has_edge(origen, destino):
+                                grafo.remove_edge(origen, destino)
+                        else:
+                            grafo.add_edge(origen, destino)
+                            grafo[origen][destino].clear()
+                            grafo[origen][destino].update(json.loads(atributos))
+                    
+                    if grafo is not None:
+                        self.grafo = grafo
+                    self._checkpoint_id = checkpoint_id
+                    self._requiere_checkpoint = False
+                    self._nodos_modificados.clear()
+                    self._aristas_modificadas.clear()
                     return True
             return False
         except Exception as e:
-            self.logger.error(f"Error al cargar estado: {e}")
+            self.logger_persistencia.error("Error al cargar estado: %s", e)
             return False
 
-    def analizar_eficiencia(self) -> Dict[str, Any]:
+    def _aplicar_cambios_co_prestamos(self, cambios) -> None:
+        """
+        Aplica el registro de cambios al almacén de co-préstamos recién cargado.
+        
+        El registro guarda el peso final de cada arista, así que se suma la diferencia
+        con el peso del checkpoint. El almacén no admite bajas de nodos: el grafo de
+        co-préstamos nunca las registra.
+        """
+        almacen = self.co_prestamos
+        pesos_finales = {}
+        for tipo, origen, destino, borrado, atributos in cambios:
+            if tipo == 'arista':
+                pesos_finales[(origen, destino)] = 0.0 if borrado else json.loads(atributos)['peso']
+            elif not borrado:
+                atributos = json.loads(atributos)
+                almacen.agregar_nodo(origen, atributos.pop('tipo'), **atributos)
+        
+        # Las diferencias se calculan antes de sumar nada para compactar una sola vez
+        origenes, destinos, diferencias = [], [], []
+        for (origen, destino), peso in pesos_finales.items():
+            indice_origen, indice_destino = almacen.indice(origen), almacen.indice(destino)
+            diferencia = peso - almacen.peso(indice_origen, indice_destino)
+            if diferencia:
+                origenes.append(indice_origen)
+                destinos.append(indice_destino)
+                diferencias.append(diferencia)
+        if diferencias:
+            almacen.agregar_aristas(np.array(origenes, dtype=np.int64), np.array(destinos, dtype=np.int64),
+                                    np.array(diferencias))
+        self._grafo = None
+
+    def guardar_snapshot(self, ruta: str, comprimir: bool = True) -> bool:
+        """
+        Guarda el grafo actual en un fichero con el formato binario de snapshot.
+        
+        Los IDs de nodo se guardan en una tabla de cadenas, los extremos y pesos de las
+        aristas como arrays de NumPy y el resto de atributos en una sección JSON por
+        columnas, comprimida con zlib si `comprimir` es True.
+        
+        Args:
+            ruta (str): Ruta del fichero de destino
+            comprimir (bool): Si se comprime la sección de atributos
+            
+        Returns:
+            bool: True si se guardó correctamente, False en caso contrario
+        """
+        try:
+            with open(ruta, 'wb') as salida:
+                self._escribir_snapshot_grafo(salida, comprimir)
+            return True
+        except Exception as e:
+            self.logger_persistencia.error("Error al guardar snapshot: %s", e)
+            return False
+
+    def cargar_snapshot(self, ruta: str) -> bool:
+        """
+        Carga un snapshot binario guardado con guardar_snapshot.
+        
+        El fichero se proyecta en memoria con mmap y las aristas se leen como vistas de
+        NumPy sobre él, de modo que no se materializa ninguna copia intermedia del grafo.
+        Un snapshot del grafo de co-préstamos se restaura directamente como AlmacenGrafo.
+        
+        Args:
+            ruta (str): Ruta del fichero de snapshot
+            
+        Returns:
+            bool: True si se cargó correctamente, False en caso contrario
+        """
+        try:
+            with open(ruta, 'rb') as entrada, \
+                    mmap.mmap(entrada.fileno(), 0, access=mmap.ACCESS_READ) as proyeccion:
+                snapshot = _leer_snapshot(proyeccion)
+                try:
+                    self._cargar_snapshot_grafo(snapshot)
+                finally:
+                    # Soltar las vistas sobre el mmap antes de cerrarlo
+                    del snapshot
+            self._requiere_checkpoint = True
+            return True
+        except Exception as e:
+            self.logger_persistencia.error("Error al cargar snapshot: %s", e)
+            return False
+
+    def _escribir_snapshot_grafo(self, salida, comprimir: bool = True) -> None:
+        """Escribe el grafo actual (almacén de co-préstamos o networkx) como snapshot."""
+        if self.co_prestamos is not None:
+            decaimiento = {'tasa_decaimiento': self._tasa_decaimiento, 'tiempo_base': self._tiempo_base}
+            self.co_prestamos.escribir_snapshot(salida, comprimir, decaimiento)
+            return
+        
+        grafo = self.grafo
+        ids = list(grafo.nodes)
+        indice = {nodo: i for i, nodo in enumerate(ids)}
+        num_aristas = grafo.number_of_edges()
+        origenes = np.empty(num_aristas, dtype=np.int32)
+        destinos = np.empty(num_aristas, dtype=np.int32)
+        pesos = np.full(num_aristas, np.nan)
+        atributos_aristas = []
+        for i, (u, v, datos) in enumerate(grafo.edges(data=True)):
+            origenes[i] = indice[u]
+            destinos[i] = indice[v]
+            peso = datos.get('peso')
+            if isinstance(peso, (int, float)) and not isinstance(peso, bool):
+                pesos[i] = peso
+                datos = {k: w for k, w in datos.items() if k != 'peso'}
+            atributos_aristas.append(datos)
+        atributos = {
+            'nodos': _columnas_atributos([grafo.nodes[nodo] for nodo in ids]),
+            'aristas': _columnas_atributos(atributos_aristas)
+        }
+        _escribir_snapshot(salida, ids, origenes, destinos, pesos, atributos, True, comprimir)
+
+    def _cargar_snapshot_grafo(self, snapshot: Dict[str, Any], tam_lote: int = 65536) -> None:
+        """Sustituye el grafo actual por el contenido de un snapshot ya interpretado."""
+        if not snapshot['dirigido']:
+            self.grafo = None  # Descarta el grafo actual sin crear uno networkx
+            self.co_prestamos = AlmacenGrafo.desde_snapshot(snapshot)
+            self._grafo = None
+            metadatos = snapshot['atributos'].get('metadatos', {})
+            self._tasa_decaimiento = metadatos.get('tasa_decaimiento', 0.0)
+            self._tiempo_base = metadatos.get('tiempo_base', 0.0)
+            return
+        
+        ids = snapshot['ids']
+        grafo = nx.DiGraph()
+        atributos_nodos = _registros_desde_columnas(snapshot['atributos']['nodos'], len(ids))
+        grafo.add_nodes_from(zip(ids, atributos_nodos))
+        
+        columnas_aristas = snapshot['atributos']['aristas']
+        atributos_aristas = _registros_desde_columnas(columnas_aristas, len(snapshot['pesos'])) \
+            if columnas_aristas else None
+        # Añadir las aristas por lotes para no convertir los arrays completos a listas
+        for inicio in range(0, len(snapshot['pesos']), tam_lote):
+            fin = inicio + tam_lote
+            origenes = snapshot['origenes'][inicio:fin].tolist()
+            destinos = snapshot['destinos'][inicio:fin].tolist()
+            pesos = snapshot['pesos'][inicio:fin].tolist()
+            lote = []
+            for j, (u, v, w) in enumerate(zip(origenes, destinos, pesos)):
+                datos = dict(atributos_aristas[inicio + j]) if atributos_aristas else {}
+                if w == w:  # NaN marca un peso ausente
+                    datos['peso'] = w
+                lote.append((ids[u], ids[v], datos))
+            grafo.add_edges_from(lote)
+        self.grafo = grafo
+
+    def _aristas_indexadas(self):
+        """
+        Devuelve el grafo actual como arrays de índices de nodo.
+        
+        Returns:
+            tuple: (IDs de nodo, orígenes, destinos, pesos actuales, dirigido)
+        """
+        if self.co_prestamos is not None:
+            origenes, destinos, pesos = self.co_prestamos.aristas()
+            return (self.co_prestamos._ids, origenes.astype(np.int64), destinos.astype(np.int64),
+                    pesos * self.factor_decaimiento(), False)
+        grafo = self.grafo
+        ids = list(grafo.nodes)
+        indice = {nodo: i for i, nodo in enumerate(ids)}
+        num_aristas = grafo.number_of_edges()
+        pares = np.fromiter(
+            (indice[nodo] for arista in grafo.edges for nodo in arista),
+            dtype=np.int64, count=2 * num_aristas
+        ).reshape(-1, 2)
+        pesos = np.fromiter((peso for _, _, peso in grafo.edges(data='peso', default=1.0)),
+                            dtype=np.float64, count=num_aristas)
+        return ids, pares[:, 0], pares[:, 1], pesos, True
+
+    def analizar_eficiencia(self, modo: str = "auto", presupuesto_segundos: float = 10.0,
+                            muestras_clustering: int = 20000, semilla: Optional[int] = None) -> Dict[str, Any]:
         """
         Realiza un análisis de eficiencia del grafo.
         
+        Las métricas se calculan con NumPy sobre listas de adyacencia CSR. El diámetro
+        se acota con barridos dobles de BFS (cota inferior: excentricidad de los nodos
+        barridos; cota superior: excentricidad de salida más de entrada de un nodo) y el
+        coeficiente de clustering se estima muestreando cuñas con un intervalo de
+        confianza de Wilson al 95%. En modo "auto" cada métrica se calcula de forma
+        exacta solo si cabe en el presupuesto de tiempo.
+        
+        Args:
+            modo (str): "auto", "aproximado" (nunca exacto) o "exacto" (ignora el presupuesto)
+            presupuesto_segundos (float): Tiempo máximo orientativo para el diámetro y el clustering
+            muestras_clustering (int): Número de cuñas muestreadas para el clustering
+            semilla (Optional[int]): Semilla del generador aleatorio del muestreo
+            
         Returns:
-            Dict[str, Any]: Métricas de eficiencia
+            Dict[str, Any]: Métricas de eficiencia. `intervalos` contiene las cotas de
+            diámetro y clustering, y `exacto` indica qué métricas son exactas
         """
         try:
-            num_nodos = self.grafo.number_of_nodes()
-            num_aristas = self.grafo.number_of_edges()
+            num_nodos = self.numero_nodos()
+            num_aristas = self.numero_aristas()
 
             if num_nodos == 0:
                 return {
@@ -366,138 +1965,873 @@ class GestorGrafoBiblioteca:
                     'coeficiente_clustering': 0.0
                 }
 
-            grado_promedio = sum(dict(self.grafo.degree()).values()) / num_nodos
+            limite = time.perf_counter() + presupuesto_segundos
+            ids, origenes, destinos, _, dirigido = self._aristas_indexadas()
+            n = len(ids)
+            salida = _csr_desde_aristas(origenes, destinos, n) if dirigido else \
+                _csr_desde_aristas(np.concatenate([origenes, destinos]), np.concatenate([destinos, origenes]), n)
+            entrada = _csr_desde_aristas(destinos, origenes, n) if dirigido else salida
+            # Vista no dirigida sin lazos, como en nx.average_clustering(grafo.to_undirected())
+            sin_lazos = origenes != destinos
+            no_dirigido = _csr_desde_aristas(
+                np.concatenate([origenes[sin_lazos], destinos[sin_lazos]]),
+                np.concatenate([destinos[sin_lazos], origenes[sin_lazos]]), n
+            )
 
-            is_strongly_connected = nx.is_strongly_connected(self.grafo)
-            diametro = nx.diameter(self.grafo) if is_strongly_connected else float('inf')
-            coeficiente_clustering = nx.average_clustering(self.grafo.to_undirected())
+            grados = np.diff(salida[0]) + np.diff(entrada[0]) if dirigido else np.diff(salida[0])
+            diametro, intervalo_diametro, diametro_exacto = self._acotar_diametro(
+                salida, entrada, grados, modo, time.perf_counter() + presupuesto_segundos / 2
+            )
+            clustering, intervalo_clustering, clustering_exacto = self._estimar_clustering(
+                no_dirigido, modo, muestras_clustering, limite, np.random.default_rng(semilla)
+            )
 
             return {
                 'numero_nodos': num_nodos,
                 'numero_aristas': num_aristas,
-                'densidad': nx.density(self.grafo),
-                'componentes_conexas': nx.number_weakly_connected_components(self.grafo),
-                'grado_promedio': grado_promedio,
+                'densidad': num_aristas / (num_nodos * (num_nodos - 1)) if num_nodos > 1 else 0.0,
+                'componentes_conexas': len(np.unique(_etiquetar_componentes(origenes, destinos, n))),
+                'grado_promedio': 2 * num_aristas / num_nodos,
                 'diametro': diametro,
-                'coeficiente_clustering': coeficiente_clustering
+                'coeficiente_clustering': clustering,
+                'estadisticas_grado': {
+                    'minimo': int(grados.min()),
+                    'maximo': int(grados.max()),
+                    'mediana': float(np.median(grados)),
+                    'desviacion': float(grados.std())
+                },
+                'intervalos': {
+                    'diametro': intervalo_diametro,
+                    'coeficiente_clustering': intervalo_clustering
+                },
+                'exacto': {
+                    'diametro': diametro_exacto,
+                    'coeficiente_clustering': clustering_exacto
+                }
             }
         except Exception as e:
-            self.logger.error(f"Error al analizar eficiencia: {e}", exc_info=True)
+            self.logger_analitica.error("Error al analizar eficiencia: %s", e, exc_info=True)
             return {}
 
-    def visualizar_grafo(self, tipo_grafo: str = "co-préstamos"):
+    def _acotar_diametro(self, salida, entrada, grados: np.ndarray, modo: str, limite: float,
+                         barridos: int = 4):
         """
-        Visualiza el grafo actual usando matplotlib.
+        Acota el diámetro (dirigido) con barridos dobles de BFS.
+        
+        Returns:
+            tuple: (diámetro o cota inferior, (cota inferior, cota superior), exacto)
+        """
+        infinito = float('inf')
+        distancias = _bfs_csr(*salida, int(np.argmax(grados)))
+        if (distancias < 0).any() or (_bfs_csr(*entrada, int(np.argmax(grados))) < 0).any():
+            # No fuertemente conexo: diámetro infinito, igual que el cálculo exacto
+            return infinito, (infinito, infinito), True
+
+        inferior, superior = 0, infinito
+        visitados = set()
+        inicio_barridos = time.perf_counter()
+        origen = int(np.argmax(grados))
+        for _ in range(barridos):
+            if origen in visitados:
+                break
+            visitados.add(origen)
+            distancias = _bfs_csr(*salida, origen)
+            excentricidad_entrada = int(_bfs_csr(*entrada, origen).max())
+            inferior = max(inferior, int(distancias.max()))
+            superior = min(superior, int(distancias.max()) + excentricidad_entrada)
+            # El nodo más lejano es el origen del siguiente barrido
+            origen = int(np.argmax(distancias))
+        if inferior == superior:
+            return inferior, (inferior, superior), True
+
+        # Exacto: una BFS desde cada nodo, si el coste estimado cabe en el presupuesto
+        num_nodos = len(grados)
+        coste_bfs = (time.perf_counter() - inicio_barridos) / (2 * len(visitados))
+        if modo == "exacto" or (modo == "auto" and coste_bfs * num_nodos <= limite - time.perf_counter()):
+            for nodo in range(num_nodos):
+                inferior = max(inferior, int(_bfs_csr(*salida, nodo).max()))
+            return inferior, (inferior, inferior), True
+        return inferior, (inferior, superior), False
+
+    def _estimar_clustering(self, no_dirigido, modo: str, muestras: int, limite: float, rng,
+                            tam_lote: int = 4096):
+        """
+        Estima el coeficiente de clustering medio muestreando cuñas.
+        
+        Se elige un nodo al azar y dos de sus vecinos; la proporción de cuñas cerradas
+        es un estimador insesgado de la media de los coeficientes locales (los nodos con
+        grado menor que 2 cuentan como 0).
+        
+        Returns:
+            tuple: (coeficiente, (cota inferior, cota superior), exacto)
+        """
+        indptr, indices = no_dirigido
+        num_nodos = len(indptr) - 1
+        grados = np.diff(indptr)
+        filas = np.repeat(np.arange(num_nodos, dtype=np.int64), grados)
+        codigos = filas * num_nodos + indices  # Ordenados: permiten buscar aristas con searchsorted
+
+        def cerradas(u: np.ndarray, w: np.ndarray) -> np.ndarray:
+            buscados = u * num_nodos + w
+            posiciones = np.minimum(np.searchsorted(codigos, buscados), max(len(codigos) - 1, 0))
+            return codigos[posiciones] == buscados if len(codigos) else np.zeros(len(u), dtype=bool)
+
+        total_cunas = int((grados * (grados - 1) // 2).sum())
+        if modo == "exacto" or (modo == "auto" and total_cunas <= muestras):
+            suma = 0.0
+            for nodo in np.nonzero(grados >= 2)[0]:
+                vecinos = indices[indptr[nodo]:indptr[nodo + 1]]
+                i, j = np.triu_indices(len(vecinos), k=1)
+                suma += cerradas(vecinos[i], vecinos[j]).mean()
+            coeficiente = suma / num_nodos
+            return coeficiente, (coeficiente, coeficiente), True
+
+        aciertos = 0
+        tomadas = 0
+        while tomadas < muestras and (tomadas == 0 or time.perf_counter() < limite):
+            lote = min(tam_lote, muestras - tomadas)
+            nodos = rng.integers(0, num_nodos, lote)
+            nodos = nodos[grados[nodos] >= 2]  # El resto aporta cuñas abiertas (coeficiente 0)
+            grado = grados[nodos]
+            i = rng.integers(0, grado)
+            j = rng.integers(0, grado - 1)
+            j += j >= i
+            aciertos += int(cerradas(indices[indptr[nodos] + i], indices[indptr[nodos] + j]).sum())
+            tomadas += lote
+        return aciertos / tomadas, _intervalo_wilson(aciertos, tomadas), False
+
+    def componentes_conexas(self) -> List[List[str]]:
+        """
+        Devuelve las componentes (débilmente) conexas del grafo, de mayor a menor.
+        
+        El resultado se mantiene entre llamadas: las altas de nodos y aristas posteriores
+        se aplican de forma incremental uniendo componentes, y solo los cambios que
+        eliminan elementos obligan a recalcularlas.
+        
+        Returns:
+            List[List[str]]: IDs de nodo de cada componente
+        """
+        try:
+            if self._componentes is None:
+                ids, origenes, destinos, _, _ = self._aristas_indexadas()
+                etiquetas = _etiquetar_componentes(origenes, destinos, len(ids))
+                miembros = {}
+                for nodo, etiqueta in zip(ids, etiquetas.tolist()):
+                    miembros.setdefault(etiqueta, []).append(nodo)
+                self._componentes = {
+                    'etiqueta': dict(zip(ids, etiquetas.tolist())),
+                    'miembros': miembros,
+                    'siguiente': len(ids)
+                }
+                self._registro_analitica = []
+            elif self._registro_analitica:
+                self._aplicar_registro_componentes()
+            return sorted(self._componentes['miembros'].values(), key=len, reverse=True)
+        except Exception as e:
+            self.logger_analitica.error("Error al calcular componentes: %s", e, exc_info=True)
+            return []
+
+    def _aplicar_registro_componentes(self) -> None:
+        """Une las componentes afectadas por las altas registradas desde el último cálculo."""
+        etiqueta = self._componentes['etiqueta']
+        miembros = self._componentes['miembros']
+        
+        def etiqueta_de(nodo: str) -> int:
+            if nodo not in etiqueta:
+                etiqueta[nodo] = self._componentes['siguiente']
+                miembros[etiqueta[nodo]] = [nodo]
+                self._componentes['siguiente'] += 1
+            return etiqueta[nodo]
+        
+        for origen, destino in self._registro_analitica:
+            a = etiqueta_de(origen)
+            if destino is None:
+                continue
+            b = etiqueta_de(destino)
+            if a == b:
+                continue
+            # Unir la componente menor a la mayor
+            if len(miembros[a]) < len(miembros[b]):
+                a, b = b, a
+            for nodo in miembros[b]:
+                etiqueta[nodo] = a
+            miembros[a].extend(miembros.pop(b))
+        self._registro_analitica = []
+
+    def centralidad(self, muestras_intermediacion: int = 256, num_procesos: int = 1,
+                    semilla: int = 0) -> Dict[str, Dict[str, float]]:
+        """
+        Calcula la centralidad de grado y de intermediación del grafo (como no dirigido).
+        
+        La intermediación se estima con `muestras_intermediacion` fuentes aleatorias y
+        se normaliza igual que nx.betweenness_centrality(k=...). El resultado se cachea
+        por versión del grafo.
         
         Args:
-            tipo_grafo (str): Tipo de grafo a visualizar ("co-préstamos" o "similitud de usuarios")
+            muestras_intermediacion (int): Fuentes muestreadas (todas si hay menos nodos)
+            num_procesos (int): Si es mayor que 1, las fuentes se reparten entre procesos
+            semilla (int): Semilla para elegir las fuentes
+            
+        Returns:
+            Dict[str, Dict[str, float]]: Para 'grado', 'grado_ponderado' e
+            'intermediacion', el valor de cada nodo
         """
-        if not self.grafo.number_of_nodes():
-            self.logger.warning("El grafo está vacío. No hay nada que visualizar.")
-            return
+        return self.calcular_analitica(num_procesos, muestras_intermediacion, semilla,
+                                       incluir_comunidades=False).get('centralidad', {})
+
+    def comunidades(self, num_procesos: int = 1, semilla: int = 0, resolucion: float = 1.0) -> List[List[str]]:
+        """
+        Detecta comunidades de libros con el método de Louvain ponderado por co-préstamos.
+        
+        Args:
+            num_procesos (int): Si es mayor que 1, el cálculo se hace en un proceso aparte
+            semilla (int): Semilla del algoritmo
+            resolucion (float): Resolución de la modularidad (mayor = comunidades más pequeñas)
+            
+        Returns:
+            List[List[str]]: IDs de nodo de cada comunidad, de mayor a menor
+        """
+        return self.calcular_analitica(num_procesos, semilla=semilla, resolucion=resolucion,
+                                       incluir_centralidad=False).get('comunidades', [])
+
+    def calcular_analitica(self, num_procesos: int = 1, muestras_intermediacion: int = 256,
+                           semilla: int = 0, resolucion: float = 1.0, incluir_centralidad: bool = True,
+                           incluir_comunidades: bool = True) -> Dict[str, Any]:
+        """
+        Calcula componentes, centralidad y comunidades reutilizando lo ya cacheado.
+        
+        Solo se recalcula lo que no está en la caché para la versión actual del grafo.
+        Con varios procesos, Louvain y los lotes de fuentes de la intermediación se
+        ejecutan a la vez en el mismo pool; la lista de adyacencia se comparte con los
+        procesos mediante memoria compartida.
         
+        Returns:
+            Dict[str, Any]: 'componentes', 'centralidad', 'comunidades' y 'version'
+        """
         try:
-            plt.figure(figsize=(12, 8))
-            
-            # Configurar el layout
-            pos = nx.spring_layout(self.grafo, k=1, iterations=50)
-            
-            # Dibujar nodos
-            node_colors = []
-            node_sizes = []
-            for node in self.grafo.nodes():
-                tipo_nodo = self.grafo.nodes[node].get('tipo', '')
-                if tipo_nodo == 'libro':
-                    node_colors.append('lightblue')
-                    node_sizes.append(100 + len(list(self.grafo.neighbors(node))) * 20)
+            clave_centralidad = ('centralidad', muestras_intermediacion, semilla)
+            clave_comunidades = ('comunidades', semilla, resolucion)
+            resultado = {'componentes': self.componentes_conexas(), 'version': self._version_grafo}
+            pendientes = {}
+            for nombre, clave, incluir in (('centralidad', clave_centralidad, incluir_centralidad),
+                                           ('comunidades', clave_comunidades, incluir_comunidades)):
+                if not incluir:
+                    continue
+                version, valor = self._cache_analitica.get(clave, (None, None))
+                if version == self._version_grafo:
+                    resultado[nombre] = valor
                 else:
-                    node_colors.append('lightgreen')
-                    node_sizes.append(100)
-                    
-            nx.draw_networkx_nodes(self.grafo, pos, node_color=node_colors, node_size=node_sizes, alpha=0.7)
+                    pendientes[nombre] = clave
+            if not pendientes:
+                return resultado
             
-            # Dibujar aristas
-            edge_weights = [self.grafo[u][v]['peso'] for u, v in self.grafo.edges()]
-            nx.draw_networkx_edges(self.grafo, pos, width=edge_weights, alpha=0.5, edge_color='gray')
+            ids, origenes, destinos, pesos, _ = self._aristas_indexadas()
+            n = len(ids)
+            sin_lazos = origenes != destinos
+            origenes, destinos, pesos = origenes[sin_lazos], destinos[sin_lazos], pesos[sin_lazos]
+            indptr, indices = _csr_desde_aristas(np.concatenate([origenes, destinos]),
+                                                 np.concatenate([destinos, origenes]), n)
+            fuentes = np.random.default_rng(semilla).permutation(n)[:muestras_intermediacion]
             
-            # Dibujar etiquetas
-            labels = {node: self.grafo.nodes[node].get('titulo', node) for node in self.grafo.nodes()}
-            nx.draw_networkx_labels(self.grafo, pos, labels, font_size=8)
+            ejecutor = ProcessPoolExecutor(max_workers=num_procesos) if num_procesos > 1 and n else None
+            bloques = []
+            try:
+                futuro_comunidades = None
+                if 'comunidades' in pendientes and ejecutor:
+                    futuro_comunidades = ejecutor.submit(_comunidades_louvain, n, origenes, destinos,
+                                                         pesos, semilla, resolucion)
+                if 'centralidad' in pendientes:
+                    if ejecutor:
+                        bloques, descriptor = _compartir_arrays({'indptr': indptr, 'indices': indices})
+                        futuros = [ejecutor.submit(_intermediacion_fuentes_compartido, descriptor, lote)
+                                   for lote in np.array_split(fuentes, num_procesos) if len(lote)]
+                        intermediacion = sum((futuro.result() for futuro in futuros), np.zeros(n))
+                    else:
+                        intermediacion = _intermediacion_fuentes(indptr, indices, fuentes)
+                    if n > 2 and len(fuentes):
+                        intermediacion *= n / len(fuentes) / ((n - 1) * (n - 2))
+                    grados = np.diff(indptr)
+                    fuerza = np.bincount(origenes, weights=pesos, minlength=n) + \
+                        np.bincount(destinos, weights=pesos, minlength=n)
+                    escala = 1.0 / (n - 1) if n > 1 else 1.0
+                    resultado['centralidad'] = {
+                        'grado': dict(zip(ids, (grados * escala).tolist())),
+                        'grado_ponderado': dict(zip(ids, fuerza.tolist())),
+                        'intermediacion': dict(zip(ids, intermediacion.tolist()))
+                    }
+                if 'comunidades' in pendientes:
+                    grupos = futuro_comunidades.result() if futuro_comunidades else \
+                        _comunidades_louvain(n, origenes, destinos, pesos, semilla, resolucion)
+                    resultado['comunidades'] = sorted(([ids[i] for i in grupo] for grupo in grupos),
+                                                      key=len, reverse=True)
+            finally:
+                if ejecutor:
+                    ejecutor.shutdown()
+                _liberar_bloques(bloques)
             
-            # Agregar título y leyenda
-            plt.title(f"Grafo de {tipo_grafo}")
+            for nombre, clave in pendientes.items():
+                self._cache_analitica[clave] = (self._version_grafo, resultado[nombre])
+            return resultado
+        except Exception as e:
+            self.logger_analitica.error("Error al calcular la analítica del grafo: %s", e, exc_info=True)
+            return {}
+
+    def visualizar_grafo(self, tipo_grafo: str = "co-préstamos", ruta: Optional[str] = None,
+                         max_nodos: int = 200, criterio: str = "grado", nodo_central: Optional[str] = None,
+                         radio: int = 2, max_etiquetas: int = 30) -> bool:
+        """
+        Visualiza el grafo actual usando matplotlib.
+        
+        Solo se dibuja un subgrafo: los `max_nodos` nodos de mayor grado (o peso) o, si
+        se indica `nodo_central`, su red ego hasta `radio` saltos. Con `ruta` la figura
+        se exporta a un fichero (PNG, SVG... según la extensión) sin interfaz gráfica;
+        sin ella se muestra en pantalla.
+        
+        Args:
+            tipo_grafo (str): Tipo de grafo a visualizar ("co-préstamos" o "similitud de usuarios")
+            ruta (Optional[str]): Fichero de destino de la exportación
+            max_nodos (int): Número máximo de nodos dibujados
+            criterio (str): "grado" o "peso" para elegir los nodos más relevantes
+            nodo_central (Optional[str]): ID del nodo cuya red ego se dibuja
+            radio (int): Saltos de la red ego desde `nodo_central`
+            max_etiquetas (int): Número de nodos (los más relevantes) que se etiquetan
             
-            # Agregar leyenda para los pesos de las aristas
-            if edge_weights:
-                max_weight = max(edge_weights)
-                plt.text(0.02, 0.02, 
-                        f"Grosor de línea indica frecuencia de co-préstamos\nMáximo: {max_weight} préstamos",
-                        transform=plt.gca().transAxes)
+        Returns:
+            bool: True si se dibujó el grafo, False en caso contrario
+        """
+        if not self.numero_nodos():
+            self.logger_analitica.warning("El grafo está vacío. No hay nada que visualizar.")
+            return False
+        
+        try:
+            if ruta is not None:
+                # Figura independiente de pyplot: se renderiza con Agg (o SVG) sin ventana
+                from matplotlib.figure import Figure
+                figura = Figure(figsize=(12, 8))
+                ejes = figura.add_subplot()
+            else:
+                figura, ejes = plt.subplots(figsize=(12, 8))
             
-            plt.axis('off')
-            plt.tight_layout()
-            plt.show()
+            self._dibujar_subgrafo(ejes, tipo_grafo, max_nodos, criterio, nodo_central, radio, max_etiquetas)
+            figura.tight_layout()
+            if ruta is not None:
+                figura.savefig(ruta, dpi=150)
+                self.logger_analitica.info("Visualización exportada a %s", ruta)
+            else:
+                plt.show()
+            return True
             
         except Exception as e:
-            self.logger.error(f"Error al visualizar grafo: {e}")
+            self.logger_analitica.error("Error al visualizar grafo: %s", e)
             raise
 
-    def construir_grafo_co_prestamos(self, prestamos, libros):
+    def _seleccionar_subgrafo(self, max_nodos: int, criterio: str, nodo_central: Optional[str], radio: int):
+        """
+        Elige los nodos a dibujar y las aristas entre ellos.
+        
+        Returns:
+            tuple: (IDs seleccionados ordenados por relevancia, relevancia, orígenes y
+            destinos como posiciones en la selección, pesos)
+        """
+        ids, origenes, destinos, pesos, _ = self._aristas_indexadas()
+        n = len(ids)
+        if criterio == "peso":
+            relevancia = np.bincount(origenes, weights=pesos, minlength=n) + \
+                np.bincount(destinos, weights=pesos, minlength=n)
+        else:
+            relevancia = (np.bincount(origenes, minlength=n) + np.bincount(destinos, minlength=n)).astype(np.float64)
+        
+        if nodo_central is not None:
+            centro = ids.index(nodo_central) if self.co_prestamos is None else self.co_prestamos.indice(nodo_central)
+            indptr, indices = _csr_desde_aristas(np.concatenate([origenes, destinos]),
+                                                 np.concatenate([destinos, origenes]), n)
+            distancias = _bfs_csr(indptr, indices, centro)
+            candidatos = np.nonzero((distancias >= 0) & (distancias <= radio))[0]
+            # Los más cercanos primero y, a igual distancia, los más relevantes
+            orden = np.lexsort((-relevancia[candidatos], distancias[candidatos]))
+            seleccion = candidatos[orden[:max_nodos]]
+        elif n > max_nodos:
+            seleccion = np.argpartition(-relevancia, max_nodos - 1)[:max_nodos]
+            seleccion = seleccion[np.argsort(-relevancia[seleccion], kind='stable')]
+        else:
+            seleccion = np.argsort(-relevancia, kind='stable')
+        
+        posicion = np.full(n, -1, dtype=np.int64)
+        posicion[seleccion] = np.arange(len(seleccion))
+        mascara = (posicion[origenes] >= 0) & (posicion[destinos] >= 0)
+        return ([ids[i] for i in seleccion.tolist()], relevancia[seleccion],
+                posicion[origenes[mascara]], posicion[destinos[mascara]], pesos[mascara])
+
+    def _layout(self, nodos: List[str], origenes: np.ndarray, destinos: np.ndarray,
+                iteraciones: int = 50) -> np.ndarray:
+        """
+        Calcula las coordenadas de los nodos reutilizando las de visualizaciones anteriores.
+        
+        Si todos los nodos tienen ya posición no se recalcula nada; si no, solo se mueven
+        los nodos nuevos y los ya colocados quedan fijos.
+        """
+        fijos = [nodo for nodo in nodos if nodo in self._posiciones]
+        if len(fijos) < len(nodos):
+            subgrafo = nx.Graph()
+            subgrafo.add_nodes_from(range(len(nodos)))
+            subgrafo.add_edges_from(zip(origenes.tolist(), destinos.tolist()))
+            iniciales = {i: self._posiciones[nodo] for i, nodo in enumerate(nodos) if nodo in self._posiciones}
+            posiciones = nx.spring_layout(
+                subgrafo, k=1 / np.sqrt(len(nodos)), iterations=iteraciones, seed=42,
+                pos=iniciales or None, fixed=list(iniciales) if iniciales else None
+            )
+            for i, nodo in enumerate(nodos):
+                self._posiciones[nodo] = posiciones[i]
+        return np.array([self._posiciones[nodo] for nodo in nodos]).reshape(len(nodos), 2)
+
+    def _dibujar_subgrafo(self, ejes, tipo_grafo: str, max_nodos: int, criterio: str,
+                          nodo_central: Optional[str], radio: int, max_etiquetas: int) -> None:
+        """Dibuja en `ejes` el subgrafo seleccionado con una sola colección de líneas para las aristas."""
+        nodos, relevancia, origenes, destinos, pesos = self._seleccionar_subgrafo(
+            max_nodos, criterio, nodo_central, radio
+        )
+        coordenadas = self._layout(nodos, origenes, destinos)
+        
+        from matplotlib.collections import LineCollection
+        
+        # Dibujar aristas
+        if len(pesos):
+            grosores = 0.5 + 3.5 * pesos / pesos.max()
+            segmentos = np.stack([coordenadas[origenes], coordenadas[destinos]], axis=1)
+            ejes.add_collection(LineCollection(segmentos, linewidths=grosores, colors='gray', alpha=0.5))
+        
+        # Dibujar nodos
+        es_libro = np.array([self._atributo_nodo(nodo, 'tipo') == 'libro' for nodo in nodos], dtype=bool)
+        colores = np.where(es_libro, 'lightblue', 'lightgreen')
+        tamanos = np.where(es_libro, 100 + 400 * relevancia / max(relevancia.max(), 1e-12), 100)
+        ejes.scatter(coordenadas[:, 0], coordenadas[:, 1], c=colores, s=tamanos, alpha=0.7, zorder=2)
+        
+        # Dibujar etiquetas de los nodos más relevantes
+        for nodo, (x, y) in zip(nodos[:max_etiquetas], coordenadas[:max_etiquetas]):
+            ejes.annotate(self._atributo_nodo(nodo, 'titulo') or nodo, (x, y), fontsize=8,
+                          ha='center', va='center', zorder=3)
+        
+        # Agregar título y leyenda
+        titulo = f"Grafo de {tipo_grafo}"
+        if len(nodos) < self.numero_nodos():
+            titulo += f" ({len(nodos)} de {self.numero_nodos()} nodos)"
+        ejes.set_title(titulo)
+        
+        # Agregar leyenda para los pesos de las aristas
+        if len(pesos):
+            ejes.text(0.02, 0.02,
+                      f"Grosor de línea indica frecuencia de co-préstamos\nMáximo: {pesos.max():.3g} préstamos",
+                      transform=ejes.transAxes)
+        
+        ejes.autoscale_view()
+        ejes.axis('off')
+
+    def _atributo_nodo(self, nodo: str, nombre: str):
+        """Devuelve un atributo de nodo tanto del almacén de co-préstamos como del grafo networkx."""
+        if self.co_prestamos is not None:
+            indice = self.co_prestamos.indice(nodo)
+            if nombre == 'tipo':
+                return AlmacenGrafo.TIPOS[self.co_prestamos._tipos[indice]]
+            return self.co_prestamos.atributo(indice, nombre)
+        return self.grafo.nodes[nodo].get(nombre)
+
+    def construir_grafo_co_prestamos(self, prestamos, libros, num_procesos: int = 1,
+                                     vida_media_dias: Optional[float] = 180.0,
+                                     epsilon: float = 1e-3):
         """
         Construye un grafo de co-préstamos donde los nodos son libros y las aristas
         representan libros que han sido prestados juntos por los mismos usuarios.
         
+        Se usa todo el historial de préstamos (activos y devueltos). Cada par de libros
+        de un usuario aporta un peso que decae exponencialmente desde la fecha del
+        préstamo más reciente del par. Los pesos se guardan relativos a un tiempo base
+        común, de modo que el paso del tiempo solo cambia un factor global
+        (ver `factor_decaimiento`) y no obliga a reescribir cada arista.
+        
         Args:
             prestamos (dict): Diccionario de préstamos
             libros (dict): Diccionario de libros
+            num_procesos (int): Si es mayor que 1 y hay al menos _MIN_PRESTAMOS_PARALELO
+                préstamos, el conteo se reparte entre procesos
+            vida_media_dias (float, optional): Días en que un co-préstamo pierde la mitad
+                de su peso. None desactiva el decaimiento (el peso es un conteo)
+            epsilon (float): Peso actual por debajo del cual se eliminan las aristas
         """
-        self.grafo.clear()
-        self.logger.info("Construyendo grafo de co-préstamos...")
+        self.co_prestamos = AlmacenGrafo(dirigido=False)
+        self._grafo = None
+        self._requiere_checkpoint = True
+        self._invalidar_analitica()
+        self.logger_recomendaciones.info("Construyendo grafo de co-préstamos...")
+        
+        self._tasa_decaimiento = np.log(2) / (vida_media_dias * 86400) if vida_media_dias else 0.0
+        self._historial_usuarios = {}
+        for prestamo in prestamos.values():
+            if prestamo.libro.isbn not in libros:
+                continue
+            historial = self._historial_usuarios.setdefault(prestamo.usuario.correoU, {})
+            instante = prestamo.fecha_prestamo.timestamp()
+            if instante > historial.get(prestamo.libro.isbn, float('-inf')):
+                historial[prestamo.libro.isbn] = instante
+        self._tiempo_base = max(
+            (max(h.values()) for h in self._historial_usuarios.values()),
+            default=datetime.now().timestamp()
+        )
         
-        # Crear nodos para cada libro
+        # Crear nodos para cada libro (el índice entero sigue el orden de `libros`)
         for isbn, libro in libros.items():
-            node_id = self._get_node_id("libro", isbn)
-            self.grafo.add_node(
-                node_id,
-                tipo="libro",
+            self.co_prestamos.agregar_nodo(
+                self._get_node_id("libro", isbn),
+                "libro",
                 isbn=isbn,
                 titulo=libro.titulo,
                 autor=libro.autor
             )
         
-        # Crear diccionario de libros prestados por usuario
-        libros_por_usuario = {}
+        # Crear aristas entre libros prestados por el mismo usuario
+        usuarios_arr, libros_arr, tiempos_arr = self._codificar_historial(
+            list(self._historial_usuarios.values()), list(libros.keys())
+        )
+        num_libros = max(len(libros), 1)
+        if num_procesos > 1 and len(usuarios_arr) >= _MIN_PRESTAMOS_PARALELO:
+            codigos, pesos = self._sumar_co_prestamos_paralelo(
+                usuarios_arr, libros_arr, tiempos_arr, num_libros, num_procesos
+            )
+        else:
+            codigos, pesos = _sumar_pares_por_usuario(
+                usuarios_arr, libros_arr, tiempos_arr, num_libros, self._tasa_decaimiento
+            )
+        # El almacén suma los pesos repetidos al compactar
+        self.co_prestamos.agregar_aristas(codigos // num_libros, codigos % num_libros, pesos)
+        
+        self.podar_co_prestamos(epsilon)
+        self.logger_recomendaciones.info("Grafo de co-préstamos construido con %s nodos y %s aristas",
+                                         self.co_prestamos.numero_nodos(), self.co_prestamos.numero_aristas())
+
+    def _sumar_co_prestamo(self, libro1: str, libro2: str, instante: float,
+                           anterior: Optional[float] = None) -> None:
+        """
+        Suma a la arista entre dos libros el aporte de un co-préstamo ocurrido en `instante`.
+        
+        El aporte se expresa en unidades del tiempo base: exp(tasa * (instante - base)).
+        Si el par ya aportaba por un co-préstamo en `anterior`, solo se suma la diferencia,
+        porque cada usuario cuenta una vez por par con su préstamo más reciente.
+        """
+        aporte = float(np.exp(self._tasa_decaimiento * (instante - self._tiempo_base)))
+        if anterior is not None:
+            aporte -= float(np.exp(self._tasa_decaimiento * (anterior - self._tiempo_base)))
+            if aporte == 0.0:
+                return
+        indice1 = self.co_prestamos.indice(self._get_node_id("libro", libro1))
+        indice2 = self.co_prestamos.indice(self._get_node_id("libro", libro2))
+        self.co_prestamos.agregar_arista(indice1, indice2, aporte)
+        self._grafo = None
+        # La exportación a networkx orienta cada par del menor al mayor índice
+        menor, mayor = sorted((indice1, indice2))
+        self._marcar_arista(self.co_prestamos.id_nodo(menor), self.co_prestamos.id_nodo(mayor))
+
+    def _sumar_co_prestamos_paralelo(self, usuarios, libros, tiempos, num_libros: int,
+                                     num_procesos: int):
+        """
+        Suma los co-préstamos del historial codificado repartiendo los usuarios entre procesos.
+        
+        Los arrays (usuario, libro, instante) se comparten en memoria compartida; cada
+        proceso suma los pares de su partición de usuarios y los pesos parciales se
+        devuelven al proceso principal.
+        
+        Args:
+            usuarios (np.ndarray): Índice del usuario de cada préstamo
+            libros (np.ndarray): Índice del libro de cada préstamo
+            tiempos (np.ndarray): Instante de cada préstamo relativo al tiempo base
+            num_libros (int): Número de libros
+            num_procesos (int): Número de procesos de trabajo
+            
+        Returns:
+            tuple: (códigos de pares, pesos); un par puede aparecer en varias particiones
+        """
+        bloques, descriptor = _compartir_arrays({
+            'usuarios': usuarios,
+            'libros': libros,
+            'tiempos': tiempos
+        })
+        try:
+            with ProcessPoolExecutor(max_workers=num_procesos) as executor:
+                parciales = list(executor.map(
+                    _contar_co_prestamos_particion,
+                    [descriptor] * num_procesos,
+                    range(num_procesos),
+                    [num_procesos] * num_procesos,
+                    [num_libros] * num_procesos,
+                    [self._tasa_decaimiento] * num_procesos
+                ))
+        finally:
+            _liberar_bloques(bloques)
+        
+        return (np.concatenate([c for c, _ in parciales]),
+                np.concatenate([w for _, w in parciales]))
+
+    def _codificar_historial(self, historiales, isbns):
+        """
+        Codifica los historiales de préstamo como arrays (usuario, libro, instante).
+        
+        El usuario es la posición de su historial en `historiales`, el libro su posición
+        en `isbns` y el instante se expresa relativo al tiempo base. Los ISBN se traducen
+        con una búsqueda ordenada sobre arrays en lugar de un diccionario por préstamo.
+        
+        Returns:
+            tuple: (usuarios int64, libros int64, tiempos float64)
+        """
+        longitudes = np.fromiter((len(h) for h in historiales), dtype=np.int64, count=len(historiales))
+        total = int(longitudes.sum())
+        usuarios = np.repeat(np.arange(len(historiales), dtype=np.int64), longitudes)
+        tiempos = np.fromiter(chain.from_iterable(h.values() for h in historiales),
+                              dtype=np.float64, count=total) - self._tiempo_base
+        if not total:
+            return usuarios, np.empty(0, dtype=np.int64), tiempos
+        
+        prestados = np.array(list(chain.from_iterable(historiales)))
+        catalogo = np.array(isbns)
+        orden = np.argsort(catalogo)
+        posiciones = np.searchsorted(catalogo, prestados, sorter=orden)
+        # El historial solo guarda libros del catálogo: todas las búsquedas aciertan
+        libros = orden[posiciones].astype(np.int64)
+        return usuarios, libros, tiempos
+
+    def factor_decaimiento(self, ahora: Optional[datetime] = None) -> float:
+        """
+        Factor global que convierte los pesos guardados en pesos actuales.
+        
+        Args:
+            ahora (datetime, optional): Instante de consulta (por defecto, ahora)
+            
+        Returns:
+            float: Factor por el que multiplicar el atributo 'peso' de las aristas
+        """
+        instante = (ahora or datetime.now()).timestamp()
+        return float(np.exp(-self._tasa_decaimiento * (instante - self._tiempo_base)))
+
+    def registrar_prestamo_co_prestamo(self, prestamo) -> None:
+        """
+        Actualiza de forma incremental el grafo de co-préstamos con un préstamo nuevo.
+        
+        El libro prestado se une con cada libro del historial del usuario sin
+        reconstruir el grafo. Si el usuario ya había tomado ese libro, cada par pasa a
+        contar desde el préstamo nuevo en lugar de sumar un segundo aporte, igual que
+        al reconstruir.
+        
+        Args:
+            prestamo: Préstamo recién registrado
+        """
+        if self.co_prestamos is None:
+            self.logger_recomendaciones.warning("El grafo de co-préstamos no está construido.")
+            return
+        
+        correo = prestamo.usuario.correoU
+        isbn = prestamo.libro.isbn
+        if self.co_prestamos.indice(self._get_node_id("libro", isbn)) is None:
+            self.co_prestamos.agregar_nodo(
+                self._get_node_id("libro", isbn),
+                "libro",
+                isbn=isbn,
+                titulo=prestamo.libro.titulo,
+                autor=prestamo.libro.autor
+            )
+            self._grafo = None
+            self._marcar_nodo(self._get_node_id("libro", isbn))
+        
+        instante = prestamo.fecha_prestamo.timestamp()
+        historial = self._historial_usuarios.setdefault(correo, {})
+        anterior = historial.get(isbn)
+        if anterior is not None and instante <= anterior:
+            # Un préstamo más reciente del mismo libro ya cuenta en todos sus pares
+            return
+        for otro_isbn, otro_instante in historial.items():
+            if otro_isbn != isbn:
+                self._sumar_co_prestamo(
+                    otro_isbn, isbn, max(instante, otro_instante),
+                    None if anterior is None else max(anterior, otro_instante)
+                )
+        historial[isbn] = instante
+
+    def podar_co_prestamos(self, epsilon: float = 1e-3, ahora: Optional[datetime] = None) -> int:
+        """
+        Elimina las aristas de co-préstamo cuyo peso actual es menor que `epsilon`.
+        
+        Aprovecha la pasada por todas las aristas para mover el tiempo base a `ahora`,
+        de modo que los pesos guardados vuelven a ser los actuales y no crecen sin límite.
+        
+        Args:
+            epsilon (float): Peso actual mínimo para conservar una arista
+            ahora (datetime, optional): Instante de referencia (por defecto, ahora)
+            
+        Returns:
+            int: Número de aristas eliminadas
+        """
+        if self.co_prestamos is None:
+            return 0
+        ahora = ahora or datetime.now()
+        eliminadas = self.co_prestamos.escalar_y_podar(self.factor_decaimiento(ahora), epsilon)
+        self._tiempo_base = ahora.timestamp()
+        self._grafo = None
+        # Todos los pesos cambian de escala: el próximo guardado es un checkpoint completo
+        self._requiere_checkpoint = True
+        
+        if eliminadas:
+            self._invalidar_analitica()
+            self.logger_recomendaciones.info("Poda de co-préstamos: %s aristas eliminadas", eliminadas)
+        return eliminadas
+
+    def _matriz_usuarios_libros(self, prestamos, usuarios):
+        """
+        Construye la matriz usuario×libro empaquetada en bits.
+        
+        Args:
+            prestamos (dict): Diccionario de préstamos
+            usuarios (dict): Diccionario de usuarios
+            
+        Returns:
+            tuple: (lista de correos, matriz uint8 empaquetada, número de libros por usuario)
+        """
+        correos = list(usuarios.keys())
+        indice_usuario = {correo: i for i, correo in enumerate(correos)}
+        indice_libro = {}
+        filas = []
+        columnas = []
+        
+        # Se usa todo el historial: un libro devuelto sigue indicando afinidad
         for prestamo in prestamos.values():
-            if prestamo.estado == "Activo":  # Solo considerar préstamos activos
-                usuario = prestamo.usuario.correoU
-                if usuario not in libros_por_usuario:
-                    libros_por_usuario[usuario] = set()
-                libros_por_usuario[usuario].add(prestamo.libro.isbn)
+            fila = indice_usuario.get(prestamo.usuario.correoU)
+            if fila is None:
+                continue
+            columna = indice_libro.setdefault(prestamo.libro.isbn, len(indice_libro))
+            filas.append(fila)
+            columnas.append(columna)
         
-        # Crear aristas entre libros prestados por el mismo usuario
-        for usuario, libros_prestados in libros_por_usuario.items():
-            libros_list = list(libros_prestados)
-            for i in range(len(libros_list)):
-                for j in range(i + 1, len(libros_list)):
-                    libro1 = libros_list[i]
-                    libro2 = libros_list[j]
-                    
-                    node1 = self._get_node_id("libro", libro1)
-                    node2 = self._get_node_id("libro", libro2)
-                    
-                    # Si ya existe una arista, incrementar el peso
-                    if self.grafo.has_edge(node1, node2):
-                        self.grafo[node1][node2]['peso'] += 1
-                    else:
-                        self.grafo.add_edge(
-                            node1,
-                            node2,
-                            peso=1,
-                            tipo="co-prestamo",
-                            usuarios=[usuario]
-                        )
+        # Se activan los bits directamente sobre las filas empaquetadas, sin pasar por
+        # una matriz densa de booleanos; el orden de bits es el de np.packbits
+        empaquetada = np.zeros((len(correos), max((len(indice_libro) + 7) // 8, 1)), dtype=np.uint8)
+        if filas:
+            columnas = np.array(columnas)
+            bits = np.right_shift(0x80, columnas % 8).astype(np.uint8)
+            np.bitwise_or.at(empaquetada, (np.array(filas), columnas // 8), bits)
+        
+        libros_por_usuario = _popcount_byte()[empaquetada].sum(axis=1, dtype=np.int64)
+        return correos, empaquetada, libros_por_usuario
+
+    def construir_grafo_similitud_usuarios(self, prestamos, usuarios, umbral: float = 0.1,
+                                           metrica: str = "jaccard", tam_bloque: int = 256,
+                                           num_procesos: int = 1):
+        """
+        Construye un grafo de similitud donde los nodos son usuarios y las aristas
+        unen usuarios cuyos historiales de préstamo se parecen.
+        
+        La similitud se calcula por bloques sobre una matriz usuario×libro empaquetada
+        en bits: las intersecciones se obtienen con AND + popcount y las uniones a partir
+        del número de libros de cada usuario, de modo que la memoria queda acotada por
+        el tamaño de bloque y no por el número total de usuarios.
+        
+        Args:
+            prestamos (dict): Diccionario de préstamos
+            usuarios (dict): Diccionario de usuarios
+            umbral (float): Similitud mínima para crear una arista
+            metrica (str): "jaccard" o "coseno"
+            tam_bloque (int): Número de usuarios procesados por bloque
+            num_procesos (int): Si es mayor que 1, los bloques se reparten entre procesos
+        """
+        if metrica not in ("jaccard", "coseno"):
+            raise ValueError(f"Métrica de similitud no soportada: {metrica}")
         
-        self.logger.info(f"Grafo de co-préstamos construido con {self.grafo.number_of_nodes()} nodos y {self.grafo.number_of_edges()} aristas") 
+        self.grafo = nx.DiGraph()
+        self.logger_recomendaciones.info("Construyendo grafo de similitud de usuarios...")
+        
+        correos, matriz, libros_por_usuario = self._matriz_usuarios_libros(prestamos, usuarios)
+        
+        for correo in correos:
+            self.grafo.add_node(
+                self._get_node_id("usuario", correo),
+                tipo="usuario",
+                correo=correo,
+                nombre=usuarios[correo].nombre
+            )
+        
+        # Solo los usuarios con préstamos pueden tener similitud distinta de cero
+        activos = np.flatnonzero(libros_por_usuario)
+        tam_bloque = max(1, tam_bloque)
+        inicios = range(0, len(activos), tam_bloque)
+        
+        if num_procesos > 1 and len(inicios) > 1:
+            bloques, descriptor = _compartir_arrays({
+                'matriz': matriz,
+                'libros_por_usuario': libros_por_usuario,
+                'activos': activos
+            })
+            try:
+                with ProcessPoolExecutor(max_workers=num_procesos) as executor:
+                    resultados = list(executor.map(
+                        _pares_similares_bloque_compartido,
+                        [descriptor] * len(inicios),
+                        inicios,
+                        [tam_bloque] * len(inicios),
+                        [umbral] * len(inicios),
+                        [metrica] * len(inicios)
+                    ))
+            finally:
+                _liberar_bloques(bloques)
+        else:
+            resultados = [
+                _pares_similares_bloque(matriz, libros_por_usuario, activos, inicio, tam_bloque, umbral, metrica)
+                for inicio in inicios
+            ]
+        
+        for filas_a, filas_b, similitudes, comunes in resultados:
+            self.grafo.add_edges_from(
+                (
+                    self._get_node_id("usuario", correos[a]),
+                    self._get_node_id("usuario", correos[b]),
+                    {'peso': sim, 'tipo': "similitud", 'libros_en_comun': comun}
+                )
+                for a, b, sim, comun in zip(filas_a.tolist(), filas_b.tolist(),
+                                            similitudes.tolist(), comunes.tolist())
+            )
+        
+        self.logger_recomendaciones.info("Grafo de similitud de usuarios construido con %s nodos y %s aristas",
+                                         self.grafo.number_of_nodes(), self.grafo.number_of_edges())
+
+    def obtener_usuarios_similares(self, correo_usuario: str, biblioteca, top_n: int = 5) -> list:
+        """
+        Obtiene los usuarios más parecidos a uno dado según el grafo de similitud.
+        
+        Args:
+            correo_usuario (str): Correo del usuario
+            biblioteca: Instancia de la clase Biblioteca
+            top_n (int): Número máximo de usuarios a devolver
+            
+        Returns:
+            list: Lista de diccionarios con información de usuarios similares
+        """
+        node_id = self._get_node_id("usuario", correo_usuario)
+        if not self.grafo.has_node(node_id):
+            self.logger_recomendaciones.warning("Usuario %s no encontrado en el grafo.", correo_usuario)
+            return []
+        
+        # Las aristas de similitud se guardan en un solo sentido
+        vecinos = []
+        for _, otro, datos in self.grafo.out_edges(node_id, data=True):
+            vecinos.append((otro, datos))
+        for otro, _, datos in self.grafo.in_edges(node_id, data=True):
+            vecinos.append((otro, datos))
+        
+        similares = []
+        for otro, datos in sorted(vecinos, key=lambda x: x[1]['peso'], reverse=True)[:top_n]:
+            correo = self.grafo.nodes[otro]['correo']
+            usuario = biblioteca.usuarios.get(correo)
+            similares.append({
+                'correo': correo,
+                'nombre': usuario.nombre if usuario else self.grafo.nodes[otro].get('nombre'),
+                'similitud': datos['peso'],
+                'libros_en_comun': datos['libros_en_comun']
+            })
+        
+        return similares
 
     def obtener_libros_recomendados(self, correo_usuario: str, biblioteca, top_n: int = 5) -> list:
         """
@@ -511,14 +2845,14 @@ class GestorGrafoBiblioteca:
         Returns:
             list: Lista de diccionarios con información de libros recomendados
         """
-        if not self.grafo.number_of_nodes():
-            self.logger.warning("El grafo está vacío. No se pueden generar recomendaciones.")
+        if self.co_prestamos is None or not self.co_prestamos.numero_nodos():
+            self.logger_recomendaciones.warning("El grafo está vacío. No se pueden generar recomendaciones.")
             return []
         
         # Obtener libros prestados por el usuario
         usuario = biblioteca.usuarios.get(correo_usuario)
         if not usuario:
-            self.logger.warning(f"Usuario {correo_usuario} no encontrado.")
+            self.logger_recomendaciones.warning("Usuario %s no encontrado.", correo_usuario)
             return []
         
         libros_prestados = set()
@@ -527,28 +2861,25 @@ class GestorGrafoBiblioteca:
                 libros_prestados.add(prestamo.libro.isbn)
             
         if not libros_prestados:
-            self.logger.info(f"El usuario {correo_usuario} no tiene libros prestados actualmente.")
+            self.logger_recomendaciones.info("El usuario %s no tiene libros prestados actualmente.", correo_usuario)
             return []
         
-        # Calcular puntuación para cada libro no prestado
+        # Sumar los pesos de las aristas desde los libros prestados: solo se recorren
+        # sus vecinos en el almacén, no todo el catálogo
         puntuaciones = {}
-        for libro_isbn in biblioteca.libros:
-            if libro_isbn not in libros_prestados and biblioteca.libros[libro_isbn].disponible:
-                puntuacion = 0
-                node_id = self._get_node_id("libro", libro_isbn)
+        for libro_prestado in libros_prestados:
+            indice = self.co_prestamos.indice(self._get_node_id("libro", libro_prestado))
+            if indice is None:
+                continue
+            vecinos, pesos = self.co_prestamos.vecinos(indice)
+            for vecino, peso in zip(vecinos.tolist(), pesos.tolist()):
+                libro_isbn = self.co_prestamos.atributo(vecino, 'isbn')
+                libro = biblioteca.libros.get(libro_isbn)
+                if libro_isbn not in libros_prestados and libro is not None and libro.disponible:
+                    puntuaciones[libro_isbn] = puntuaciones.get(libro_isbn, 0) + peso
                 
-                # Sumar pesos de aristas con libros prestados por el usuario
-                for libro_prestado in libros_prestados:
-                    node_prestado = self._get_node_id("libro", libro_prestado)
-                    if self.grafo.has_edge(node_prestado, node_id):
-                        puntuacion += self.grafo[node_prestado][node_id]['peso']
-                    if self.grafo.has_edge(node_id, node_prestado):
-                        puntuacion += self.grafo[node_id][node_prestado]['peso']
-                    
-                if puntuacion > 0:
-                    puntuaciones[libro_isbn] = puntuacion
-                
-        # Ordenar libros por puntuación y devolver los top_n
+        # Ordenar libros por puntuación y devolver los top_n (con el decaimiento aplicado)
+        factor = self.factor_decaimiento()
         libros_recomendados = []
         for isbn, score in sorted(puntuaciones.items(), key=lambda x: x[1], reverse=True)[:top_n]:
             libro = biblioteca.libros[isbn]
@@ -556,7 +2887,364 @@ class GestorGrafoBiblioteca:
                 'isbn': isbn,
                 'titulo': libro.titulo,
                 'autor': libro.autor,
-                'score': score
+                'score': round(score * factor, 3)
             })
         
-        return libros_recomendados 
\ No newline at end of file
+        return libros_recomendados
+
+    def recomendar_para_todos(self, biblioteca, salida: str, correos: Optional[List[str]] = None,
+                              top_n: int = 5, tam_lote: int = 1024) -> Dict[str, Any]:
+        """
+        Calcula en lote las recomendaciones por co-préstamos de todos los usuarios.
+        
+        Usa el mismo criterio que obtener_libros_recomendados (suma de pesos desde los
+        libros con préstamo activo, excluyendo esos libros y los no disponibles), pero
+        procesa `tam_lote` usuarios a la vez con operaciones vectorizadas sobre el CSR
+        del almacén. Los resultados se escriben lote a lote en `salida`, de modo que la
+        memoria no crece con el número de usuarios:
+        
+        - ".jsonl": una línea {"correo", "recomendaciones"} por usuario con recomendaciones
+        - ".db", ".sqlite" o ".sqlite3": tabla `recomendaciones` (correo, posicion, isbn, score)
+        
+        Args:
+            biblioteca: Instancia de la clase Biblioteca
+            salida (str): Ruta del fichero de salida
+            correos (Optional[List[str]]): Usuarios a procesar (por defecto, todos)
+            top_n (int): Número máximo de recomendaciones por usuario
+            tam_lote (int): Usuarios por lote
+            
+        Returns:
+            Dict[str, Any]: Usuarios procesados, usuarios con recomendaciones, segundos
+            y usuarios por segundo
+        """
+        if self.co_prestamos is None or not self.co_prestamos.numero_nodos():
+            self.logger_recomendaciones.warning("El grafo está vacío. No se pueden generar recomendaciones.")
+            return {}
+        
+        try:
+            inicio = time.perf_counter()
+            almacen = self.co_prestamos
+            indptr, indices, pesos = almacen.csr()
+            num_nodos = almacen.numero_nodos()
+            isbns = [almacen.atributo(i, 'isbn') for i in range(num_nodos)]
+            candidatos = np.array([
+                isbn in biblioteca.libros and biblioteca.libros[isbn].disponible for isbn in isbns
+            ], dtype=bool)
+            factor = self.factor_decaimiento()
+            correos = list(biblioteca.usuarios) if correos is None else list(correos)
+            con_recomendaciones = 0
+            
+            with self._abrir_salida_recomendaciones(salida) as escribir:
+                for inicio_lote in range(0, len(correos), tam_lote):
+                    lote = correos[inicio_lote:inicio_lote + tam_lote]
+                    filas, semillas = [], []
+                    for fila, correo in enumerate(lote):
+                        usuario = biblioteca.usuarios.get(correo)
+                        if usuario is None:
+                            continue
+                        for prestamo in usuario.libros_prestados:
+                            if prestamo.estado == "Activo":
+                                indice = almacen.indice(self._get_node_id("libro", prestamo.libro.isbn))
+                                if indice is not None:
+                                    filas.append(fila)
+                                    semillas.append(indice)
+                    
+                    filas_top, libros_top, puntuaciones = self._puntuar_lote(
+                        np.array(filas, dtype=np.int64), np.array(semillas, dtype=np.int64), len(lote),
+                        indptr, indices, pesos, candidatos, top_n
+                    )
+                    recomendaciones = {}
+                    for fila, libro, puntuacion in zip(filas_top.tolist(), libros_top.tolist(),
+                                                       (puntuaciones * factor).tolist()):
+                        libro_obj = biblioteca.libros[isbns[libro]]
+                        recomendaciones.setdefault(lote[fila], []).append({
+                            'isbn': libro_obj.isbn,
+                            'titulo': libro_obj.titulo,
+                            'autor': libro_obj.autor,
+                            'score': round(puntuacion, 3)
+                        })
+                    escribir(lote, recomendaciones)
+                    con_recomendaciones += len(recomendaciones)
+            
+            segundos = time.perf_counter() - inicio
+            resumen = {
+                'usuarios': len(correos),
+                'con_recomendaciones': con_recomendaciones,
+                'segundos': segundos,
+                'usuarios_por_segundo': len(correos) / segundos if segundos > 0 else float('inf')
+            }
+            self.logger_recomendaciones.info(
+                "Recomendaciones en lote: %s usuarios (%s con recomendaciones) en %.2f s, %.0f usuarios/s",
+                resumen['usuarios'], con_recomendaciones, segundos, resumen['usuarios_por_segundo']
+            )
+            return resumen
+        except Exception as e:
+            self.logger_recomendaciones.error("Error al generar recomendaciones en lote: %s", e, exc_info=True)
+            return {}
+
+    @staticmethod
+    def _puntuar_lote(filas: np.ndarray, semillas: np.ndarray, num_filas: int, indptr: np.ndarray,
+                      indices: np.ndarray, pesos: np.ndarray, candidatos: np.ndarray, top_n: int):
+        """
+        Puntúa los vecinos de las semillas de cada fila y se queda con los top_n por fila.
+        
+        Si la matriz filas x nodos no es mucho mayor que el número de vecinos recorridos,
+        las puntuaciones se acumulan en ella (sin ordenar); si no, se agregan por código
+        (fila, libro) para no reservar memoria proporcional al catálogo.
+        
+        Returns:
+            tuple: (filas, libros, puntuaciones) ordenados por fila y puntuación descendente
+        """
+        num_nodos = len(candidatos)
+        codigos_semillas = np.unique(filas * num_nodos + semillas)
+        filas, semillas = codigos_semillas // num_nodos, codigos_semillas % num_nodos
+        longitudes, posiciones = _posiciones_vecinos(indptr, semillas)
+        vecinos = indices[posiciones]
+        codigos = np.repeat(filas, longitudes) * num_nodos + vecinos
+        
+        if num_filas * num_nodos <= 4 * len(codigos):
+            puntuaciones = np.bincount(codigos, weights=pesos[posiciones], minlength=num_filas * num_nodos)
+            puntuaciones[codigos_semillas] = 0.0
+            puntuaciones = puntuaciones.reshape(num_filas, num_nodos)
+            puntuaciones[:, ~candidatos] = 0.0
+            k = min(top_n, num_nodos)
+            mejores = np.argpartition(-puntuaciones, k - 1, axis=1)[:, :k]
+            valores = np.take_along_axis(puntuaciones, mejores, axis=1)
+            orden = np.argsort(-valores, axis=1, kind='stable')
+            libros = np.take_along_axis(mejores, orden, axis=1).ravel()
+            puntuaciones = np.take_along_axis(valores, orden, axis=1).ravel()
+            filas = np.repeat(np.arange(num_filas), k)
+            mascara = puntuaciones > 0
+            return filas[mascara], libros[mascara], puntuaciones[mascara]
+        
+        mascara = candidatos[vecinos] & ~np.isin(codigos, codigos_semillas)
+        codigos, inverso = np.unique(codigos[mascara], return_inverse=True)
+        puntuaciones = np.bincount(inverso, weights=pesos[posiciones][mascara], minlength=len(codigos))
+        filas, libros = codigos // num_nodos, codigos % num_nodos
+        orden = np.lexsort((-puntuaciones, filas))
+        filas, libros, puntuaciones = filas[orden], libros[orden], puntuaciones[orden]
+        # Posición de cada candidato dentro de su fila
+        rango = np.arange(len(filas)) - np.searchsorted(filas, filas)
+        mascara = rango < top_n
+        return filas[mascara], libros[mascara], puntuaciones[mascara]
+
+    @contextmanager
+    def _abrir_salida_recomendaciones(self, salida: str):
+        """Abre la salida de recomendaciones en lote y entrega una función que escribe un lote."""
+        extension = os.path.splitext(salida)[1].lower()
+        if extension == '.jsonl':
+            with open(salida, 'w', encoding='utf-8') as fichero:
+                def escribir(lote, recomendaciones):
+                    for correo in lote:
+                        if correo in recomendaciones:
+                            fichero.write(json.dumps({'correo': correo, 'recomendaciones': recomendaciones[correo]},
+                                                     ensure_ascii=False) + '\n')
+                yield escribir
+        elif extension in ('.db', '.sqlite', '.sqlite3'):
+            conn = sqlite3.connect(salida)
+            try:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS recomendaciones (
+                        correo TEXT NOT NULL,
+                        posicion INTEGER NOT NULL,
+                        isbn TEXT NOT NULL,
+                        score REAL NOT NULL,
+                        fecha TEXT NOT NULL,
+                        PRIMARY KEY (correo, posicion)
+                    )
+                ''')
+                fecha = datetime.now().isoformat()
+                
+                def escribir(lote, recomendaciones):
+                    # Las recomendaciones anteriores de los usuarios del lote se sustituyen
+                    conn.executemany('DELETE FROM recomendaciones WHERE correo = ?', ((c,) for c in lote))
+                    conn.executemany(
+                        'INSERT INTO recomendaciones (correo, posicion, isbn, score, fecha) VALUES (?, ?, ?, ?, ?)',
+                        ((correo, posicion, rec['isbn'], rec['score'], fecha)
+                         for correo, lista in recomendaciones.items()
+                         for posicion, rec in enumerate(lista, 1))
+                    )
+                    conn.commit()
+                yield escribir
+            finally:
+                conn.close()
+        else:
+            raise ValueError(f"Formato de salida no soportado: {salida}")
+
+    def construir_matriz_transicion(self, prestamos) -> None:
+        """
+        Precalcula la matriz de transición del grafo bipartito usuario–libro.
+        
+        La matriz se guarda en formato CSR con arrays de NumPy (indptr, indices) junto
+        con el grado de cada nodo. Los usuarios ocupan los índices [0, U) y los libros
+        [U, U + L). Se usa todo el historial de préstamos.
+        
+        Args:
+            prestamos (dict): Diccionario de préstamos
+        """
+        indice_usuario = {}
+        indice_libro = {}
+        libros = {}
+        pares = set()
+        for prestamo in prestamos.values():
+            u = indice_usuario.setdefault(prestamo.usuario.correoU, len(indice_usuario))
+            b = indice_libro.setdefault(prestamo.libro.isbn, len(indice_libro))
+            libros[prestamo.libro.isbn] = prestamo.libro
+            pares.add((u, b))
+        
+        num_usuarios = len(indice_usuario)
+        num_nodos = num_usuarios + len(indice_libro)
+        if pares:
+            usuarios_arr, libros_arr = np.array(sorted(pares), dtype=np.int64).T
+        else:
+            usuarios_arr = libros_arr = np.empty(0, dtype=np.int64)
+        libros_arr = libros_arr + num_usuarios
+        
+        # Aristas en ambos sentidos, ordenadas por nodo origen
+        filas = np.concatenate([usuarios_arr, libros_arr])
+        columnas = np.concatenate([libros_arr, usuarios_arr])
+        orden = np.argsort(filas, kind='stable')
+        grado = np.bincount(filas, minlength=num_nodos)
+        indptr = np.zeros(num_nodos + 1, dtype=np.int64)
+        np.cumsum(grado, out=indptr[1:])
+        
+        inverso_grado = np.zeros(num_nodos, dtype=np.float32)
+        np.divide(1.0, grado, out=inverso_grado, where=grado > 0)
+        
+        self._transicion = {
+            'indptr': indptr,
+            'indices': columnas[orden],
+            'grado': grado,
+            'inverso_grado': inverso_grado,
+            'indice_usuario': indice_usuario,
+            'isbns': list(indice_libro.keys()),
+            'libros': libros
+        }
+        self.logger_recomendaciones.info("Matriz de transición construida con %s nodos y %s aristas", num_nodos, len(pares))
+
+    def _propagar(self, x: np.ndarray) -> np.ndarray:
+        """
+        Aplica un paso de la caminata aleatoria a un lote de vectores de probabilidad.
+        
+        Es el producto de la matriz de transición CSR por el bloque entero de vectores:
+        cada nodo suma la probabilidad de sus vecinos escalada por su grado. Con cada
+        vector en una fila contigua, la suma por vecinos de un trozo de vectores es un
+        solo reduceat sobre el temporal (vectores × aristas) aplanado; los trozos tienen
+        como mucho `_ELEMENTOS_POR_PRODUCTO` elementos para acotar la memoria.
+        
+        Args:
+            x (np.ndarray): Matriz (lote × nodos) con la probabilidad en cada nodo
+            
+        Returns:
+            np.ndarray: Probabilidades tras un paso, con la misma forma que `x`
+        """
+        t = self._transicion
+        resultado = np.zeros_like(x)
+        con_vecinos = np.flatnonzero(t['grado'])
+        if len(con_vecinos) and len(x):
+            num_aristas = len(t['indices'])
+            # El primer nodo con vecinos empieza en 0: desplazando los inicios de cada
+            # vector en num_aristas, sus tramos no se mezclan con los del anterior
+            inicios = t['indptr'][con_vecinos]
+            escalado = x * t['inverso_grado']
+            alto = max(1, _ELEMENTOS_POR_PRODUCTO // num_aristas)
+            for inicio in range(0, len(x), alto):
+                trozo = escalado[inicio:inicio + alto]
+                desplazados = (inicios + num_aristas * np.arange(len(trozo))[:, None]).ravel()
+                sumas = np.add.reduceat(np.take(trozo, t['indices'], axis=1).ravel(), desplazados)
+                resultado[inicio:inicio + alto, con_vecinos] = sumas.reshape(len(trozo), -1)
+        return resultado
+
+    def recomendar_pagerank(self, correos: List[str], top_n: int = 5, alfa: float = 0.15,
+                            tolerancia: float = 1e-4, max_iteraciones: int = 30,
+                            tam_lote: int = 256) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Recomienda libros con PageRank personalizado sobre el grafo usuario–libro.
+        
+        La caminata reinicia con probabilidad `alfa` en los libros del usuario, de modo
+        que se alcanzan libros a varios saltos de distancia aunque no compartan un
+        co-préstamo directo. Los usuarios se puntúan por lotes: cada iteración multiplica
+        la matriz de transición por el bloque de vectores de los usuarios que aún no han
+        convergido; cada usuario deja de iterar cuando su cambio L1 baja de `tolerancia`.
+        
+        Args:
+            correos (List[str]): Correos de los usuarios a puntuar
+            top_n (int): Número máximo de recomendaciones por usuario
+            alfa (float): Probabilidad de reinicio
+            tolerancia (float): Cambio L1 máximo por usuario para considerar convergencia
+            max_iteraciones (int): Número máximo de iteraciones por lote
+            tam_lote (int): Usuarios puntuados en cada pasada
+            
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Recomendaciones por correo
+        """
+        if self._transicion is None:
+            self.logger_recomendaciones.warning(
+                "La matriz de transición no está construida. No se pueden generar recomendaciones."
+            )
+            return {}
+        
+        t = self._transicion
+        num_usuarios = len(t['indice_usuario'])
+        num_nodos = len(t['grado'])
+        recomendaciones = {correo: [] for correo in correos}
+        conocidos = [c for c in correos if c in t['indice_usuario']]
+        
+        for inicio in range(0, len(conocidos), max(1, tam_lote)):
+            lote = conocidos[inicio:inicio + tam_lote]
+            
+            # Vector de reinicio en formato disperso (libro, columna, probabilidad):
+            # distribución uniforme sobre los libros de cada usuario
+            filas = []
+            for correo in lote:
+                u = t['indice_usuario'][correo]
+                filas.append(t['indices'][t['indptr'][u]:t['indptr'][u + 1]])
+            longitudes = np.array([len(vecinos) for vecinos in filas])
+            filas = np.concatenate(filas)
+            columnas = np.repeat(np.arange(len(lote)), longitudes)
+            reinicio = np.repeat(1.0 / longitudes, longitudes).astype(np.float32)
+            
+            # Una fila por usuario del lote: x[k] es su vector de probabilidades
+            x = np.zeros((len(lote), num_nodos), dtype=np.float32)
+            x[columnas, filas] = reinicio
+            activas = np.arange(len(lote))
+            iteraciones = 0
+            for iteraciones in range(1, max_iteraciones + 1):
+                todas = len(activas) == len(lote)
+                actual = x if todas else x[activas]
+                nuevo = (1 - alfa) * self._propagar(actual)
+                # Reinicio de los usuarios activos, en su fila dentro de `nuevo`
+                posicion = np.full(len(lote), -1)
+                posicion[activas] = np.arange(len(activas))
+                en_activas = posicion[columnas] >= 0
+                nuevo[posicion[columnas[en_activas]], filas[en_activas]] += alfa * reinicio[en_activas]
+                cambio = np.abs(nuevo - actual).sum(axis=1)
+                if todas:
+                    x = nuevo
+                else:
+                    x[activas] = nuevo
+                activas = activas[cambio >= tolerancia]
+                if not len(activas):
+                    break
+            self.logger_recomendaciones.debug("Lote de %s usuarios convergió en %s iteraciones", len(lote), iteraciones)
+            
+            # Excluir los libros que el usuario ya conoce
+            x[columnas, filas] = 0.0
+            puntuaciones = x[:, num_usuarios:]
+            
+            for k, correo in enumerate(lote):
+                puntuacion = puntuaciones[k]
+                candidatos = np.flatnonzero(puntuacion)
+                if len(candidatos) > top_n:
+                    candidatos = candidatos[np.argpartition(-puntuacion[candidatos], top_n)[:top_n]]
+                candidatos = candidatos[np.argsort(-puntuacion[candidatos], kind='stable')]
+                for b in candidatos:
+                    libro = t['libros'][t['isbns'][b]]
+                    recomendaciones[correo].append({
+                        'isbn': libro.isbn,
+                        'titulo': libro.titulo,
+                        'autor': libro.autor,
+                        'score': float(puntuacion[b])
+                    })
+        
+        return recomendaciones
@@ -1,17 +1,31 @@
+import sqlite3
+
 from controllers.Biblioteca import Biblioteca
 from models.Libro import Libro
 from models.Usuario import Usuario
 from models.Prestamo import Prestamo
 from models.Autor import Autor
 from models.Genero import Genero
+from database.repositorio import RepositorioBiblioteca
+from database.busqueda import BuscadorLibros
 
 def main():
     """
     Función principal que inicia el sistema de biblioteca.
     """
     print("🏛️ Iniciando Sistema de Biblioteca Virtual")
-    biblioteca = Biblioteca()
-    biblioteca.mostrar_menu()
+    # Los datos se cargan de la base de datos y cada cambio se guarda en segundo plano
+    repositorio = RepositorioBiblioteca()
+    try:
+        buscador = BuscadorLibros()
+    except sqlite3.Error:
+        # Sin FTS5 en esta compilación de SQLite se busca en los árboles en memoria
+        buscador = None
+    biblioteca = Biblioteca.desde_base_de_datos(repositorio=repositorio, buscador=buscador)
+    try:
+        biblioteca.mostrar_menu()
+    finally:
+        repositorio.cerrar()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
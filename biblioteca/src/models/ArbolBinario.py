@@ -68,6 +68,36 @@ class ArbolBinario:
             
         return nodo
     
+    def construir_desde_ordenados(self, pares):
+        """
+        Reemplaza el contenido por un árbol equilibrado construido en O(n).
+        
+        `pares` es una secuencia de (clave, valor) ordenada por clave; si una clave se
+        repite se conserva el último valor, igual que al insertarla varias veces.
+        """
+        claves = []
+        valores = []
+        for clave, valor in pares:
+            if not clave:
+                raise ValueError("La clave no puede ser nula o vacía")
+            if claves and claves[-1] == clave:
+                valores[-1] = valor
+            else:
+                claves.append(clave)
+                valores.append(valor)
+        self.raiz = self._construir_equilibrado(claves, valores, 0, len(claves))
+        self.cantidad = len(claves)
+    
+    def _construir_equilibrado(self, claves, valores, inicio, fin):
+        if inicio >= fin:
+            return None
+        medio = (inicio + fin) // 2
+        nodo = NodoArbol(claves[medio], valores[medio])
+        nodo.izquierda = self._construir_equilibrado(claves, valores, inicio, medio)
+        nodo.derecha = self._construir_equilibrado(claves, valores, medio + 1, fin)
+        nodo.altura = 1 + max(self._obtener_altura(nodo.izquierda), self._obtener_altura(nodo.derecha))
+        return nodo
+    
     def buscar(self, clave):
         """Busca un valor por su clave en el árbol."""
         return self._buscar_recursivo(self.raiz, clave)
@@ -106,8 +136,9 @@ class ArbolBinario:
         if prefijo < nodo.clave:
             self._buscar_prefijo_recursivo(nodo.izquierda, prefijo, resultados)
             
-        # También buscar en el subarbol derecho si puede contener claves con el prefijo
-        if prefijo <= nodo.clave:
+        # Las claves con el prefijo son mayores o iguales que él: el subárbol derecho puede
+        # tenerlas si la clave del nodo es menor que el prefijo o ya empieza por él
+        if nodo.clave < prefijo or str(nodo.clave).startswith(prefijo):
             self._buscar_prefijo_recursivo(nodo.derecha, prefijo, resultados)
     
     def eliminar(self, clave):
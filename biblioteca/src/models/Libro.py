@@ -26,6 +26,18 @@ class Libro:
         self.titulo_normalizado = None  
         self.autor_normalizado = None   
 
+    @classmethod
+    def desde_bd(cls, titulo, autor, isbn, disponible=True):
+        """Crea un libro a partir de una fila ya validada al guardarse, sin repetir la validación."""
+        libro = cls.__new__(cls)
+        libro.titulo = titulo
+        libro.autor = autor
+        libro.isbn = isbn
+        libro.disponible = disponible
+        libro.titulo_normalizado = None
+        libro.autor_normalizado = None
+        return libro
+
     def __str__(self):
         estado = "Sí" if self.disponible else "No"
         return f"Título: {self.titulo}, Autor: {self.autor}, ISBN: {self.isbn}, Disponible: {estado}"
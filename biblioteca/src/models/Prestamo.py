@@ -14,6 +14,18 @@ class Prestamo:
         self.estado = "Activo" if not fecha_devolucion else "Devuelto"
         self.id = None  # Se establecerá en la clase Biblioteca
 
+    @classmethod
+    def desde_bd(cls, id_prestamo, usuario, libro, fecha_prestamo, fecha_devolucion, devuelto):
+        """Crea un préstamo a partir de una fila guardada; el estado lo indica `devuelto`."""
+        prestamo = cls.__new__(cls)
+        prestamo.usuario = usuario
+        prestamo.libro = libro
+        prestamo.fecha_prestamo = fecha_prestamo
+        prestamo.fecha_devolucion = fecha_devolucion
+        prestamo.estado = "Devuelto" if devuelto else "Activo"
+        prestamo.id = id_prestamo
+        return prestamo
+
     def __str__(self):
         fecha_dev = self.fecha_devolucion.strftime("%Y-%m-%d %H:%M:%S") if self.fecha_devolucion else "No devuelto"
         return (f"Usuario: {self.usuario.nombre}, Libro: {self.libro.titulo}, "
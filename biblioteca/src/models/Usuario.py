@@ -15,6 +15,17 @@ class Usuario:
         self.libros_prestados = libros_prestados if libros_prestados is not None else []
         self.nombre_normalizado = None  # Se establecerá en la clase Biblioteca
 
+    @classmethod
+    def desde_bd(cls, nombre, numeroTelefono, correoU):
+        """Crea un usuario a partir de una fila ya validada al guardarse, sin repetir la validación."""
+        usuario = cls.__new__(cls)
+        usuario.nombre = nombre
+        usuario.numeroTelefono = numeroTelefono
+        usuario.correoU = correoU
+        usuario.libros_prestados = []
+        usuario.nombre_normalizado = None
+        return usuario
+
     def __str__(self):
         return (f"Nombre: {self.nombre}, Correo: {self.correoU}, Teléfono: {self.numeroTelefono}, "
                 f"Libros prestados: {len(self.libros_prestados)}")
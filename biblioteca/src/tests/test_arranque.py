@@ -0,0 +1,70 @@
+import unittest
+import os
+import sys
+import subprocess
+import tempfile
+
+DIRECTORIO_SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Presupuesto de importación de controllers.Biblioteca (microsegundos, según -X importtime)
+PRESUPUESTO_IMPORTACION_US = 500_000
+
+class TestArranque(unittest.TestCase):
+    def _ejecutar(self, codigo):
+        """
+        Ejecuta código en un intérprete nuevo con src en el path y devuelve (stdout, stderr).
+        
+        Se ejecuta en un directorio temporal para no dejar bases de datos ni logs.
+        """
+        entorno = dict(os.environ, PYTHONPATH=DIRECTORIO_SRC)
+        with tempfile.TemporaryDirectory() as directorio:
+            resultado = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", codigo],
+                cwd=directorio, env=entorno, capture_output=True, text=True, check=True
+            )
+        return resultado.stdout, resultado.stderr
+
+    def test_biblioteca_no_importa_grafos(self):
+        """Crear la biblioteca no debe importar networkx, matplotlib ni el gestor de grafos."""
+        salida, _ = self._ejecutar(
+            "import sys\n"
+            "from controllers.Biblioteca import Biblioteca\n"
+            "biblioteca = Biblioteca()\n"
+            "print(sorted(m for m in ('networkx', 'matplotlib', 'gestor_grafo_mejorado') if m in sys.modules))"
+        )
+        self.assertEqual(salida.strip(), "[]")
+
+    def test_presupuesto_importacion(self):
+        """La importación de controllers.Biblioteca debe caber en el presupuesto de arranque."""
+        _, trazas = self._ejecutar("from controllers.Biblioteca import Biblioteca")
+        acumulado = None
+        for linea in trazas.splitlines():
+            # Formato: "import time: propio | acumulado | módulo"
+            partes = [parte.strip() for parte in linea.split("|")]
+            if len(partes) == 3 and partes[2] == "controllers.Biblioteca":
+                acumulado = int(partes[1])
+        self.assertIsNotNone(acumulado)
+        self.assertLess(acumulado, PRESUPUESTO_IMPORTACION_US)
+
+    def test_gestor_no_importa_matplotlib(self):
+        """El gestor de grafos solo importa matplotlib al dibujar."""
+        salida, _ = self._ejecutar(
+            "import sys\n"
+            "from gestor_grafo_mejorado import GestorGrafoBiblioteca\n"
+            "gestor = GestorGrafoBiblioteca()\n"
+            "gestor.agregar_libro('L1', 'Libro 1', 'Autor 1')\n"
+            "print('matplotlib' in sys.modules)"
+        )
+        self.assertEqual(salida.strip(), "False")
+
+    def test_gestor_no_importa_numpy(self):
+        """Importar el gestor de grafos no debe importar NumPy."""
+        salida, _ = self._ejecutar(
+            "import sys\n"
+            "import gestor_grafo_mejorado\n"
+            "print('numpy' in sys.modules)"
+        )
+        self.assertEqual(salida.strip(), "False")
+
+if __name__ == '__main__':
+    unittest.main()
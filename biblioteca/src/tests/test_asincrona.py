@@ -0,0 +1,97 @@
+import unittest
+import os
+import sys
+import sqlite3
+import asyncio
+import tempfile
+import threading
+import contextlib
+import io
+
+# Añadir el directorio src al path de Python de forma segura
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database.database import Database
+from database.asincrona import DatabaseAsincrona
+
+
+class TestDatabaseAsincrona(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        """Crea una base de datos temporal con la fachada asíncrona abierta."""
+        self.directorio = tempfile.TemporaryDirectory()
+        self.db = DatabaseAsincrona(os.path.join(self.directorio.name, "biblioteca.db"), lectores=3)
+
+    async def asyncTearDown(self):
+        await self.db.cerrar()
+        Database(self.db.db_path).close()
+        Database._instancias.pop(self.db.db_path, None)
+        self.directorio.cleanup()
+
+    async def test_escrituras_agrupadas(self):
+        """Las escrituras concurrentes se confirman en pocos lotes y un error solo afecta a la suya."""
+        sql = "INSERT INTO libros (titulo, autor, isbn) VALUES (?, ?, ?)"
+        peticiones = [self.db.ejecutar(sql, (f"Libro {i}", "Autor", f"ISBN{i}")) for i in range(200)]
+        peticiones.append(self.db.ejecutar(sql, ("Repetido", "Autor", "ISBN0")))
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultados = await asyncio.gather(*peticiones, return_exceptions=True)
+        self.assertEqual(resultados[:200], [1] * 200)
+        self.assertIsInstance(resultados[200], sqlite3.IntegrityError)
+
+        filas = await self.db.consultar("SELECT COUNT(*) FROM libros")
+        self.assertEqual(filas[0][0], 200)
+        estadisticas = self.db.estadisticas()
+        self.assertEqual(estadisticas['operaciones_escritas'], 200)
+        self.assertLess(estadisticas['lotes_escritos'], 200)
+
+    async def test_escritura_atomica_y_lecturas_en_paralelo(self):
+        """escribir() agrupa varias sentencias y las lecturas usan varios hilos a la vez."""
+        def prestar(db, isbn):
+            db.ejecutar("INSERT INTO libros (titulo, autor, isbn) VALUES ('Niebla', 'Unamuno', ?)", (isbn,))
+            db.ejecutar("INSERT INTO prestamos (codigo, libro_id) "
+                        "VALUES ('P-1', (SELECT id FROM libros WHERE isbn = ?))", (isbn,))
+            db.ejecutar("UPDATE libros SET disponible = 0 WHERE isbn = ?", (isbn,))
+            return "P-1"
+
+        self.assertEqual(await self.db.escribir(prestar, Database(self.db.db_path), "111"), "P-1")
+        self.assertEqual(await self.db.ejecutar_lote("INSERT INTO usuarios (nombre, email) VALUES (?, ?)",
+                                                     [("Ana", "ana@test.com"), ("Luis", "luis@test.com")]), 2)
+
+        dentro = threading.Barrier(3, timeout=5)
+
+        def leer_a_la_vez():
+            # Solo pasa la barrera si los tres lectores están ejecutándose a la vez
+            dentro.wait()
+            return Database(self.db.db_path).consultar("SELECT disponible FROM libros WHERE isbn = '111'")[0][0]
+
+        resultados = await asyncio.gather(*(self.db.leer(leer_a_la_vez) for _ in range(3)))
+        self.assertEqual(resultados, [0, 0, 0])
+
+    async def test_database_ya_abierta(self):
+        """La fachada comparte la Database que otros módulos abrieron antes, con su pool o uno mayor."""
+        await self.db.cerrar()
+        Database(self.db.db_path).close()
+        Database._instancias.pop(self.db.db_path)
+        # Como al arrancar la aplicación: el repositorio abre antes la Database con el pool por defecto
+        compartida = Database(self.db.db_path)
+        self.assertEqual(compartida.max_conexiones, 8)
+        async with DatabaseAsincrona(self.db.db_path, lectores=4) as db:
+            self.assertEqual(await db.ejecutar("INSERT INTO usuarios (nombre, email) VALUES ('Ana', 'ana@test.com')"), 1)
+        self.assertEqual(compartida.max_conexiones, 8)
+        async with DatabaseAsincrona(self.db.db_path, lectores=12) as db:
+            self.assertEqual((await db.consultar("SELECT COUNT(*) FROM usuarios"))[0][0], 1)
+        self.assertEqual(compartida.max_conexiones, 13)
+
+    async def test_cerrar(self):
+        """cerrar() espera a lo encolado y después no se aceptan operaciones."""
+        pendiente = asyncio.ensure_future(
+            self.db.ejecutar("INSERT INTO usuarios (nombre, email) VALUES ('Ana', 'ana@test.com')")
+        )
+        await asyncio.sleep(0)
+        await self.db.cerrar()
+        self.assertEqual(await pendiente, 1)
+        with self.assertRaises(RuntimeError):
+            await self.db.consultar("SELECT 1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import os
+import sys
+import tempfile
+import contextlib
+import io
+
+# Añadir el directorio src al path de Python de forma segura
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from controllers.Biblioteca import Biblioteca
+from database.database import Database
+from database.busqueda import BuscadorLibros
+from database.repositorio import RepositorioBiblioteca
+
+LIBROS = [
+    ("Cien años de soledad", "Gabriel García Márquez", "Realismo mágico", "111"),
+    ("El amor en los tiempos del cólera", "Gabriel García Márquez", "Novela", "222"),
+    ("Don Quijote de la Mancha", "Miguel de Cervantes", "Novela", "333"),
+    ("Soledad", "Anónimo", "Poesía", "444"),
+]
+
+
+class TestBuscadorLibros(unittest.TestCase):
+    def setUp(self):
+        """Crea una base de datos temporal con algunos libros ya guardados."""
+        self.directorio = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directorio.name, "biblioteca.db")
+        self.db = Database(self.db_path)
+        self.db.create_tables()
+        self.db.ejecutar_lote("INSERT INTO libros (titulo, autor, genero, isbn) VALUES (?, ?, ?, ?)", LIBROS)
+        self.buscador = BuscadorLibros(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        Database._instancias.pop(self.db.db_path, None)
+        self.directorio.cleanup()
+
+    def _isbns(self, filas):
+        return [fila["isbn"] for fila in filas]
+
+    def test_prefijo_sin_tildes(self):
+        """Los libros previos al índice se encuentran por prefijo sin importar tildes ni mayúsculas."""
+        self.assertEqual(self._isbns(self.buscador.buscar_prefijo("QUIJ")), ["333"])
+        self.assertEqual(sorted(self._isbns(self.buscador.buscar_prefijo("garcia marq"))), ["111", "222"])
+        self.assertEqual(self._isbns(self.buscador.buscar_prefijo("colera")), ["222"])
+        self.assertEqual(self.buscador.buscar_prefijo("  ¿? "), [])
+
+    def test_frase_campo_y_relevancia(self):
+        """Las frases respetan el orden, el campo limita la búsqueda y el título pesa más."""
+        self.assertEqual(self._isbns(self.buscador.buscar_frase("años de soledad")), ["111"])
+        self.assertEqual(self.buscador.buscar_frase("soledad de años"), [])
+        self.assertEqual(sorted(self._isbns(self.buscador.buscar("novela", campo="genero", modo="palabras"))),
+                         ["222", "333"])
+        self.assertEqual(self.buscador.buscar("novela", campo="titulo"), [])
+        # "Soledad" a secas es más relevante que la coincidencia en un título más largo
+        self.assertEqual(self._isbns(self.buscador.buscar("soledad", modo="palabras")), ["444", "111"])
+        # Las comillas y operadores del usuario no rompen la expresión FTS5
+        self.assertEqual(self._isbns(self.buscador.buscar_prefijo('quijote" OR NEAR(')), [])
+        with self.assertRaises(ValueError):
+            self.buscador.buscar("soledad", modo="difusa")
+
+    def test_disparadores(self):
+        """Altas, cambios y bajas en libros se reflejan en el índice."""
+        self.db.execute_query("INSERT INTO libros (titulo, autor, isbn) VALUES ('Niebla', 'Unamuno', '555')")
+        self.db.execute_query("UPDATE libros SET titulo = 'La tía Tula' WHERE isbn = '555'")
+        self.db.execute_query("UPDATE libros SET disponible = 0 WHERE isbn = '333'")
+        self.db.execute_query("DELETE FROM libros WHERE isbn = '444'")
+        self.assertEqual(self.buscador.buscar_prefijo("niebla"), [])
+        self.assertEqual(self._isbns(self.buscador.buscar_prefijo("tia tula")), ["555"])
+        self.assertEqual(self._isbns(self.buscador.buscar_prefijo("soledad")), ["111"])
+        self.assertEqual(self.buscador.buscar_prefijo("quijote")[0]["disponible"], 0)
+        # El índice sigue siendo coherente con la tabla tras los cambios
+        self.db.execute_query("INSERT INTO libros_fts (libros_fts) VALUES ('integrity-check')")
+
+    def test_biblioteca_delega_en_buscador(self):
+        """buscar_libro usa el índice con repositorio y buscador asociados."""
+        repositorio = RepositorioBiblioteca(self.db_path, intervalo=60)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                biblioteca = Biblioteca.desde_base_de_datos(self.db_path, repositorio, buscador=self.buscador)
+                biblioteca.agregar_libro("Rayuela", "Julio Cortázar", "666")
+            self.assertEqual([libro.isbn for libro in biblioteca.buscar_libro("autor", "cortazar")], ["666"])
+            encontrados = biblioteca.buscar_libro("texto", "gabriel soledad")
+            self.assertEqual([libro.isbn for libro in encontrados], ["111"])
+            self.assertIs(encontrados[0], biblioteca.libros["111"])
+        finally:
+            repositorio.cerrar()
+
+        # Sin buscador, los títulos se buscan por prefijo en el árbol en memoria
+        biblioteca.buscador = None
+        self.assertEqual([libro.isbn for libro in biblioteca.buscar_libro("titulo", "cien")], ["111"])
+        self.assertEqual(biblioteca.buscar_libro("titulo", "soledad")[0].isbn, "444")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,333 @@
+import unittest
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+import contextlib
+import io
+
+# Añadir el directorio src al path de Python de forma segura
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database.database import (Database, MetricasConsultas, PoolConexiones, OTRAS_SENTENCIAS, VERSION_ESQUEMA,
+                               crear_esquema)
+from database.informes import exportar_historial_prestamos
+
+
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        """Crea una base de datos temporal con las tablas de la aplicación."""
+        self.directorio = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directorio.name, "biblioteca.db")
+        self.db = Database(self.db_path)
+        self.db.create_tables()
+
+    def tearDown(self):
+        self.db.close()
+        Database._instancias.pop(self.db.db_path, None)
+        self.directorio.cleanup()
+
+    def test_instancia_por_fichero(self):
+        """Database(ruta) devuelve siempre la misma instancia para el mismo fichero."""
+        self.assertIs(Database(self.db_path), self.db)
+        otra = Database(os.path.join(self.directorio.name, "otra.db"))
+        self.assertIsNot(otra, self.db)
+        otra.close()
+        Database._instancias.pop(otra.db_path)
+
+    def test_configuracion_en_conflicto(self):
+        """Un pool mayor amplía el abierto, uno menor u otro perfil se ignoran; tras close() se reconfigura."""
+        self.assertIs(Database(self.db_path, max_conexiones=8, perfil="equilibrado"), self.db)
+        self.assertIs(Database(self.db_path, max_conexiones=2), self.db)
+        self.assertEqual(self.db._pool.max_conexiones, 8)
+        with self.assertLogs('database.database', level='WARNING'):
+            self.assertIs(Database(self.db_path, perfil="rapido"), self.db)
+        self.assertEqual(self.db.perfil, "equilibrado")
+
+        # Las conexiones de más quedan disponibles a la vez
+        self.assertIs(Database(self.db_path, max_conexiones=10), self.db)
+        self.assertEqual(self.db.max_conexiones, 10)
+        reservadas = threading.Barrier(10, timeout=5)
+
+        def reservar():
+            with self.db.conexion():
+                reservadas.wait()
+
+        hilos = [threading.Thread(target=reservar) for _ in range(10)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertFalse(reservadas.broken)
+
+        self.db.close()
+        self.assertIs(Database(self.db_path, max_conexiones=2, perfil="rapido"), self.db)
+        self.assertEqual(self.db.consultar("PRAGMA synchronous")[0][0], 0)
+        self.assertEqual((self.db.max_conexiones, self.db.perfil), (2, "rapido"))
+
+    def test_conexion_por_hilo(self):
+        """Las reservas anidadas comparten conexión y cada hilo recibe la suya."""
+        pool = PoolConexiones(self.db_path, max_conexiones=2, timeout=0.2)
+        conexiones = {}
+        dentro = threading.Barrier(3)
+
+        def trabajar(nombre):
+            with pool.conexion() as conexion:
+                with pool.conexion() as anidada:
+                    self.assertIs(anidada, conexion)
+                conexiones[nombre] = conexion
+                dentro.wait()
+                dentro.wait()
+
+        hilos = [threading.Thread(target=trabajar, args=(n,)) for n in ("a", "b")]
+        for hilo in hilos:
+            hilo.start()
+        dentro.wait()
+        # Con las dos conexiones reservadas, un tercer hilo agota la espera
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.adquirir()
+        dentro.wait()
+        for hilo in hilos:
+            hilo.join()
+        self.assertIsNot(conexiones["a"], conexiones["b"])
+        self.assertEqual(pool.estadisticas(), {'abiertas': 2, 'libres': 2, 'maximo': 2})
+
+        # Una conexión libre que ha dejado de funcionar se reemplaza al reservarla
+        pool.intervalo_comprobacion = 0
+        for conexion in list(conexiones.values()):
+            conexion.close()
+        with pool.conexion() as conexion:
+            self.assertEqual(conexion.execute("SELECT 1").fetchone()[0], 1)
+        self.assertNotIn(conexion, conexiones.values())
+        pool.cerrar()
+
+    def test_reservas_sin_liberar(self):
+        """Las conexiones de hilos terminados y de generadores cerrados en otro hilo vuelven al pool."""
+        pool = PoolConexiones(self.db_path, max_conexiones=2, timeout=0.5)
+        # Hilos de corta vida que reservan con adquirir() y terminan sin liberar
+        for _ in range(5):
+            hilo = threading.Thread(target=pool.adquirir)
+            hilo.start()
+            hilo.join()
+        with pool.conexion():
+            pass
+        self.assertEqual(pool.estadisticas()['libres'], pool.estadisticas()['abiertas'])
+        pool.cerrar()
+
+        self.db.ejecutar_lote("INSERT INTO usuarios (nombre, email) VALUES (?, ?)",
+                              [(f"U{i}", f"u{i}@test.com") for i in range(20)])
+        self.db.close()
+        db = Database(self.db_path, max_conexiones=1)
+        filas = db.iterar("SELECT id FROM usuarios", tam_lote=5)
+        hilo = threading.Thread(target=next, args=(filas,))
+        hilo.start()
+        hilo.join()
+        # El generador se cierra desde este hilo con la conexión aún reservada
+        filas.close()
+        self.assertEqual(len(db.consultar("SELECT id FROM usuarios")), 20)
+
+    def test_error_no_deshace_otros_hilos(self):
+        """Un error en un hilo solo deshace la transacción de su propia conexión."""
+        preparado = threading.Event()
+        fallado = threading.Event()
+
+        def insertar_sin_confirmar():
+            with self.db.conexion() as conexion:
+                conexion.execute("INSERT INTO usuarios (nombre, email) VALUES ('Ana', 'ana@test.com')")
+                preparado.set()
+                fallado.wait()
+                conexion.commit()
+
+        hilo = threading.Thread(target=insertar_sin_confirmar)
+        hilo.start()
+        preparado.wait()
+        with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(sqlite3.Error):
+            self.db.execute_query("INSERT INTO tabla_inexistente VALUES (1)")
+        fallado.set()
+        hilo.join()
+        self.assertEqual(self.db.execute_query("SELECT email FROM usuarios")[0]["email"], "ana@test.com")
+
+    def test_perfiles(self):
+        """Cada perfil fija el modo de diario y la sincronización de sus conexiones."""
+        with self.db.conexion() as conexion:
+            self.assertEqual(conexion.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(conexion.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+        self.db.execute_query("INSERT INTO usuarios (nombre, email) VALUES ('Ana', 'ana@test.com')")
+        bloqueado, paginas_wal, trasladadas = self.db.checkpoint("TRUNCATE")
+        self.assertEqual((bloqueado, paginas_wal, trasladadas), (0, 0, 0))
+
+        # Salir de WAL requiere que no haya otras conexiones abiertas
+        self.db.close()
+        pool = PoolConexiones(self.db_path, perfil="clasico")
+        with pool.conexion() as conexion:
+            self.assertEqual(conexion.execute("PRAGMA journal_mode").fetchone()[0], "delete")
+            self.assertEqual(conexion.execute("PRAGMA synchronous").fetchone()[0], 2)  # FULL
+        pool.cerrar()
+        with self.assertRaises(ValueError):
+            PoolConexiones(self.db_path, perfil="inexistente")
+
+    def test_transaccion_anidada(self):
+        """Un error en una transacción anidada solo deshace su SAVEPOINT."""
+        with self.db.transaccion():
+            self.db.execute_query("INSERT INTO usuarios (nombre, email) VALUES ('Ana', 'ana@test.com')")
+            with contextlib.redirect_stdout(io.StringIO()):
+                with self.assertRaises(sqlite3.IntegrityError):
+                    with self.db.transaccion():
+                        self.db.execute_query("INSERT INTO usuarios (nombre, email) VALUES ('Luis', 'luis@test.com')")
+                        self.db.execute_query("INSERT INTO usuarios (nombre, email) VALUES ('Otra', 'ana@test.com')")
+            self.db.execute_query("INSERT INTO usuarios (nombre, email) VALUES ('Eva', 'eva@test.com')")
+        correos = [fila["email"] for fila in self.db.execute_query("SELECT email FROM usuarios ORDER BY id")]
+        self.assertEqual(correos, ["ana@test.com", "eva@test.com"])
+
+        # Una excepción en la exterior deshace todo, incluido lo confirmado por execute_query
+        with self.assertRaises(RuntimeError):
+            with self.db.transaccion():
+                self.db.execute_query("INSERT INTO usuarios (nombre, email) VALUES ('Luis', 'luis@test.com')")
+                raise RuntimeError("cancelar")
+        self.assertEqual(self.db.execute_query("SELECT COUNT(*) FROM usuarios")[0][0], 2)
+
+    def test_ejecutar_lote(self):
+        """ejecutar_lote consume generadores por bloques y es atómico."""
+        filas = ((f"Libro {i}", "Autor", f"ISBN{i}") for i in range(2500))
+        insertadas = self.db.ejecutar_lote("INSERT INTO libros (titulo, autor, isbn) VALUES (?, ?, ?)", filas,
+                                           tam_lote=1000)
+        self.assertEqual(insertadas, 2500)
+
+        # El ISBN repetido del último bloque deshace también los bloques anteriores
+        filas = [(f"Nuevo {i}", "Autor", f"NUEVO{i}") for i in range(1500)] + [("Repetido", "Autor", "ISBN0")]
+        with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(sqlite3.IntegrityError):
+            self.db.ejecutar_lote("INSERT INTO libros (titulo, autor, isbn) VALUES (?, ?, ?)", filas, tam_lote=1000)
+        self.assertEqual(self.db.execute_query("SELECT COUNT(*) FROM libros")[0][0], 2500)
+
+    def test_iterar(self):
+        """iterar lee por bloques y puede devolver tuplas en lugar de sqlite3.Row."""
+        self.db.ejecutar_lote("INSERT INTO libros (titulo, autor, isbn) VALUES (?, ?, ?)",
+                              ((f"Libro {i}", "Autor", f"ISBN{i}") for i in range(25)))
+        filas = self.db.iterar("SELECT isbn FROM libros ORDER BY id", tam_lote=10)
+        primera = next(filas)
+        self.assertIsInstance(primera, sqlite3.Row)
+        self.assertEqual(primera["isbn"], "ISBN0")
+        self.assertEqual(len(list(filas)), 24)
+
+        tuplas = list(self.db.iterar("SELECT isbn FROM libros WHERE id > ?", (20,), tam_lote=2, tuplas=True))
+        self.assertEqual(tuplas, [("ISBN20",), ("ISBN21",), ("ISBN22",), ("ISBN23",), ("ISBN24",)])
+
+    def test_exportar_historial(self):
+        """El historial se exporta a CSV completo o filtrado por usuario."""
+        self.db.execute_query("INSERT INTO libros (titulo, autor, isbn) VALUES ('Niebla', 'Unamuno', '111')")
+        self.db.ejecutar_lote("INSERT INTO usuarios (nombre, email) VALUES (?, ?)",
+                              [("Ana", "ana@test.com"), ("Luis", "luis@test.com")])
+        self.db.ejecutar_lote("INSERT INTO prestamos (codigo, libro_id, usuario_id, devuelto) VALUES (?, 1, ?, ?)",
+                              [("P-1", 1, 1), ("P-2", 2, 1), ("P-3", 1, 0)])
+        salida = os.path.join(self.directorio.name, "historial.csv")
+        self.assertEqual(exportar_historial_prestamos(self.db, salida, tam_lote=2), 3)
+        self.assertEqual(exportar_historial_prestamos(self.db, salida, correo="ana@test.com"), 2)
+        with open(salida, encoding="utf-8") as fichero:
+            lineas = fichero.read().splitlines()
+        self.assertEqual(lineas[0], "codigo,isbn,titulo,correo,usuario,fecha_prestamo,fecha_devolucion,devuelto")
+        self.assertEqual([linea.split(",")[0] for linea in lineas[1:]], ["P-1", "P-3"])
+
+    def _plan(self, query, params=()):
+        filas = self.db.consultar(f"EXPLAIN QUERY PLAN {query}", params)
+        return " | ".join(fila["detail"] for fila in filas)
+
+    def test_indices_consultas_frecuentes(self):
+        """Las consultas frecuentes usan los índices del esquema en lugar de recorrer la tabla."""
+        consultas = {
+            "SELECT * FROM prestamos WHERE usuario_id = ?": "idx_prestamos_usuario",
+            "SELECT * FROM prestamos WHERE libro_id = ?": "idx_prestamos_libro",
+            "SELECT usuario_id, libro_id FROM prestamos WHERE devuelto = 0": "idx_prestamos_activos",
+            "SELECT usuario_id, COUNT(*) FROM prestamos WHERE devuelto = 0 GROUP BY usuario_id":
+                "idx_prestamos_activos",
+            "SELECT isbn FROM libros WHERE autor_normalizado = ?": "idx_libros_autor",
+            "SELECT isbn FROM libros WHERE titulo_normalizado >= ? AND titulo_normalizado < ?": "idx_libros_titulo",
+        }
+        for query, indice in consultas.items():
+            parametros = (1, 2)[:query.count("?")]
+            with self.subTest(query=query):
+                self.assertIn(indice, self._plan(query, parametros))
+
+        # El historial de un usuario entra por su correo y después por el índice de préstamos
+        from database.informes import SQL_HISTORIAL
+        plan = self._plan(SQL_HISTORIAL + " WHERE u.email = ?", ("ana@test.com",))
+        self.assertIn("idx_prestamos_usuario", plan)
+        self.assertNotIn("SCAN p", plan)
+
+    def test_migracion_esquema(self):
+        """Una base de datos anterior a las versiones se migra conservando sus filas."""
+        ruta = os.path.join(self.directorio.name, "antigua.db")
+        with contextlib.closing(sqlite3.connect(ruta)) as conn:
+            conn.execute("CREATE TABLE libros (id INTEGER PRIMARY KEY AUTOINCREMENT, titulo TEXT NOT NULL, "
+                         "autor TEXT NOT NULL, genero TEXT, isbn TEXT UNIQUE, disponible INTEGER DEFAULT 1)")
+            conn.execute("CREATE TABLE prestamos (id INTEGER PRIMARY KEY AUTOINCREMENT, libro_id INTEGER, "
+                         "usuario_id INTEGER, fecha_prestamo TIMESTAMP, fecha_devolucion TIMESTAMP, "
+                         "devuelto INTEGER DEFAULT 0)")
+            conn.execute("INSERT INTO libros (titulo, autor, isbn) VALUES ('Canción de Rolando', 'Anónimo', '111')")
+            conn.commit()
+            self.assertEqual(crear_esquema(conn), VERSION_ESQUEMA)
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], VERSION_ESQUEMA)
+            self.assertEqual(conn.execute("SELECT titulo_normalizado, autor_normalizado FROM libros").fetchall(),
+                             [("cancion de rolando", "anonimo")])
+            columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(prestamos)")}
+            self.assertIn("codigo", columnas)
+            # Volver a llamar no repite migraciones
+            self.assertEqual(crear_esquema(conn), VERSION_ESQUEMA)
+
+    def test_consultar_y_ejecutar(self):
+        """Lecturas y escrituras explícitas; execute_query decide por las columnas del resultado."""
+        insertadas = self.db.ejecutar("INSERT INTO usuarios (nombre, email) VALUES (?, ?)", ("Ana", "ana@test.com"))
+        self.assertEqual(insertadas, 1)
+        self.assertEqual([tuple(fila) for fila in self.db.consultar("SELECT nombre FROM usuarios")], [("Ana",)])
+        # Sentencias con filas que no empiezan por SELECT
+        self.assertEqual(self.db.execute_query("WITH t AS (SELECT 1 AS n) SELECT n FROM t")[0]["n"], 1)
+        self.assertEqual(self.db.execute_query("PRAGMA user_version")[0][0], VERSION_ESQUEMA)
+        self.assertEqual(self.db.execute_query("UPDATE usuarios SET telefono = '1'"), 1)
+
+    def test_metricas_y_consultas_lentas(self):
+        """Cada sentencia acumula su histograma y las lentas se registran con su plan."""
+        for i in range(5):
+            self.db.consultar("SELECT * FROM libros WHERE isbn = ?", (f"ISBN{i}",))
+        self.db.consultar("""
+            SELECT *   FROM libros
+            WHERE isbn = ?""", ("ISBN9",))
+        list(self.db.iterar("SELECT id FROM libros"))
+        metricas = self.db.metricas.estadisticas()
+        por_isbn = metricas["SELECT * FROM libros WHERE isbn = ?"]
+        self.assertEqual(por_isbn["llamadas"], 6)
+        self.assertEqual(sum(por_isbn["histograma"].values()), 6)
+        self.assertLessEqual(por_isbn["p50"], por_isbn["p99"])
+        self.assertLessEqual(por_isbn["p99"], por_isbn["maximo"])
+        self.assertEqual(metricas["SELECT id FROM libros"]["llamadas"], 1)
+        self.assertEqual(self.db.metricas.lentas(), [])
+
+        # Con umbral cero todas son lentas y quedan en el log con su EXPLAIN QUERY PLAN
+        self.db.metricas.umbral_lenta = 0
+        try:
+            with self.assertLogs("database.database", level="WARNING") as registro:
+                self.db.consultar("SELECT * FROM prestamos WHERE usuario_id = ?", (1,))
+        finally:
+            self.db.metricas.umbral_lenta = 0.1
+        lenta = self.db.metricas.lentas()[-1]
+        self.assertEqual(lenta["sql"], "SELECT * FROM prestamos WHERE usuario_id = ?")
+        self.assertTrue(any("idx_prestamos_usuario" in paso for paso in lenta["plan"]))
+        self.assertIn("idx_prestamos_usuario", registro.output[0])
+        self.db.metricas.reiniciar()
+        self.assertEqual(self.db.metricas.estadisticas(), {})
+
+
+    def test_metricas_acotadas(self):
+        """Las métricas se agrupan por SQL normalizado y el número de sentencias está acotado."""
+        metricas = MetricasConsultas(max_sentencias=2)
+        metricas.registrar("SELECT 1", 0.001)
+        metricas.registrar("SELECT   1\n", 0.002)
+        for i in range(3):
+            metricas.registrar(f"SELECT * FROM libros WHERE id IN ({', '.join('?' * (i + 1))})", 0.001)
+        estadisticas = metricas.estadisticas()
+        self.assertEqual(list(estadisticas), ["SELECT 1", "SELECT * FROM libros WHERE id IN (?)", OTRAS_SENTENCIAS])
+        self.assertEqual(estadisticas["SELECT 1"]["llamadas"], 2)
+        self.assertEqual(estadisticas[OTRAS_SENTENCIAS]["llamadas"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
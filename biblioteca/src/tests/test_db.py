@@ -193,5 +193,87 @@ class TestDatabase(unittest.TestCase):
         gestor_error = None
         self._safe_remove_db(temp_db_path) # Usar la función segura para limpiar
 
+    def test_checkpoint_y_retencion(self):
+        """Prueba que los checkpoints compactan el registro y se podan los antiguos."""
+        gestor = GestorGrafoBiblioteca(self.db_path, max_cambios_log=2, checkpoints_retenidos=2)
+        gestor.agregar_libro("L0", "Libro 0", "Autor 0")
+        self.assertTrue(gestor.guardar_estado())  # Primer guardado: checkpoint
+
+        for i in range(1, 7):
+            gestor.agregar_libro(f"L{i}", f"Libro {i}", f"Autor {i}")
+            self.assertTrue(gestor.guardar_estado())
+
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM grafo_estado")
+            self.assertLessEqual(cursor.fetchone()[0], 2)
+            cursor.execute("""
+                SELECT COUNT(*) FROM grafo_cambios
+                WHERE checkpoint_id NOT IN (SELECT id FROM grafo_estado)
+            """)
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+        nuevo_gestor = GestorGrafoBiblioteca(self.db_path)
+        self.assertTrue(nuevo_gestor.cargar_estado())
+        self.assertEqual(nuevo_gestor.grafo.number_of_nodes(), 7)
+
+    def test_retencion_diaria_y_vacuum(self):
+        """Prueba la retención diaria, el puntero al checkpoint vigente y el vacuum."""
+        gestor = GestorGrafoBiblioteca(self.db_path, max_cambios_log=0, checkpoints_retenidos=2,
+                                       checkpoints_diarios=3, paginas_libres_vacuum=1)
+        with sqlite3.connect(self.db_path) as conn:
+            # La base de datos nueva ya nace con auto_vacuum incremental, aunque el perfil use WAL
+            self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            # Checkpoints de días anteriores: dos por día durante cinco días
+            for dia in range(1, 6):
+                for hora in ("08", "20"):
+                    conn.execute(
+                        "INSERT INTO grafo_estado (fecha_actualizacion, datos_grafo) VALUES (?, ?)",
+                        (f"2020-01-0{dia}T{hora}:00:00", json.dumps({'nodes': {}, 'edges': []}))
+                    )
+
+        for i in range(5):
+            gestor.agregar_libro(f"L{i}", f"Libro {i}", "Autor " + "x" * 5000)
+            self.assertTrue(gestor.guardar_estado())
+
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT fecha_actualizacion FROM grafo_estado ORDER BY id")
+            fechas = [fila[0] for fila in cursor.fetchall()]
+            # Los dos últimos checkpoints (de hoy) más el último de los dos días previos más recientes
+            self.assertEqual(len(fechas), 4)
+            self.assertEqual(fechas[:2], ["2020-01-04T20:00:00", "2020-01-05T20:00:00"])
+            cursor.execute("SELECT checkpoint_id FROM grafo_estado_actual")
+            self.assertEqual(cursor.fetchone()[0], gestor._checkpoint_id)
+            cursor.execute("PRAGMA auto_vacuum")
+            self.assertEqual(cursor.fetchone()[0], 2)
+            cursor.execute("PRAGMA freelist_count")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+        nuevo_gestor = GestorGrafoBiblioteca(self.db_path)
+        self.assertTrue(nuevo_gestor.cargar_estado())
+        self.assertEqual(nuevo_gestor.grafo.number_of_nodes(), 5)
+
+    def test_checkpoint_binario(self):
+        """Prueba los checkpoints en formato binario con cambios posteriores."""
+        gestor = GestorGrafoBiblioteca(self.db_path, formato_checkpoint="binario")
+        gestor.agregar_libro("L0", "Libro 0", "Autor 0")
+        gestor.agregar_usuario("u@test.com", "Usuario")
+        self.assertTrue(gestor.guardar_estado())
+        gestor.vincular_libro_con_usuario("L0", "u@test.com", "prestamo")
+        self.assertTrue(gestor.guardar_estado())
+
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT datos_grafo FROM grafo_estado ORDER BY id DESC LIMIT 1")
+            self.assertIsInstance(cursor.fetchone()[0], bytes)
+
+        nuevo_gestor = GestorGrafoBiblioteca(self.db_path)
+        self.assertTrue(nuevo_gestor.cargar_estado())
+        self.assertEqual(nuevo_gestor.grafo.number_of_nodes(), 2)
+        self.assertEqual(nuevo_gestor.grafo.number_of_edges(), 1)
+        self.assertEqual(nuevo_gestor.grafo.nodes["libro_L0"]['titulo'], "Libro 0")
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
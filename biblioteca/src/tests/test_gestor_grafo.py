@@ -5,11 +5,57 @@ from datetime import datetime
 import sys
 import gc
 import time
+from datetime import timedelta
+import logging
+import logging.handlers
+from unittest import mock
+import numpy as np
+import networkx as nx
 
 # Añadir el directorio src al path de Python de forma segura
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from gestor_grafo_mejorado import GestorGrafoBiblioteca
+import gestor_grafo_mejorado
+from gestor_grafo_mejorado import GestorGrafoBiblioteca, AlmacenGrafo, configurar_logging
+from models.Libro import Libro
+from models.Usuario import Usuario
+from models.Prestamo import Prestamo
+
+
+def _libros(*isbns):
+    """Libros de prueba indexados por ISBN."""
+    return {isbn: Libro(f"Libro {isbn}", "Autor Test", isbn) for isbn in isbns}
+
+
+def _usuario(correo):
+    """Usuario de prueba con el correo indicado."""
+    return Usuario("Usuario Test", "1234567", correo)
+
+
+def _prestamos(historial, libros):
+    """
+    Crea los usuarios de `historial` (correo -> ISBNs) con un préstamo por cada libro.
+
+    Returns:
+        tuple: (usuarios por correo, préstamos por "correo-isbn")
+    """
+    usuarios = {correo: _usuario(correo) for correo in historial}
+    prestamos = {}
+    for correo, isbns in historial.items():
+        for isbn in isbns:
+            prestamo = Prestamo(usuarios[correo], libros[isbn])
+            prestamos[f"{correo}-{isbn}"] = prestamo
+            usuarios[correo].libros_prestados.append(prestamo)
+    return usuarios, prestamos
+
+
+class _BibliotecaFalsa:
+    """Lo que las recomendaciones consultan de Biblioteca: sus libros y usuarios."""
+
+    def __init__(self, libros=None, usuarios=None):
+        self.libros = libros or {}
+        self.usuarios = usuarios or {}
+
 
 class TestGestorGrafoBiblioteca(unittest.TestCase):
     def setUp(self):
@@ -81,6 +127,19 @@ class TestGestorGrafoBiblioteca(unittest.TestCase):
             self.gestor.grafo.has_edge(usuario_node, libro_node)
         )
 
+    def test_logging_resumido(self):
+        """Prueba que las altas se resumen en una línea y los niveles por subsistema."""
+        gestor = GestorGrafoBiblioteca(self.temp_db.name, intervalo_resumen_log=3)
+        with self.assertLogs('GestorGrafoBiblioteca.nodos', level='INFO') as registro:
+            for i in range(3):
+                gestor.agregar_libro(f"L{i}", f"Libro {i}", "Autor")
+        self.assertEqual(registro.output, ["INFO:GestorGrafoBiblioteca.nodos:Operaciones sobre el grafo: 3 libros"])
+
+        logger = configurar_logging(niveles={'persistencia': 'WARNING'})
+        self.assertTrue(any(isinstance(manejador, logging.handlers.QueueHandler) for manejador in logger.handlers))
+        self.assertFalse(gestor.logger_persistencia.isEnabledFor(logging.INFO))
+        configurar_logging(niveles={'persistencia': logging.NOTSET})
+
     def test_buscar_camino(self):
         """Prueba la búsqueda de caminos entre nodos."""
         # Crear una estructura de prueba
@@ -100,6 +159,26 @@ class TestGestorGrafoBiblioteca(unittest.TestCase):
         self.assertIsNotNone(camino)
         self.assertTrue(len(camino) > 0)
 
+    def test_buscar_camino_acotado(self):
+        """Prueba el límite de profundidad, el presupuesto y las consultas en lote."""
+        # Cadena a -> b -> c -> d con un atajo pesado a -> d
+        grafo = nx.DiGraph()
+        grafo.add_edge("a", "b", peso=1.0)
+        grafo.add_edge("b", "c", peso=1.0)
+        grafo.add_edge("c", "d", peso=1.0)
+        grafo.add_edge("a", "d", peso=10.0)
+        self.gestor.grafo = grafo
+
+        self.assertEqual(self.gestor.buscar_camino_entre_nodos("a", "d", max_profundidad=3), ["a", "b", "c", "d"])
+        self.assertEqual(self.gestor.buscar_camino_entre_nodos("a", "d", max_profundidad=2), ["a", "d"])
+        self.assertEqual(self.gestor.buscar_camino_entre_nodos("b", "d", max_profundidad=1), [])
+        self.assertEqual(self.gestor.buscar_camino_entre_nodos("d", "a"), [])
+        self.assertEqual(self.gestor.buscar_camino_entre_nodos("a", "d", max_profundidad=None), ["a", "b", "c", "d"])
+        self.assertEqual(self.gestor.buscar_camino_entre_nodos("a", "d", presupuesto_expansiones=1), ["a", "d"])
+
+        caminos = self.gestor.buscar_caminos([("a", "c"), ("b", "d"), ("a", "x")], max_profundidad=2)
+        self.assertEqual(caminos, {("a", "c"): ["a", "b", "c"], ("b", "d"): ["b", "c", "d"], ("a", "x"): []})
+
     def test_recomendaciones(self):
         """Prueba el sistema de recomendaciones."""
         # Crear datos de prueba
@@ -135,6 +214,39 @@ class TestGestorGrafoBiblioteca(unittest.TestCase):
         node_id = nuevo_gestor._get_node_id("libro", "123")
         self.assertTrue(nuevo_gestor.grafo.has_node(node_id))
 
+    def test_persistencia_co_prestamos(self):
+        """Prueba que el grafo de co-préstamos se recarga como almacén con su decaimiento."""
+        libros = _libros("L1", "L2", "L3")
+        lector = _usuario("a@test.com")
+        otro = _usuario("b@test.com")
+        antiguo = datetime.now() - timedelta(days=30)
+        prestamos = {
+            "P1": Prestamo(lector, libros["L1"], fecha_prestamo=antiguo),
+            "P2": Prestamo(lector, libros["L2"], fecha_prestamo=antiguo),
+            "P3": Prestamo(otro, libros["L2"]),
+        }
+        self.gestor.construir_grafo_co_prestamos(prestamos, libros)
+        self.assertTrue(self.gestor.guardar_estado())
+
+        # Los cambios posteriores se registran sin exportar el almacén a networkx
+        self.gestor.registrar_prestamo_co_prestamo(Prestamo(otro, libros["L3"]))
+        self.gestor.agregar_libro("L4", "Libro L4", "Autor Test")
+        self.gestor._grafo = None
+        self.assertTrue(self.gestor.guardar_estado())
+        self.assertIsNone(self.gestor._grafo)
+
+        nuevo = GestorGrafoBiblioteca(self.temp_db.name)
+        self.assertTrue(nuevo.cargar_estado())
+        self.assertIsNotNone(nuevo.co_prestamos)
+        self.assertAlmostEqual(nuevo.factor_decaimiento(), self.gestor.factor_decaimiento())
+        self.assertEqual(nuevo.numero_nodos(), 4)
+        self.assertEqual(sorted(nuevo.co_prestamos.aristas()[2]), sorted(self.gestor.co_prestamos.aristas()[2]))
+        self.assertEqual(nuevo.grafo.nodes["libro_L4"]['titulo'], "Libro L4")
+
+        biblioteca = _BibliotecaFalsa(libros, {"a@test.com": lector})
+        lector.libros_prestados.extend([prestamos["P1"], prestamos["P2"]])
+        self.assertEqual([r['isbn'] for r in nuevo.obtener_libros_recomendados("a@test.com", biblioteca)], ["L3"])
+
     def test_analisis_eficiencia(self):
         """Prueba el análisis de eficiencia."""
         # Agregar datos de prueba
@@ -157,5 +269,384 @@ class TestGestorGrafoBiblioteca(unittest.TestCase):
         self.assertIn('numero_aristas', metricas)
         self.assertIn('densidad', metricas)
 
+    def test_analisis_eficiencia_aproximado(self):
+        """Prueba que las métricas aproximadas acotan a las exactas de networkx."""
+        grafo = nx.gnp_random_graph(80, 0.08, seed=7, directed=True)
+        self.assertTrue(nx.is_strongly_connected(grafo))
+        self.gestor.grafo = grafo
+        diametro = nx.diameter(grafo)
+        clustering = nx.average_clustering(grafo.to_undirected())
+
+        exactas = self.gestor.analizar_eficiencia()
+        self.assertEqual(exactas['diametro'], diametro)
+        self.assertAlmostEqual(exactas['coeficiente_clustering'], clustering)
+        self.assertTrue(all(exactas['exacto'].values()))
+
+        aproximadas = self.gestor.analizar_eficiencia(modo="aproximado", semilla=1)
+        inferior, superior = aproximadas['intervalos']['diametro']
+        self.assertLessEqual(inferior, diametro)
+        self.assertGreaterEqual(superior, diametro)
+        inferior, superior = aproximadas['intervalos']['coeficiente_clustering']
+        self.assertLess(inferior, clustering + 0.02)
+        self.assertGreater(superior, clustering - 0.02)
+        self.assertEqual(aproximadas['componentes_conexas'], 1)
+        self.assertEqual(aproximadas['estadisticas_grado']['maximo'], max(dict(grafo.degree()).values()))
+
+    def test_exportar_visualizacion(self):
+        """Prueba la exportación sin interfaz de un subgrafo y la reutilización del layout."""
+        for i in range(10):
+            self.gestor.agregar_libro(f"L{i}", f"Libro {i}", "Autor")
+        self.gestor.agregar_usuario("U1", "Usuario 1")
+        for i in range(6):
+            self.gestor.vincular_libro_con_usuario(f"L{i}", "U1", "PRESTAMO")
+
+        directorio = tempfile.mkdtemp()
+        ruta = os.path.join(directorio, "grafo.png")
+        self.assertTrue(self.gestor.visualizar_grafo(ruta=ruta, max_nodos=5))
+        self.assertGreater(os.path.getsize(ruta), 0)
+        self.assertEqual(len(self.gestor._posiciones), 5)
+        self.assertIn(self.gestor._get_node_id("usuario", "U1"), self.gestor._posiciones)
+
+        posiciones = dict(self.gestor._posiciones)
+        ruta_svg = os.path.join(directorio, "ego.svg")
+        self.assertTrue(self.gestor.visualizar_grafo(ruta=ruta_svg, nodo_central="usuario_U1", radio=1))
+        self.assertEqual(len(self.gestor._posiciones), 7)
+        for nodo, posicion in posiciones.items():
+            self.assertTrue(np.allclose(self.gestor._posiciones[nodo], posicion))
+        os.unlink(ruta)
+        os.unlink(ruta_svg)
+        os.rmdir(directorio)
+
+    def test_similitud_usuarios(self):
+        """Prueba el grafo de similitud de usuarios calculado por bloques."""
+        libros = _libros("L1", "L2", "L3", "L4")
+        historial = {
+            "a@test.com": ["L1", "L2", "L3"],
+            "b@test.com": ["L1", "L2"],
+            "c@test.com": ["L4"],
+            "d@test.com": ["L3", "L4"],
+        }
+        usuarios, prestamos = _prestamos(historial, libros)
+
+        # Un bloque de 1 usuario fuerza el recorrido de todos los pares de bloques
+        self.gestor.construir_grafo_similitud_usuarios(prestamos, usuarios, umbral=0.0, tam_bloque=1)
+
+        for u, v, datos in self.gestor.grafo.edges(data=True):
+            libros_u = set(historial[self.gestor.grafo.nodes[u]['correo']])
+            libros_v = set(historial[self.gestor.grafo.nodes[v]['correo']])
+            self.assertAlmostEqual(datos['peso'], len(libros_u & libros_v) / len(libros_u | libros_v))
+            self.assertEqual(datos['libros_en_comun'], len(libros_u & libros_v))
+        # Pares con intersección: a-b, a-d, c-d
+        self.assertEqual(self.gestor.grafo.number_of_edges(), 3)
+
+        similares = self.gestor.obtener_usuarios_similares("a@test.com", _BibliotecaFalsa(usuarios=usuarios))
+        self.assertEqual(similares[0]['correo'], "b@test.com")
+
+        # Con umbral alto solo sobrevive el par más parecido
+        self.gestor.construir_grafo_similitud_usuarios(prestamos, usuarios, umbral=0.6)
+        self.assertEqual(self.gestor.grafo.number_of_edges(), 1)
+
+        # La versión paralela reparte los bloques entre procesos con el mismo resultado
+        self.gestor.construir_grafo_similitud_usuarios(prestamos, usuarios, umbral=0.0,
+                                                       tam_bloque=1, num_procesos=2)
+        self.assertEqual(self.gestor.grafo.number_of_edges(), 3)
+
+    def test_co_prestamos_paralelo(self):
+        """Prueba que la construcción paralela produce los mismos pesos que la secuencial."""
+        libros = _libros("L1", "L2", "L3")
+        historial = [["L1", "L2"], ["L1", "L2", "L3"], ["L2", "L3"], ["L3"]]
+        _, prestamos = _prestamos({f"u{i}@test.com": isbns for i, isbns in enumerate(historial)}, libros)
+
+        def pesos_no_dirigidos():
+            pesos = {}
+            for u, v, datos in self.gestor.grafo.edges(data=True):
+                clave = frozenset((u, v))
+                pesos[clave] = pesos.get(clave, 0) + datos['peso']
+            return pesos
+
+        self.gestor.construir_grafo_co_prestamos(prestamos, libros)
+        esperado = pesos_no_dirigidos()
+        # Con tan pocos préstamos solo se reparte entre procesos si se baja el umbral
+        with mock.patch.object(gestor_grafo_mejorado, "_MIN_PRESTAMOS_PARALELO", 0):
+            self.gestor.construir_grafo_co_prestamos(prestamos, libros, num_procesos=2)
+        obtenido = pesos_no_dirigidos()
+        self.assertEqual(obtenido.keys(), esperado.keys())
+        for clave, peso in esperado.items():
+            self.assertAlmostEqual(obtenido[clave], peso, places=4)
+        self.assertEqual(self.gestor.grafo.number_of_nodes(), 3)
+
+        # Sin decaimiento el peso es el número de usuarios que comparten el par
+        self.gestor.construir_grafo_co_prestamos(prestamos, libros, num_procesos=2, vida_media_dias=None)
+        self.assertEqual(pesos_no_dirigidos()[frozenset(("libro_L1", "libro_L2"))], 2)
+
+    def test_recomendar_pagerank(self):
+        """Prueba las recomendaciones por PageRank personalizado en lote."""
+        libros = _libros("L1", "L2", "L3")
+        historial = {"a@test.com": ["L1"], "b@test.com": ["L1", "L2"], "c@test.com": ["L2", "L3"]}
+        _, prestamos = _prestamos(historial, libros)
+
+        self.gestor.construir_matriz_transicion(prestamos)
+        resultado = self.gestor.recomendar_pagerank(["a@test.com", "c@test.com", "x@test.com"], tam_lote=1)
+
+        # L3 está a cuatro saltos de "a" y aun así se recomienda, por detrás de L2
+        self.assertEqual([r['isbn'] for r in resultado["a@test.com"]], ["L2", "L3"])
+        self.assertEqual([r['isbn'] for r in resultado["c@test.com"]], ["L1"])
+        self.assertEqual(resultado["x@test.com"], [])
+
+        # Un lote con todos los usuarios, multiplicado de un vector en un vector, da lo mismo
+        # aunque cada usuario deje de iterar en una iteración distinta
+        correos = ["a@test.com", "b@test.com", "c@test.com"]
+        individuales = {c: self.gestor.recomendar_pagerank([c], tolerancia=1e-3)[c] for c in correos}
+        with mock.patch.object(gestor_grafo_mejorado, "_ELEMENTOS_POR_PRODUCTO", 1):
+            en_lote = self.gestor.recomendar_pagerank(correos, tolerancia=1e-3)
+        for correo in correos:
+            self.assertEqual([r['isbn'] for r in en_lote[correo]], [r['isbn'] for r in individuales[correo]])
+            for obtenido, esperado in zip(en_lote[correo], individuales[correo]):
+                self.assertAlmostEqual(obtenido['score'], esperado['score'], places=6)
+
+        # Sin iteraciones solo queda el reinicio, que son libros ya conocidos
+        self.assertEqual(self.gestor.recomendar_pagerank(["a@test.com"], max_iteraciones=0), {"a@test.com": []})
+
+    def test_recomendar_para_todos(self):
+        """Prueba que las recomendaciones en lote coinciden con las individuales."""
+        import json
+        import sqlite3
+        libros = _libros(*(f"L{i}" for i in range(6)))
+        historial = [["L0", "L1", "L2"], ["L0", "L1"], ["L1", "L3", "L4"], ["L2", "L5"], ["L5"]]
+        usuarios, prestamos = _prestamos({f"u{i}@test.com": isbns for i, isbns in enumerate(historial)}, libros)
+        self.gestor.construir_grafo_co_prestamos(prestamos, libros, vida_media_dias=None)
+        libros["L4"].disponible = False
+
+        biblioteca = _BibliotecaFalsa(libros, usuarios)
+        esperado = {correo: self.gestor.obtener_libros_recomendados(correo, biblioteca, top_n=2)
+                    for correo in usuarios}
+
+        def comparar(obtenido):
+            for correo, recomendaciones in esperado.items():
+                puntuaciones = [r['score'] for r in obtenido.get(correo, [])]
+                self.assertEqual(puntuaciones, [r['score'] for r in recomendaciones])
+                for rec in obtenido.get(correo, []):
+                    self.assertNotEqual(rec['isbn'], "L4")
+
+        ruta_jsonl = self.temp_db.name + ".jsonl"
+        ruta_db = self.temp_db.name + ".recomendaciones.db"
+        try:
+            resumen = self.gestor.recomendar_para_todos(biblioteca, ruta_jsonl, top_n=2, tam_lote=2)
+            self.assertEqual(resumen['usuarios'], 5)
+            with open(ruta_jsonl, encoding='utf-8') as fichero:
+                lineas = [json.loads(linea) for linea in fichero]
+            self.assertEqual(resumen['con_recomendaciones'], len(lineas))
+            comparar({linea['correo']: linea['recomendaciones'] for linea in lineas})
+
+            self.assertTrue(self.gestor.recomendar_para_todos(biblioteca, ruta_db, top_n=2))
+            # Repetir la ejecución sustituye las filas en lugar de duplicarlas
+            self.assertTrue(self.gestor.recomendar_para_todos(biblioteca, ruta_db, top_n=2))
+            with sqlite3.connect(ruta_db) as conn:
+                filas = conn.execute(
+                    "SELECT correo, isbn, score FROM recomendaciones ORDER BY correo, posicion"
+                ).fetchall()
+            obtenido = {}
+            for correo, isbn, score in filas:
+                obtenido.setdefault(correo, []).append({'isbn': isbn, 'score': score})
+            comparar(obtenido)
+
+            self.assertEqual(self.gestor.recomendar_para_todos(biblioteca, self.temp_db.name + ".csv"), {})
+        finally:
+            for ruta in (ruta_jsonl, ruta_db):
+                if os.path.exists(ruta):
+                    os.unlink(ruta)
+
+    def test_co_prestamos_decaimiento(self):
+        """Prueba el decaimiento temporal, la poda y la actualización incremental."""
+        libros = _libros("L1", "L2", "L3", "L4")
+        lector = _usuario("a@test.com")
+        antiguo = datetime.now() - timedelta(days=60)
+        prestamos = {
+            "P1": Prestamo(lector, libros["L1"], fecha_prestamo=antiguo, fecha_devolucion=antiguo),
+            "P2": Prestamo(lector, libros["L2"], fecha_prestamo=antiguo, fecha_devolucion=antiguo),
+        }
+
+        # Los préstamos devueltos también cuentan; con vida media de 60 días el peso es 0.5
+        self.gestor.construir_grafo_co_prestamos(prestamos, libros, vida_media_dias=60)
+        nodo1 = self.gestor._get_node_id("libro", "L1")
+        nodo2 = self.gestor._get_node_id("libro", "L2")
+        peso = (self.gestor.grafo.get_edge_data(nodo1, nodo2) or self.gestor.grafo[nodo2][nodo1])['peso']
+        self.assertAlmostEqual(peso * self.gestor.factor_decaimiento(), 0.5, places=3)
+
+        # Un préstamo nuevo se incorpora sin reconstruir y pesa 1
+        nuevo = Prestamo(lector, libros["L3"])
+        self.gestor.registrar_prestamo_co_prestamo(nuevo)
+        nodo3 = self.gestor._get_node_id("libro", "L3")
+        datos = self.gestor.grafo.get_edge_data(nodo1, nodo3) or self.gestor.grafo[nodo3][nodo1]
+        self.assertAlmostEqual(datos['peso'] * self.gestor.factor_decaimiento(), 1.0, places=3)
+
+        # Dentro de dos años todas las aristas quedan por debajo de epsilon
+        futuro = datetime.now() + timedelta(days=730)
+        self.assertEqual(self.gestor.podar_co_prestamos(epsilon=0.01, ahora=futuro), 3)
+        self.assertEqual(self.gestor.grafo.number_of_edges(), 0)
+
+    def test_co_prestamos_represtamo(self):
+        """Prueba que volver a tomar un libro deja el mismo peso que reconstruir el grafo."""
+        libros = _libros("L1", "L2")
+        lector = _usuario("a@test.com")
+        antiguo = datetime.now() - timedelta(days=30)
+        prestamos = {
+            "P1": Prestamo(lector, libros["L1"], fecha_prestamo=antiguo, fecha_devolucion=antiguo),
+            "P2": Prestamo(lector, libros["L2"], fecha_prestamo=antiguo, fecha_devolucion=antiguo),
+        }
+        self.gestor.construir_grafo_co_prestamos(prestamos, libros, vida_media_dias=60)
+        prestamos["P3"] = Prestamo(lector, libros["L1"])
+        self.gestor.registrar_prestamo_co_prestamo(prestamos["P3"])
+        # Un préstamo anterior al último del libro no cambia nada
+        self.gestor.registrar_prestamo_co_prestamo(
+            Prestamo(lector, libros["L2"], fecha_prestamo=antiguo - timedelta(days=1))
+        )
+        incremental = self.gestor.co_prestamos.peso(0, 1) * self.gestor.factor_decaimiento()
+
+        self.gestor.construir_grafo_co_prestamos(prestamos, libros, vida_media_dias=60)
+        reconstruido = self.gestor.co_prestamos.peso(0, 1) * self.gestor.factor_decaimiento()
+        self.assertAlmostEqual(incremental, reconstruido, places=4)
+        self.assertAlmostEqual(incremental, 1.0, places=3)
+
+    def test_altas_con_co_prestamos(self):
+        """Prueba que las altas con el almacén de co-préstamos cargado no se pierden."""
+        libros = _libros("L1", "L2")
+        lector = _usuario("a@test.com")
+        prestamos = {isbn: Prestamo(lector, libro) for isbn, libro in libros.items()}
+        self.gestor.construir_grafo_co_prestamos(prestamos, libros)
+
+        self.assertTrue(self.gestor.agregar_libro("L3", "Libro L3", "Autor Test"))
+        # Un préstamo nuevo regenera la exportación a networkx
+        self.gestor.registrar_prestamo_co_prestamo(Prestamo(lector, libros["L1"]))
+        nodo = self.gestor._get_node_id("libro", "L3")
+        self.assertEqual(self.gestor.grafo.nodes[nodo]['titulo'], "Libro L3")
+        self.assertEqual(self.gestor.numero_nodos(), 3)
+
+        # Los usuarios y vínculos no caben en el grafo de co-préstamos y la exportación es de solo lectura
+        with self.assertLogs('GestorGrafoBiblioteca.nodos', level='ERROR'):
+            self.assertFalse(self.gestor.agregar_usuario("a@test.com", "Usuario Test"))
+            self.assertFalse(self.gestor.vincular_libro_con_usuario("L3", "a@test.com"))
+        with self.assertRaises(nx.NetworkXError):
+            self.gestor.grafo.add_node("libro_L4")
+
+        ruta = self.temp_db.name + ".snap"
+        try:
+            self.assertTrue(self.gestor.guardar_snapshot(ruta))
+            nuevo = GestorGrafoBiblioteca(self.temp_db.name)
+            self.assertTrue(nuevo.cargar_snapshot(ruta))
+            self.assertEqual(nuevo.co_prestamos.atributo(nuevo.co_prestamos.indice(nodo), 'autor'), "Autor Test")
+        finally:
+            os.unlink(ruta)
+
+    def test_snapshot_binario(self):
+        """Prueba el guardado y la carga de snapshots binarios."""
+        self.gestor.agregar_libro("1234567890", "Don Quijote", "Cervantes")
+        self.gestor.agregar_usuario("usuario@test.com", "Usuario Test")
+        self.gestor.vincular_libro_con_usuario("1234567890", "usuario@test.com", "prestamo")
+        self.gestor.grafo.nodes[self.gestor._get_node_id("libro", "1234567890")]['genero'] = None
+
+        ruta = self.temp_db.name + ".snap"
+        try:
+            self.assertTrue(self.gestor.guardar_snapshot(ruta))
+            nuevo = GestorGrafoBiblioteca(self.temp_db.name)
+            self.assertTrue(nuevo.cargar_snapshot(ruta))
+            self.assertEqual(dict(nuevo.grafo.nodes(data=True)), dict(self.gestor.grafo.nodes(data=True)))
+            self.assertEqual(list(nuevo.grafo.edges(data=True)), list(self.gestor.grafo.edges(data=True)))
+
+            # El grafo de co-préstamos se restaura como almacén compacto
+            libros = _libros("L1", "L2", "L3")
+            lector = _usuario("a@test.com")
+            prestamos = {f"P{i}": Prestamo(lector, libro) for i, libro in enumerate(libros.values())}
+            self.gestor.construir_grafo_co_prestamos(prestamos, libros)
+            self.assertTrue(self.gestor.guardar_snapshot(ruta, comprimir=False))
+            self.assertTrue(nuevo.cargar_snapshot(ruta))
+            self.assertIsNotNone(nuevo.co_prestamos)
+            self.assertEqual(nuevo.numero_aristas(), 3)
+            self.assertAlmostEqual(nuevo.factor_decaimiento(), self.gestor.factor_decaimiento())
+            nodo1 = nuevo._get_node_id("libro", "L1")
+            nodo2 = nuevo._get_node_id("libro", "L2")
+            self.assertEqual(nuevo.grafo.nodes[nodo1]['titulo'], "Libro L1")
+            self.assertAlmostEqual(nuevo.grafo[nodo1][nodo2]['peso'], self.gestor.grafo[nodo1][nodo2]['peso'])
+        finally:
+            os.unlink(ruta)
+
+    def test_analitica_cacheada(self):
+        """Prueba componentes, centralidad y comunidades con caché por versión."""
+        grafo = nx.gnp_random_graph(60, 0.05, seed=3, directed=True)
+        self.gestor.grafo = nx.relabel_nodes(grafo, {i: f"n{i}" for i in grafo})
+        referencia = self.gestor.grafo.to_undirected()
+
+        componentes = self.gestor.componentes_conexas()
+        self.assertEqual(sorted(map(len, componentes)),
+                         sorted(map(len, nx.weakly_connected_components(self.gestor.grafo))))
+
+        centralidad = self.gestor.centralidad(muestras_intermediacion=60)
+        esperada = nx.betweenness_centrality(referencia)
+        for nodo, valor in esperada.items():
+            self.assertAlmostEqual(centralidad['intermediacion'][nodo], valor)
+        self.assertIs(self.gestor.centralidad(muestras_intermediacion=60), centralidad)
+
+        comunidades = self.gestor.comunidades()
+        self.assertEqual(sum(map(len, comunidades)), 60)
+
+        # Las altas se aplican a las componentes sin recalcularlas y renuevan la caché
+        self.gestor.agregar_libro("L1", "Libro 1", "Autor 1")
+        self.gestor.agregar_usuario("U1", "Usuario 1")
+        self.gestor.vincular_libro_con_usuario("L1", "U1", "PRESTAMO")
+        componentes = self.gestor.componentes_conexas()
+        self.assertEqual(sorted(map(len, componentes)),
+                         sorted(map(len, nx.weakly_connected_components(self.gestor.grafo))))
+        self.assertIsNot(self.gestor.centralidad(muestras_intermediacion=60), centralidad)
+
+class TestAlmacenGrafo(unittest.TestCase):
+    def test_aristas_y_exportacion(self):
+        """Prueba el almacén compacto: suma de pesos, búfer, poda y exportación."""
+        almacen = AlmacenGrafo(dirigido=False, umbral_compactacion=4)
+        a = almacen.agregar_nodo("libro_A", "libro", titulo="A")
+        b = almacen.agregar_nodo("libro_B", "libro", titulo="B")
+        c = almacen.agregar_nodo("libro_C", "libro")
+
+        almacen.agregar_arista(a, b, 1.0)
+        almacen.agregar_arista(b, a, 2.0)  # Mismo par no dirigido: se suma
+        almacen.agregar_aristas(np.array([a]), np.array([c]), np.array([0.5]))
+
+        self.assertEqual(almacen.numero_aristas(), 2)
+        self.assertEqual(almacen.peso(a, b), 3.0)
+        self.assertEqual(almacen.peso(c, a), 0.5)
+        self.assertEqual(sorted(almacen.vecinos(a)[0].tolist()), [b, c])
+
+        grafo = almacen.a_networkx(tipo_arista="co-prestamo")
+        self.assertEqual(grafo.number_of_edges(), 2)
+        self.assertEqual(grafo.nodes["libro_A"]['titulo'], "A")
+        self.assertEqual(grafo["libro_A"]["libro_B"]['tipo'], "co-prestamo")
+
+        self.assertEqual(almacen.escalar_y_podar(0.5, epsilon=1.0), 1)
+        self.assertEqual(almacen.peso(a, b), 1.5)
+        self.assertEqual(almacen.peso(a, c), 0.0)
+
+    def test_lecturas_sin_compactar(self):
+        """Prueba que las lecturas con altas en el búfer no compactan y coinciden con la CSR compactada."""
+        rng = np.random.default_rng(7)
+        almacen = AlmacenGrafo(dirigido=False)
+        nodos = [almacen.agregar_nodo(f"libro_{i}", "libro") for i in range(30)]
+        almacen.agregar_aristas(rng.integers(0, 25, 200), rng.integers(0, 25, 200), rng.random(200))
+        for origen, destino in rng.integers(0, 30, (60, 2)).tolist():
+            almacen.agregar_arista(nodos[origen], nodos[destino], 0.25)
+        pendientes = len(almacen._buffer_pesos)
+
+        indptr, indices, pesos = (x.copy() for x in almacen.csr())
+        numero = almacen.numero_aristas()
+        vecinos = [tuple(array.tolist() for array in almacen.vecinos(nodo)) for nodo in nodos]
+        self.assertEqual(len(almacen._buffer_pesos), pendientes)
+
+        almacen.compactar()
+        np.testing.assert_array_equal(indptr, almacen.csr()[0])
+        np.testing.assert_array_equal(indices, almacen.csr()[1])
+        np.testing.assert_allclose(pesos, almacen.csr()[2])
+        self.assertEqual(numero, almacen.numero_aristas())
+        for nodo, (indices_nodo, pesos_nodo) in zip(nodos, vecinos):
+            self.assertEqual(indices_nodo, almacen.vecinos(nodo)[0].tolist())
+            np.testing.assert_allclose(pesos_nodo, almacen.vecinos(nodo)[1])
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
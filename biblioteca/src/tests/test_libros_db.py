@@ -3,7 +3,12 @@ import os
 import sqlite3
 import json
 from datetime import datetime
-from biblioteca.src.gestor_grafo_mejorado import GestorGrafoBiblioteca
+import sys
+
+# Añadir el directorio src al path de Python de forma segura
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gestor_grafo_mejorado import GestorGrafoBiblioteca
 
 class TestLibrosDatabase(unittest.TestCase):
     def setUp(self):
@@ -93,17 +98,23 @@ class TestLibrosDatabase(unittest.TestCase):
         self.gestor.agregar_libro(isbn, "Nuevo Título", "Nuevo Autor")
         self.gestor.guardar_estado()
         
-        # Verificar en la base de datos
+        # El segundo guardado solo añade el nodo modificado al registro de cambios
+        node_id = f"libro_{isbn}"
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT datos_grafo FROM grafo_estado ORDER BY id DESC LIMIT 1")
-            datos = json.loads(cursor.fetchone()[0])
-            
-            # Verificar que el libro se actualizó
-            node_id = f"libro_{isbn}"
-            libro_data = datos['nodes'][node_id]
-            self.assertEqual(libro_data['titulo'], "Nuevo Título")
-            self.assertEqual(libro_data['autor_nombre'], "Nuevo Autor")
+            cursor.execute("SELECT COUNT(*) FROM grafo_estado")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("SELECT origen, atributos FROM grafo_cambios ORDER BY seq")
+            cambios = cursor.fetchall()
+            self.assertEqual([origen for origen, _ in cambios], [node_id])
+            self.assertEqual(json.loads(cambios[0][1])['titulo'], "Nuevo Título")
+        
+        # Verificar que el libro se actualizó al cargar el estado
+        nuevo_gestor = GestorGrafoBiblioteca(self.db_path)
+        self.assertTrue(nuevo_gestor.cargar_estado())
+        libro_data = nuevo_gestor.grafo.nodes[node_id]
+        self.assertEqual(libro_data['titulo'], "Nuevo Título")
+        self.assertEqual(libro_data['autor_nombre'], "Nuevo Autor")
 
     def test_libro_con_relaciones(self):
         """Prueba el guardado de un libro con sus relaciones."""
@@ -0,0 +1,181 @@
+import unittest
+import os
+import sys
+import sqlite3
+import tempfile
+import contextlib
+import io
+
+# Añadir el directorio src al path de Python de forma segura
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from controllers.Biblioteca import Biblioteca
+from database.database import Database
+from database.repositorio import RepositorioBiblioteca, _FIN
+from models.Usuario import Usuario
+
+
+class TestRepositorioBiblioteca(unittest.TestCase):
+    def setUp(self):
+        """Crea una base de datos temporal para cada prueba."""
+        descriptor, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(descriptor)
+
+    def tearDown(self):
+        db = Database(self.db_path)
+        db.close()
+        Database._instancias.pop(db.db_path)
+        os.unlink(self.db_path)
+
+    def _operar(self, biblioteca):
+        """Alta, préstamo, devolución y bajas silenciando la salida de la Biblioteca."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            biblioteca.agregar_libro("Don Quijote", "Cervantes", "111")
+            biblioteca.agregar_libro("La Regenta", "Clarin", "222")
+            biblioteca.registrar_usuario("Ana Perez", "1234567", "ana@test.com")
+            biblioteca.registrar_usuario("Luis Gil", "7654321", "luis@test.com")
+            biblioteca.modificar_libro("111", nuevo_titulo="El Quijote")
+            biblioteca.realizar_prestamo("ana@test.com", "111")
+            biblioteca.realizar_prestamo("ana@test.com", "222")
+            id_prestamo = next(p.id for p in biblioteca.prestamos.values() if p.libro.isbn == "222")
+            biblioteca.registrar_devolucion(id_prestamo)
+            biblioteca.eliminar_libro("222")
+            biblioteca.eliminar_usuario("luis@test.com")
+
+    def _comprobar(self):
+        with contextlib.closing(sqlite3.connect(self.db_path)) as conn:
+            libros = conn.execute("SELECT isbn, titulo, disponible FROM libros ORDER BY isbn").fetchall()
+            usuarios = conn.execute("SELECT email FROM usuarios").fetchall()
+            prestamos = conn.execute("""
+                SELECT l.isbn, u.email, p.devuelto, p.fecha_devolucion IS NOT NULL
+                FROM prestamos p LEFT JOIN libros l ON l.id = p.libro_id
+                JOIN usuarios u ON u.id = p.usuario_id ORDER BY p.id
+            """).fetchall()
+        self.assertEqual(libros, [("111", "El Quijote", 0)])
+        self.assertEqual(usuarios, [("ana@test.com",)])
+        self.assertEqual(prestamos, [("111", "ana@test.com", 0, 0), (None, "ana@test.com", 1, 1)])
+
+    def test_escritura_en_lotes(self):
+        """Las operaciones se agrupan en transacciones y vaciar() espera a que se escriban."""
+        repositorio = RepositorioBiblioteca(self.db_path, tam_lote=1000, intervalo=60)
+        try:
+            self._operar(Biblioteca(repositorio))
+            self.assertTrue(repositorio.vaciar(timeout=5))
+            self._comprobar()
+            estadisticas = repositorio.estadisticas()
+            self.assertEqual(estadisticas['lotes_escritos'], 1)
+            self.assertEqual(estadisticas['operaciones_fallidas'], 0)
+        finally:
+            repositorio.cerrar()
+
+    def test_estadisticas_guardadas(self):
+        """mostrar_estadisticas añade los totales de la base de datos, con los préstamos de libros borrados."""
+        repositorio = RepositorioBiblioteca(self.db_path, intervalo=60)
+        try:
+            biblioteca = Biblioteca(repositorio)
+            self._operar(biblioteca)
+            salida = io.StringIO()
+            with contextlib.redirect_stdout(salida):
+                biblioteca.mostrar_estadisticas()
+        finally:
+            repositorio.cerrar()
+        guardadas = salida.getvalue().split("💾")[1].splitlines()[1:]
+        self.assertEqual(guardadas, [
+            "  - Libros: 1 (0 disponibles)",
+            "  - Usuarios: 1",
+            "  - Préstamos activos: 1",
+            "  - Préstamos devueltos: 1",
+        ])
+
+    def test_escritura_sincrona(self):
+        """En modo síncrono cada operación queda escrita al volver."""
+        repositorio = RepositorioBiblioteca(self.db_path, modo="sincrono")
+        try:
+            self._operar(Biblioteca(repositorio))
+            self._comprobar()
+            self.assertGreater(repositorio.estadisticas()['lotes_escritos'], 1)
+        finally:
+            repositorio.cerrar()
+
+    def test_cerrar_escribe_pendientes(self):
+        """Cerrar el repositorio vuelca lo encolado aunque no se haya llenado el lote."""
+        repositorio = RepositorioBiblioteca(self.db_path, intervalo=60)
+        self._operar(Biblioteca(repositorio))
+        repositorio.cerrar()
+        self._comprobar()
+
+    def test_operacion_envenenada(self):
+        """Un error que no es de SQLite descarta su operación sin detener el hilo escritor."""
+        class _Veneno:
+            def __conform__(self, protocolo):
+                raise RuntimeError("parámetro imposible de adaptar")
+
+        repositorio = RepositorioBiblioteca(self.db_path, intervalo=60)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), self.assertLogs("database.repositorio", level="ERROR"):
+                repositorio._encolar("DELETE FROM libros WHERE isbn = ?", (_Veneno(),))
+                self._operar(Biblioteca(repositorio))
+                self.assertTrue(repositorio.vaciar(timeout=5))
+            self._comprobar()
+            self.assertEqual(repositorio.estadisticas()['operaciones_fallidas'], 1)
+
+            # Con el hilo escritor detenido, vaciar() ya no puede prometer nada
+            repositorio._cola.put(_FIN)
+            repositorio._hilo.join()
+            repositorio.guardar_usuario(Usuario("Eva Ruiz", "1112223", "eva@test.com"))
+            with self.assertLogs("database.repositorio", level="ERROR"):
+                self.assertFalse(repositorio.vaciar(timeout=1))
+        finally:
+            repositorio.cerrar()
+
+    def test_carga_desde_base_de_datos(self):
+        """Lo guardado se recupera con índices, árboles y préstamos activos."""
+        repositorio = RepositorioBiblioteca(self.db_path)
+        self._operar(Biblioteca(repositorio))
+        repositorio.cerrar()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            biblioteca = Biblioteca.desde_base_de_datos(self.db_path)
+        self.assertEqual(list(biblioteca.libros), ["111"])
+        self.assertEqual(biblioteca.libros["111"].titulo, "El Quijote")
+        self.assertFalse(biblioteca.libros["111"].disponible)
+        self.assertEqual(biblioteca.libros_por_autor, {"cervantes": ["111"]})
+        self.assertEqual(biblioteca.arbol_isbn.buscar("111"), "111")
+        self.assertEqual(biblioteca.arbol_titulos.buscar("el quijote"), "111")
+        self.assertEqual(biblioteca.arbol_correos_usuarios.buscar("ana@test.com"), "ana@test.com")
+        self.assertEqual(biblioteca.usuarios_por_telefono, {"1234567": "ana@test.com"})
+
+        # El préstamo devuelto de un libro borrado se descarta; el activo vuelve al usuario
+        ana = biblioteca.usuarios["ana@test.com"]
+        self.assertEqual(len(biblioteca.prestamos), 1)
+        self.assertEqual([p.libro.isbn for p in ana.libros_prestados], ["111"])
+        prestamo = ana.libros_prestados[0]
+        self.assertEqual(prestamo.estado, "Activo")
+        self.assertIs(biblioteca.prestamos[prestamo.id], prestamo)
+
+        # Con el repositorio adjunto, la devolución se guarda sobre la misma fila
+        repositorio = RepositorioBiblioteca(self.db_path, modo="sincrono")
+        biblioteca.repositorio = repositorio
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(biblioteca.registrar_devolucion(prestamo.id))
+        repositorio.cerrar()
+        with contextlib.closing(sqlite3.connect(self.db_path)) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*), SUM(devuelto) FROM prestamos").fetchone(), (2, 2))
+
+    def test_arbol_desde_ordenados(self):
+        """El árbol construido en bloque es equilibrado y equivale a insertar en orden."""
+        from models.ArbolBinario import ArbolBinario
+        pares = [(f"clave{i:04d}", i) for i in range(1000)] + [("clave0500", "ultimo")]
+        arbol = ArbolBinario()
+        arbol.construir_desde_ordenados(sorted(pares, key=lambda par: par[0]))
+        secuencial = ArbolBinario()
+        for clave, valor in pares:
+            secuencial.insertar(clave, valor)
+        self.assertEqual(arbol.inorden(), secuencial.inorden())
+        self.assertEqual(arbol.buscar("clave0500"), "ultimo")
+        self.assertEqual(len(arbol), 1000)
+        self.assertEqual(arbol.raiz.altura, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()